@@ -4,35 +4,119 @@ import sys
 from types import FrameType
 
 from dotenv import load_dotenv
-from flask import Flask, g, request
+from flask import Flask, g, request, Response
 from flask_cors import CORS
+from werkzeug.exceptions import BadRequest
+from werkzeug.middleware.proxy_fix import ProxyFix
 
-from src.authentication.Authenticator import Authenticator, auth_required
+from src.authentication.Authenticator import (
+    Authenticator,
+    admin_required,
+    auth_required,
+)
+from src.cache.SharedCache import SharedCache
 from src.models.Artwork import Artwork
+from src.models.Schemas import ApprovalSchema
+from src.ratelimit.RateLimiter import RateLimiter, client_address, rate_limited
+from src.smartcontract.ApprovalAggregator import APPROVAL_TYPES, ApprovalAggregator
 from src.smartcontract.ArtworkConnector import ArtworkConnector
+from src.smartcontract.EventStream import EventStream
+from utils.compression import register_compression
+from utils.conditional import conditional
+from utils.diagnostics import register_diagnostics
 from utils.error_handlers import register_error_handlers
+from utils.idempotency import idempotency_key
 from utils.logging import logger
+from utils.serialization import OrjsonProvider
+from utils.staleness import register_staleness
 
 ### SETUP ###
 load_dotenv()
 app = Flask(__name__)
+# the client address is the one appended by the proxies in front (cloud run: one)
+app.wsgi_app = ProxyFix(app.wsgi_app, x_for=int(os.environ.get("TRUSTED_PROXIES", 1)))
+app.json = OrjsonProvider(app)
 app.json.sort_keys = False
-cors = CORS(app, supports_credentials=True)
+# preflight responses are cached by browsers for an hour instead of preceding every call
+cors = CORS(
+    app,
+    supports_credentials=True,
+    max_age=3600,
+    expose_headers=[
+        "ETag",
+        "Retry-After",
+        "Age",
+        "Warning",
+        "X-Pending-Transactions",
+    ],
+)
+# with several gunicorn workers the caches live in shared memory, the app has to be
+# preloaded (gunicorn.conf.py) for the workers to inherit the same mappings
+multi_process = int(os.environ.get("WEB_CONCURRENCY", 1)) > 1
 sc = ArtworkConnector(
     signing_private_key=os.environ.get("SMARTCONTRACT_ADMIN_PRIVATE_KEY"),
     http_provider_url=os.environ.get("HTTP_PROVIDER_URL"),
+    simulate_writes=os.environ.get("SIMULATE_WRITES", "true").lower() == "true",
+    read_workers=int(os.environ.get("READ_WORKERS", 8)),
+    read_queue=int(os.environ.get("READ_QUEUE", 16)),
+    write_workers=int(os.environ.get("WRITE_WORKERS", 2)),
+    write_queue=int(os.environ.get("WRITE_QUEUE", 2)),
+    journal_path=os.environ.get("TX_JOURNAL_PATH"),
+    deployment_block=int(os.environ.get("SMARTCONTRACT_DEPLOYMENT_BLOCK", 0)),
+    shared_cache=SharedCache(8192, value_size=1024) if multi_process else None,
+    provider_rate=float(os.environ.get("PROVIDER_RATE", 25)),
+    provider_burst=float(os.environ.get("PROVIDER_BURST", 50)),
+    signer_private_keys=[
+        key.strip()
+        for key in os.environ.get("SMARTCONTRACT_SIGNER_PRIVATE_KEYS", "").split(",")
+        if key.strip()
+    ],
+)
+authenticator = Authenticator(
+    os.environ.get("SMARTCONTRACT_ADMIN_PRIVATE_KEY"),
+    shared_token_cache=SharedCache(8192, value_size=1) if multi_process else None,
+    shared_nonces=SharedCache(131072, value_size=0) if multi_process else None,
+    shared_revocations=SharedCache(131072, value_size=0) if multi_process else None,
+    signature_processes=int(os.environ.get("SIGNATURE_PROCESSES", 0)),
+    signature_queue=int(os.environ.get("SIGNATURE_QUEUE", 256)),
+)
+# request budgets per authenticated address, the auth routes per client address
+buckets = SharedCache(131072, value_size=16) if multi_process else None
+reads = RateLimiter(
+    "read",
+    float(os.environ.get("READ_RATE", 10)),
+    float(os.environ.get("READ_BURST", 20)),
+    shared_cache=buckets,
+)
+writes = RateLimiter(
+    "write",
+    float(os.environ.get("WRITE_RATE", 0.2)),
+    float(os.environ.get("WRITE_BURST", 5)),
+    shared_cache=buckets,
+)
+logins = RateLimiter(
+    "auth",
+    float(os.environ.get("AUTH_RATE", 2)),
+    float(os.environ.get("AUTH_BURST", 20)),
+    shared_cache=buckets,
 )
-authenticator = Authenticator(os.environ.get("SMARTCONTRACT_ADMIN_PRIVATE_KEY"))
+approvals = ApprovalAggregator(
+    sc, shared_cache=SharedCache(8192, value_size=2048) if multi_process else None
+)
+# every open stream holds one of gunicorn's request threads
+events = EventStream(sc, max_subscribers=int(os.environ.get("MAX_EVENT_STREAMS", 4)))
 
 
 ### ROUTES ###
 @app.route("/")
 @auth_required(authenticator)
+@rate_limited(reads)
 def hello() -> str:
     return "Hello from Artis-Project!"
 
 
 @app.post("/auth/payload")
+@rate_limited(logins, key=client_address)
 def payload() -> dict:
     data = request.get_json()
     return authenticator.generate_client_auth_payload(
@@ -41,50 +125,149 @@ def payload() -> dict:
 
 
 @app.post("/auth/login")
+@rate_limited(logins, key=client_address)
 def login() -> dict:
     data = request.get_json().get("payload")
     return {"token": authenticator.generate_auth_token("artis-project", data)}
 
 
 @app.post("/auth/logout")
+@rate_limited(logins, key=client_address)
 def logout() -> dict:
-    g.sender = None
+    authenticator.logout("artis-project", request.headers.get("Authorization"))
     return ("", 204)
 
 
 @app.get("/auth/user")
+@rate_limited(logins, key=client_address)
 def user() -> str | dict:
     return authenticator.user("artis-project", request.headers.get("Authorization"))
 
 
+@app.get("/artworks/events")
+@auth_required(authenticator)
+@rate_limited(reads)
+def stream_events() -> Response:
+    subscription = events.subscribe(g.sender, request.headers.get("Last-Event-ID"))
+    return Response(
+        events.sse(subscription),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.get("/artworks/<int:artwork_id>")
 @auth_required(authenticator)
-def get(artwork_id: int) -> dict:
-    return sc.getArtworkData(artwork_id, g.sender).dump()
+@rate_limited(reads)
+def get(artwork_id: int) -> Response:
+    record = sc.getArtworkRecord(artwork_id, g.sender)
+    response = conditional(record, lambda: Artwork.load(data=record).dump())
+    # transactions of this service changing the artwork that are not mined yet
+    if pending := sc.pendingTransactions(artwork_id):
+        response.headers["X-Pending-Transactions"] = ",".join(pending)
+    return response
 
 
 @app.patch("/artworks/<int:artwork_id>")
 @auth_required(authenticator)
+@rate_limited(writes)
 def update(artwork_id: int) -> dict:
     newArtworkData = Artwork.load(request.get_json() | {"id": artwork_id})
-    return sc.updateArtworkData(newArtworkData, g.sender).dump()
+    return sc.updateArtworkData(
+        newArtworkData, g.sender, idempotency_key=idempotency_key()
+    ).dump()
+
+
+@app.post("/artworks/<int:artwork_id>/approvals")
+@auth_required(authenticator)
+@rate_limited(writes)
+def approve(artwork_id: int) -> tuple[dict, int] | dict:
+    data = ApprovalSchema().load(request.get_json())
+    artwork = approvals.submit(
+        artwork_id,
+        data["requestedStatus"],
+        data["deadline"],
+        data["signature"],
+        sender=g.sender,
+    )
+    if artwork is None:
+        return {"pending": approvals.pending(artwork_id, g.sender)}, 202
+    return artwork.dump()
+
+
+@app.get("/artworks/<int:artwork_id>/approvals")
+@auth_required(authenticator)
+@rate_limited(reads)
+def get_approvals(artwork_id: int) -> dict:
+    # clients sign a StatusApproval message of this domain to approve
+    return {
+        "pending": approvals.pending(artwork_id, g.sender),
+        "domain": approvals.domain,
+        "types": APPROVAL_TYPES,
+        "primaryType": "StatusApproval",
+    }
+
+
+@app.get("/artworks/<int:artwork_id>/history")
+@auth_required(authenticator)
+@rate_limited(reads, cost=5)
+def history(artwork_id: int) -> dict:
+    from_block = request.args.get("fromBlock", type=int)
+    to_block = request.args.get("toBlock", type=int)
+    if any(block is not None and block < 0 for block in (from_block, to_block)):
+        raise BadRequest("block numbers must not be negative")
+    # clients continue a history with fromBlock = toBlock + 1
+    if to_block is None:
+        to_block = sc.blockNumber()
+    events = sc.getArtworkHistory(artwork_id, g.sender, from_block, to_block)
+    return {"toBlock": to_block, "events": events}
 
 
 @app.get("/artworks")
 @auth_required(authenticator)
-def get_all() -> dict:
-    return {"artworks": sc.getArtworkIdsByAddress(g.sender)}
+@rate_limited(reads)
+def get_all() -> Response:
+    artwork_ids = sc.getArtworkIdsByAddress(g.sender)
+    return conditional(artwork_ids, lambda: {"artworks": artwork_ids})
 
 
 @app.post("/artworks")
 @auth_required(authenticator)
+@rate_limited(writes)
 def mint() -> dict:
     artworkData = Artwork.load_from_mint(request.get_json())
-    return {"tokenId": sc.safeMint(to=g.sender, data=artworkData)}
+    return {
+        "tokenId": sc.safeMint(
+            to=g.sender, data=artworkData, idempotency_key=idempotency_key()
+        )
+    }
+
+
+@app.get("/metrics")
+@admin_required(authenticator)
+@rate_limited(reads)
+def metrics() -> dict:
+    return {"pools": sc.poolMetrics(), "provider": sc.providerState}
 
 
 ### HANDLERS ###
 register_error_handlers(app)
+register_compression(app)
+register_staleness(app, sc)
+# profiling and memory introspection for the admin wallet, off unless enabled
+if os.environ.get("DIAGNOSTICS", "false").lower() == "true":
+    register_diagnostics(
+        app,
+        authenticator,
+        lambda: authenticator.cache_sizes()
+        | sc.cacheSizes()
+        | {
+            # the limiters share one table with several workers
+            "rate_buckets": len(buckets)
+            if buckets is not None
+            else len(reads) + len(writes) + len(logins)
+        },
+    )
 
 
 def shutdown_handler(signal_int: int, frame: FrameType) -> None:
@@ -0,0 +1,314 @@
+"""
+Load test for the artis-server REST api.
+
+Starts the flask app against an in-process MockChain (see benchmarks/mock_chain.py),
+drives the authentication flow and all /artworks routes at a configurable concurrency
+and prints throughput and latency percentiles per route as json.
+
+usage: python -m benchmarks.load --concurrency 8 --requests 200 --output bench.json
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+import requests
+from eth_account import Account
+from eth_account.messages import encode_defunct
+from werkzeug.serving import make_server
+
+from benchmarks.mock_chain import ABI_PATH, MockChain, MockProviderServer
+
+PERCENTILES = (50, 90, 95, 99)
+
+# request and provider budgets of the app, unlimited unless set explicitly
+RATE_LIMITS = ("READ_RATE", "WRITE_RATE", "AUTH_RATE", "PROVIDER_RATE")
+
+
+class Stack:
+    """The flask app served by werkzeug, wired to a MockChain served over http"""
+
+    def __init__(
+        self, latency: float = 0.0, jitter: float = 0.0, block_time: float = 0.0
+    ):
+        admin = Account.create()
+        self.chain = MockChain(admin.address, block_time=block_time)
+        self.provider = MockProviderServer(
+            self.chain, latency=latency, jitter=jitter
+        ).start()
+        os.environ.update(
+            SMARTCONTRACT_ADMIN_PRIVATE_KEY=admin.key.hex(),
+            HTTP_PROVIDER_URL=self.provider.url,
+            SMARTCONTRACT_ADDRESS=self.chain.address,
+            SMARTCONTRACT_ABI_PATH=ABI_PATH,
+        )
+        for rate in RATE_LIMITS:
+            os.environ.setdefault(rate, "0")
+        from app import app
+
+        self.app = app
+        logging.getLogger("werkzeug").setLevel(logging.ERROR)
+        self.server = make_server("127.0.0.1", 0, app, threaded=True)
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.provider.stop()
+
+
+class User:
+    """A wallet that logs in to the api the same way the artis frontend does"""
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+        self.account = Account.create()
+        self.token = None
+
+    @property
+    def address(self) -> str:
+        return self.account.address
+
+    @property
+    def headers(self) -> dict:
+        return {"Authorization": f"Bearer {self.token}"}
+
+    def signed_payload(self, session: requests.Session) -> dict:
+        response = session.post(
+            f"{self.base_url}/auth/payload",
+            json={"address": self.address, "chainId": "11155111"},
+        )
+        response.raise_for_status()
+        payload = response.json()["payload"]
+        message = encode_defunct(text=eip4361_message(payload))
+        signature = self.account.sign_message(message).signature.hex()
+        return {"payload": payload, "signature": signature}
+
+    def login(self, session: requests.Session) -> str:
+        response = session.post(
+            f"{self.base_url}/auth/login",
+            json={"payload": self.signed_payload(session)},
+        )
+        response.raise_for_status()
+        self.token = response.json()["token"]
+        return self.token
+
+
+def eip4361_message(payload: dict) -> str:
+    """Client side construction of the sign in message for a /auth/payload response"""
+    type_field = "Ethereum" if payload["type"] == "evm" else "Solana"
+    lines = [
+        f"{payload['domain']} wants you to sign in with your {type_field} account:",
+        payload["address"],
+        "",
+    ]
+    if payload.get("statement"):
+        lines.append(payload["statement"])
+    lines.append("")
+    lines.append(f"Version: {payload['version']}")
+    if payload.get("chain_id"):
+        lines.append(f"Chain ID: {payload['chain_id']}")
+    lines.append(f"Nonce: {payload['nonce']}")
+    lines.append(f"Issued At: {payload['issued_at']}")
+    lines.append(f"Expiration Time: {payload['expiration_time']}")
+    return "\n".join(lines)
+
+
+def percentile(sorted_values: list, p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies: list, errors: int, duration: float) -> dict:
+    values = sorted(latencies)
+    milliseconds = lambda v: round(v * 1000, 3)
+    return {
+        "requests": len(values) + errors,
+        "errors": errors,
+        "duration_s": round(duration, 3),
+        "throughput_rps": round(len(values) / duration, 2) if duration else 0.0,
+        "latency_ms": {
+            "mean": milliseconds(statistics.fmean(values)) if values else 0.0,
+            **{f"p{p}": milliseconds(percentile(values, p)) for p in PERCENTILES},
+            "max": milliseconds(values[-1]) if values else 0.0,
+        },
+    }
+
+
+def run_phase(
+    request: Callable[[requests.Session, int], requests.Response],
+    total: int,
+    concurrency: int,
+) -> dict:
+    """Issue total requests with concurrency worker threads and collect their latencies"""
+    local = threading.local()
+    latencies, errors = [], []
+
+    def one(i: int) -> None:
+        session = getattr(local, "session", None) or requests.Session()
+        local.session = session
+        start = time.perf_counter()
+        try:
+            response = request(session, i)
+            ok = response.status_code < 400
+        except requests.RequestException:
+            ok = False
+        elapsed = time.perf_counter() - start
+        (latencies if ok else errors).append(elapsed)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(total)))
+    return summarize(latencies, len(errors), time.perf_counter() - start)
+
+
+def run(args: argparse.Namespace) -> dict:
+    stack = None
+    if args.url:
+        base_url = args.url.rstrip("/")
+    else:
+        stack = Stack(args.latency, args.jitter, args.block_time)
+        base_url = stack.url
+
+    session = requests.Session()
+    users = [User(base_url) for _ in range(args.users)]
+    for user in users:
+        user.login(session)
+    user_of = lambda i: users[i % len(users)]
+
+    artwork_ids = []
+    for i, user in enumerate(users):
+        peer = users[(i + 1) % len(users)]
+        response = session.post(
+            f"{base_url}/artworks",
+            json={
+                "objectId": f"seed-{i}",
+                "carrier": peer.address,
+                "recipient": peer.address,
+            },
+            headers=user.headers,
+        )
+        response.raise_for_status()
+        artwork_ids.append(response.json()["tokenId"])
+    artwork_of = lambda i: artwork_ids[i % len(artwork_ids)]
+
+    signed_payloads = [user_of(i).signed_payload(session) for i in range(args.requests)]
+
+    phases = {
+        "auth_payload": lambda s, i: s.post(
+            f"{base_url}/auth/payload",
+            json={"address": user_of(i).address, "chainId": "11155111"},
+        ),
+        "auth_login": lambda s, i: s.post(
+            f"{base_url}/auth/login", json={"payload": signed_payloads[i]}
+        ),
+        "auth_user": lambda s, i: s.get(
+            f"{base_url}/auth/user", headers=user_of(i).headers
+        ),
+        "artworks_get": lambda s, i: s.get(
+            f"{base_url}/artworks/{artwork_of(i)}", headers=user_of(i).headers
+        ),
+        "artworks_list": lambda s, i: s.get(
+            f"{base_url}/artworks", headers=user_of(i).headers
+        ),
+        "artworks_update": lambda s, i: s.patch(
+            f"{base_url}/artworks/{artwork_of(i)}",
+            json={"objectId": f"update-{i}"},
+            headers=user_of(i).headers,
+        ),
+        "artworks_mint": lambda s, i: s.post(
+            f"{base_url}/artworks",
+            json={"objectId": f"mint-{i}"},
+            headers=user_of(i).headers,
+        ),
+    }
+    selected = args.phases.split(",") if args.phases else list(phases)
+
+    results = {}
+    for name in selected:
+        provider_calls = stack.chain.rpc_calls if stack else None
+        total = (
+            args.write_requests
+            if name in ("artworks_update", "artworks_mint")
+            else args.requests
+        )
+        results[name] = run_phase(phases[name], total, args.concurrency)
+        if stack:
+            results[name]["provider_calls"] = stack.chain.rpc_calls - provider_calls
+
+    if stack:
+        stack.stop()
+    return {
+        "config": {
+            key: getattr(args, key)
+            for key in (
+                "concurrency",
+                "requests",
+                "write_requests",
+                "users",
+                "latency",
+                "jitter",
+                "block_time",
+                "url",
+            )
+        },
+        "results": results,
+    }
+
+
+def parse_args(argv: list) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument(
+        "--requests", type=int, default=200, help="requests per read/auth route"
+    )
+    parser.add_argument(
+        "--write-requests", type=int, default=50, help="requests per write route"
+    )
+    parser.add_argument("--users", type=int, default=8)
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="provider latency in seconds"
+    )
+    parser.add_argument(
+        "--jitter", type=float, default=0.0, help="uniform provider jitter in seconds"
+    )
+    parser.add_argument(
+        "--block-time",
+        type=float,
+        default=0.0,
+        help="seconds per block, 0 mines instantly",
+    )
+    parser.add_argument("--phases", help="comma separated subset of phases to run")
+    parser.add_argument(
+        "--url", help="benchmark an already running server instead of a local stack"
+    )
+    parser.add_argument(
+        "--output", help="write the json report to this file instead of stdout"
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: list = None) -> None:
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    report = json.dumps(run(args), indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report + "\n")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,558 @@
+import json
+import os
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+import rlp
+from eth_abi import encode
+from eth_account import Account
+from eth_utils import keccak, to_checksum_address, to_hex
+from eth_utils.abi import collapse_if_tuple, event_abi_to_log_topic
+from web3 import Web3
+from web3.providers import BaseProvider
+
+from src.models.Artwork import INITIAL_ADDRESS, NO_CHANGE_ADDRESS
+
+ABI_PATH = os.path.join(os.path.dirname(__file__), "artwork_abi.json")
+CONTRACT_ADDRESS = "0x000000000000000000000000000000000A271500"
+CHAIN_ID = 11155111
+ERROR_SELECTOR = keccak(text="Error(string)")[:4]
+
+
+class RpcError(Exception):
+    """Raised by the mock node, answered as a json-rpc error"""
+
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+    def rpc_error(self) -> dict:
+        return {"code": self.code, "message": self.message}
+
+
+class Revert(RpcError):
+    """Raised by the mock contract, mirrors a solidity revert with a reason string"""
+
+    def __init__(self, reason: str):
+        super().__init__(3, f"execution reverted: {reason}")
+        self.reason = reason
+
+    def rpc_error(self) -> dict:
+        return {
+            "code": 3,
+            "message": f"execution reverted: {self.reason}",
+            "data": to_hex(ERROR_SELECTOR + encode(["string"], [self.reason])),
+        }
+
+
+class MockChain:
+    """
+    In-process stand-in for an ethereum node running the artis smartcontract.
+    Answers the JSON-RPC methods used by web3 and the ArtworkConnector, keeps the
+    artwork state in memory and produces blocks either instantly (block_time=0)
+    or at a fixed interval.
+    """
+
+    def __init__(
+        self,
+        admin_address: str,
+        abi: list = None,
+        address: str = CONTRACT_ADDRESS,
+        block_time: float = 0.0,
+        max_logs: int = None,
+        signers: list = (),
+    ):
+        if abi is None:
+            with open(ABI_PATH) as f:
+                abi = json.load(f)
+        self.abi = abi
+        self.address = to_checksum_address(address)
+        self.admin = to_checksum_address(admin_address)
+        # accounts allowed to send the admin transactions besides the admin
+        self.signers = {self.admin, *map(to_checksum_address, signers)}
+        self.block_time = block_time
+        # providers refuse eth_getLogs queries with too many results
+        self.max_logs = max_logs
+        self._contract = Web3().eth.contract(abi=abi)
+        self._functions = {
+            item["name"]: item for item in abi if item["type"] == "function"
+        }
+        self._events = {item["name"]: item for item in abi if item["type"] == "event"}
+        self._lock = threading.RLock()
+        self._genesis = time.time()
+        self._head = 0
+        self._blocks = {0: self._make_block(0, [])}
+        self._pending = []
+        self._receipts = {}
+        self._logs = []
+        self._nonces = {}
+        self.artworks = {}
+        # (block, token id, artwork before the block or None), to answer reads at past blocks
+        self._history = []
+        # blocks the node answering reads lags behind, like one behind a load balancer
+        self.lag = 0
+        self.rpc_calls = 0
+        self.rpc_counts = Counter()
+
+    ### JSON-RPC ###
+    def handle(self, method: str, params: list) -> Any:
+        with self._lock:
+            self.rpc_calls += 1
+            self.rpc_counts[method] += 1
+            self._advance()
+            handler = getattr(self, f"_rpc_{method}", None)
+            if handler is None:
+                raise NotImplementedError(method)
+            return handler(*params)
+
+    def _rpc_eth_chainId(self) -> str:
+        return hex(CHAIN_ID)
+
+    def _rpc_net_version(self) -> str:
+        return str(CHAIN_ID)
+
+    def _rpc_eth_blockNumber(self) -> str:
+        return hex(self._block_number("latest"))
+
+    def _rpc_eth_gasPrice(self) -> str:
+        return hex(Web3.to_wei(30, "gwei"))
+
+    def _rpc_eth_getTransactionCount(self, address: str, block: str = None) -> str:
+        return hex(self._nonces.get(to_checksum_address(address), 0))
+
+    def _rpc_eth_getBlockByNumber(self, block: str, full: bool = False) -> dict:
+        number = self._block_number(block)
+        return self._blocks.get(number)
+
+    def _rpc_eth_call(self, tx: dict, block: str = "latest") -> str:
+        number = self._block_number(block)
+        if block != "pending" and number > self._block_number("latest"):
+            raise RpcError(-32000, "header not found")
+        sender = tx.get("from", INITIAL_ADDRESS)
+        name, args = self._decode(tx["data"])
+        artworks, self.artworks = self.artworks, self._artworks_at(number)
+        try:
+            return to_hex(self._execute(name, args, sender, dry_run=True))
+        finally:
+            self.artworks = artworks
+
+    def _rpc_eth_estimateGas(self, tx: dict, block: str = "pending") -> str:
+        self._rpc_eth_call(tx, block)
+        return hex(250_000)
+
+    def _rpc_eth_sendRawTransaction(self, raw: str) -> str:
+        raw_bytes = bytes.fromhex(raw[2:])
+        sender = Account.recover_transaction(raw_bytes)
+        if raw_bytes[0] <= 0x7F:
+            # typed transaction: [chainId, nonce, maxPrio, maxFee, gas, to, value, data, ...]
+            data = rlp.decode(raw_bytes[1:])[7]
+        else:
+            # legacy transaction: [nonce, gasPrice, gas, to, value, data, v, r, s]
+            data = rlp.decode(raw_bytes)[5]
+        tx_hash = to_hex(keccak(raw_bytes))
+        self._nonces[sender] = self._nonces.get(sender, 0) + 1
+        include_in = self._head + 1
+        self._pending.append((include_in, tx_hash, sender, to_hex(data)))
+        if not self.block_time:
+            self._head = include_in
+            self._advance()
+        return tx_hash
+
+    def _rpc_eth_getTransactionReceipt(self, tx_hash: str) -> dict:
+        return self._receipts.get(tx_hash)
+
+    def _rpc_eth_getLogs(self, filter_params: dict) -> list:
+        from_block = self._block_number(filter_params.get("fromBlock", "latest"))
+        to_block = self._block_number(filter_params.get("toBlock", "latest"))
+        topics = filter_params.get("topics") or []
+        logs = [
+            log
+            for log in self._logs
+            if from_block <= int(log["blockNumber"], 16) <= to_block
+            and self._topics_match(log["topics"], topics)
+        ]
+        if self.max_logs is not None and len(logs) > self.max_logs:
+            raise RpcError(-32005, f"query returned more than {self.max_logs} results")
+        return logs
+
+    ### contract ###
+    def _execute(self, name: str, args: dict, sender: str, dry_run: bool) -> bytes:
+        method = getattr(self, f"_sc_{name}")
+        result, logs = method(sender=to_checksum_address(sender), **args)
+        if dry_run:
+            return self._encode_output(name, result)
+        return logs
+
+    def _sc_smartcontractAdmin(self, sender: str) -> tuple:
+        return (self.admin,), []
+
+    def _sc_safeMint(self, sender: str, to: str, data: dict) -> tuple:
+        if sender not in self.signers:
+            raise Revert("caller is not the smartcontract admin 403")
+        token_id = len(self.artworks) + 1
+        artwork = {
+            "id": token_id,
+            "objectId": data["objectId"],
+            "owner": to_checksum_address(to),
+            "carrier": data["carrier"],
+            "logger": data["logger"],
+            "recipient": data["recipient"],
+            "currentStatus": "TO_BE_DELIVERED",
+            "requestedStatus": "NONE",
+            "approvals": {"owner": False, "carrier": False, "recipient": False},
+            "violationTimestamp": 0,
+        }
+        logs = [self._event("Transfer", INITIAL_ADDRESS, artwork["owner"], token_id)]
+        return (), [(artwork, logs)]
+
+    def _sc_updateArtworkData(self, sender: str, newData: dict, sender_: str) -> tuple:
+        return self._update(newData, sender_)
+
+    def _sc_approveStatusChange(
+        self,
+        sender: str,
+        artworkId: int,
+        requestedStatus: str,
+        approvers: list,
+        signatures: list,
+    ) -> tuple:
+        """
+        Batched status approvals, not part of the deployed contract. Only answered if the
+        abi passed to the chain declares the function, signatures are not checked.
+        """
+        if sender not in self.signers:
+            raise Revert("caller is not the smartcontract admin 403")
+        new_data = {
+            "id": artworkId,
+            "objectId": "",
+            **{
+                role: NO_CHANGE_ADDRESS
+                for role in ("owner", "carrier", "logger", "recipient")
+            },
+            "status": {"currentStatus": "", "requestedStatus": requestedStatus},
+            "violationTimestamp": 0,
+        }
+        artworks = dict(self.artworks)
+        try:
+            for approver in approvers:
+                _, [(artwork, logs)] = self._update(new_data, approver)
+                self.artworks[artworkId] = artwork
+        finally:
+            self.artworks = artworks
+        # like the contract a single Updated event carries the final state
+        return (), [(artwork, logs)]
+
+    def _sc_getArtworkIdsByAddress(self, sender: str, _address: str) -> tuple:
+        address = to_checksum_address(_address)
+        total = len(self.artworks)
+        ids = {role: [] for role in ("owner", "carrier", "logger", "recipient")}
+        for token_id, artwork in self.artworks.items():
+            for role in ids:
+                if artwork[role] == address:
+                    ids[role].append(token_id)
+        # the contract zero pads every list to the total supply of tokens
+        padded = tuple(ids[role] + [0] * (total - len(ids[role])) for role in ids)
+        return (padded,), []
+
+    def _sc_getArtworkData(self, sender: str, artworkId: int, sender_: str) -> tuple:
+        artwork = self._authorized(artworkId, sender_)
+        return (
+            (
+                artwork["id"],
+                artwork["objectId"],
+                artwork["owner"],
+                artwork["carrier"],
+                artwork["logger"],
+                artwork["recipient"],
+                artwork["currentStatus"],
+                artwork["requestedStatus"],
+                artwork["approvals"]["owner"],
+                artwork["approvals"]["carrier"],
+                artwork["approvals"]["recipient"],
+                artwork["violationTimestamp"],
+            ),
+        ), []
+
+    def _update(self, new_data: dict, user: str) -> tuple:
+        current = self._authorized(new_data["id"], user)
+        artwork = dict(current, approvals=dict(current["approvals"]))
+        for field in ("owner", "carrier", "logger", "recipient"):
+            if new_data[field] != NO_CHANGE_ADDRESS:
+                artwork[field] = to_checksum_address(new_data[field])
+        if new_data["objectId"]:
+            artwork["objectId"] = new_data["objectId"]
+        if new_data["violationTimestamp"]:
+            artwork["violationTimestamp"] = new_data["violationTimestamp"]
+        requested = new_data["status"]["requestedStatus"]
+        if requested and requested != artwork["requestedStatus"]:
+            artwork["requestedStatus"] = requested
+            artwork["approvals"] = {
+                "owner": False,
+                "carrier": False,
+                "recipient": False,
+            }
+        if artwork["requestedStatus"] != "NONE":
+            for role in artwork["approvals"]:
+                if artwork[role] == to_checksum_address(user):
+                    artwork["approvals"][role] = True
+            if all(artwork["approvals"].values()):
+                artwork["currentStatus"] = artwork["requestedStatus"]
+                artwork["requestedStatus"] = "NONE"
+                artwork["approvals"] = {
+                    "owner": False,
+                    "carrier": False,
+                    "recipient": False,
+                }
+        logs = [
+            self._event(
+                "Updated",
+                artwork["id"],
+                (
+                    artwork["id"],
+                    artwork["objectId"],
+                    artwork["carrier"],
+                    artwork["logger"],
+                    artwork["recipient"],
+                    (artwork["currentStatus"], artwork["requestedStatus"]),
+                    artwork["violationTimestamp"],
+                ),
+                artwork["owner"],
+                tuple(artwork["approvals"].values()),
+            )
+        ]
+        return (), [(artwork, logs)]
+
+    def _authorized(self, artwork_id: int, user: str) -> dict:
+        if artwork_id not in self.artworks:
+            raise Revert("artwork does not exist 404")
+        artwork = self.artworks[artwork_id]
+        user = to_checksum_address(user)
+        if user not in (
+            artwork["owner"],
+            artwork["carrier"],
+            artwork["logger"],
+            artwork["recipient"],
+        ):
+            raise Revert("sender is not authorized to access this artwork 403")
+        return artwork
+
+    ### helpers ###
+    def _decode(self, data: str) -> tuple:
+        func, args = self._contract.decode_function_input(data)
+        # the contract argument "sender" would clash with msg.sender
+        if "sender" in args:
+            args["sender_"] = args.pop("sender")
+        return func.fn_name, args
+
+    def _encode_output(self, name: str, result: tuple) -> bytes:
+        outputs = self._functions[name]["outputs"]
+        return encode([collapse_if_tuple(o) for o in outputs], list(result))
+
+    def _event(self, name: str, *values) -> tuple:
+        event = self._events[name]
+        topics = [to_hex(event_abi_to_log_topic(event))]
+        data_types, data_values = [], []
+        for item, value in zip(event["inputs"], values):
+            if item["indexed"]:
+                topics.append(to_hex(encode([collapse_if_tuple(item)], [value])))
+            else:
+                data_types.append(collapse_if_tuple(item))
+                data_values.append(value)
+        return topics, to_hex(encode(data_types, data_values))
+
+    @staticmethod
+    def _topics_match(log_topics: list, wanted: list) -> bool:
+        for i, topic in enumerate(wanted):
+            if topic is None:
+                continue
+            if i >= len(log_topics):
+                return False
+            options = topic if isinstance(topic, list) else [topic]
+            if log_topics[i].lower() not in [o.lower() for o in options]:
+                return False
+        return True
+
+    def _block_number(self, block: str) -> int:
+        if block == "pending":
+            return self._head
+        if block in ("latest", "safe", "finalized"):
+            return max(0, self._head - self.lag)
+        if block == "earliest":
+            return 0
+        return int(block, 16) if isinstance(block, str) else int(block)
+
+    def _artworks_at(self, number: int) -> dict:
+        """The artworks as of block number"""
+        artworks = self.artworks
+        for block, token_id, previous in reversed(self._history):
+            if block <= number:
+                break
+            if artworks is self.artworks:
+                artworks = dict(self.artworks)
+            if previous is None:
+                del artworks[token_id]
+            else:
+                artworks[token_id] = previous
+        return artworks
+
+    def _make_block(self, number: int, transactions: list) -> dict:
+        if self.block_time:
+            timestamp = int(self._genesis + number * self.block_time)
+        else:
+            timestamp = int(time.time())
+        return {
+            "number": hex(number),
+            "hash": to_hex(keccak(number.to_bytes(32, "big"))),
+            "parentHash": to_hex(keccak(max(number - 1, 0).to_bytes(32, "big"))),
+            "timestamp": hex(timestamp),
+            "gasLimit": hex(30_000_000),
+            "gasUsed": hex(0),
+            "miner": INITIAL_ADDRESS,
+            "transactions": transactions,
+        }
+
+    def _advance(self) -> None:
+        """Produce all blocks up to the current time and mine the pending transactions"""
+        if self.block_time:
+            self._head = max(
+                self._head, int((time.time() - self._genesis) / self.block_time)
+            )
+        for number in range(max(self._blocks) + 1, self._head + 1):
+            included = [p for p in self._pending if p[0] <= number]
+            self._pending = [p for p in self._pending if p[0] > number]
+            self._blocks[number] = self._make_block(number, [p[1] for p in included])
+            for index, (_, tx_hash, sender, data) in enumerate(included):
+                self._mine(number, index, tx_hash, sender, data)
+
+    def _mine(self, number: int, index: int, tx_hash: str, sender: str, data: str):
+        block_hash = self._blocks[number]["hash"]
+        status, logs = 1, []
+        try:
+            name, args = self._decode(data)
+            for artwork, events in self._execute(name, args, sender, dry_run=False):
+                self._history.append(
+                    (number, artwork["id"], self.artworks.get(artwork["id"]))
+                )
+                self.artworks[artwork["id"]] = artwork
+                logs.extend(events)
+        except Revert:
+            status = 0
+        receipt_logs = []
+        for topics, log_data in logs:
+            receipt_logs.append(
+                {
+                    "address": self.address,
+                    "topics": topics,
+                    "data": log_data,
+                    "blockNumber": hex(number),
+                    "blockHash": block_hash,
+                    "transactionHash": tx_hash,
+                    "transactionIndex": hex(index),
+                    "logIndex": hex(len(self._logs) + len(receipt_logs)),
+                    "removed": False,
+                }
+            )
+        self._logs.extend(receipt_logs)
+        self._receipts[tx_hash] = {
+            "transactionHash": tx_hash,
+            "transactionIndex": hex(index),
+            "blockHash": block_hash,
+            "blockNumber": hex(number),
+            "from": sender,
+            "to": self.address,
+            "cumulativeGasUsed": hex(250_000),
+            "gasUsed": hex(250_000),
+            "effectiveGasPrice": hex(Web3.to_wei(30, "gwei")),
+            "contractAddress": None,
+            "logs": receipt_logs,
+            "logsBloom": "0x" + "00" * 256,
+            "status": hex(status),
+            "type": "0x0",
+        }
+
+
+class InProcessProvider(BaseProvider):
+    """web3 provider answering from a MockChain directly, to measure client side cpu cost without http"""
+
+    def __init__(self, chain: MockChain):
+        super().__init__()
+        self.chain = chain
+
+    def make_request(self, method: str, params: Any) -> dict:
+        response = {"jsonrpc": "2.0", "id": 0}
+        try:
+            response["result"] = self.chain.handle(method, list(params))
+        except RpcError as error:
+            response["error"] = error.rpc_error()
+        return response
+
+    def is_connected(self, show_traceback: bool = False) -> bool:
+        return True
+
+
+class MockProviderServer(ThreadingHTTPServer):
+    """
+    Serves a MockChain over HTTP JSON-RPC so it can be used as HTTP_PROVIDER_URL.
+    Every call is delayed by latency (+ uniform jitter) seconds to emulate a remote node.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        chain: MockChain,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+    ):
+        super().__init__((host, port), _JsonRpcHandler)
+        self.chain = chain
+        self.latency = latency
+        self.jitter = jitter
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MockProviderServer":
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+class _JsonRpcHandler(BaseHTTPRequestHandler):
+    def do_POST(self) -> None:
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        server: MockProviderServer = self.server
+        if delay := server.latency + random.uniform(0, server.jitter):
+            time.sleep(delay)
+        response = {"jsonrpc": "2.0", "id": body.get("id")}
+        try:
+            response["result"] = server.chain.handle(
+                body["method"], body.get("params", [])
+            )
+        except RpcError as error:
+            response["error"] = error.rpc_error()
+        except NotImplementedError as e:
+            response["error"] = {"code": -32601, "message": f"method {e} not found"}
+        payload = json.dumps(response).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format: str, *args) -> None:
+        pass
@@ -0,0 +1,100 @@
+"""
+Serialization benchmark for a bulk artwork response.
+
+Encodes the dumps of N artworks with the stdlib json provider, the orjson provider and
+the binary encodings, and reports encode time and bytes on the wire (raw and compressed)
+as json.
+
+usage: python -m benchmarks.serialization --artworks 1000 --output serialization.json
+"""
+import argparse
+import json
+import sys
+import timeit
+
+from eth_account import Account
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from src.models.Artwork import Artwork
+from utils.compression import compress_data, ENCODINGS
+from utils.serialization import ENCODERS, OrjsonProvider
+
+
+def artworks(count: int) -> dict:
+    addresses = [Account.create().address for _ in range(8)]
+    return {
+        "artworks": [
+            Artwork.load(
+                {
+                    "id": i,
+                    "objectId": f"object-{i:06d}",
+                    "owner": addresses[i % 8],
+                    "carrier": addresses[(i + 1) % 8],
+                    "logger": addresses[(i + 2) % 8],
+                    "recipient": addresses[(i + 3) % 8],
+                    "currentStatus": "IN_TRANSIT",
+                    "requestedStatus": "DELIVERED",
+                    "ownerApproval": True,
+                    "carrierApproval": False,
+                    "recipientApproval": False,
+                    "violationTimestamp": 0,
+                }
+            ).dump()
+            for i in range(1, count + 1)
+        ]
+    }
+
+
+def measure(encoder, body: dict, repeat: int) -> dict:
+    data = encoder(body)
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    seconds = min(timeit.repeat(lambda: encoder(body), number=1, repeat=repeat))
+    result = {"encode_ms": round(seconds * 1000, 3), "bytes": len(data)}
+    for encoding in ENCODINGS:
+        compressed = timeit.repeat(
+            lambda: compress_data(data, encoding), number=1, repeat=3
+        )
+        result[f"bytes_{encoding}"] = len(compress_data(data, encoding))
+        result[f"{encoding}_ms"] = round(min(compressed) * 1000, 3)
+    return result
+
+
+def run(args: argparse.Namespace) -> dict:
+    body = artworks(args.artworks)
+    app = Flask(__name__)
+    stdlib, fast = DefaultJSONProvider(app), OrjsonProvider(app)
+    stdlib.sort_keys = fast.sort_keys = False
+    encoders = {
+        "json_stdlib": lambda b: stdlib.dumps(b, separators=(",", ":")),
+        "json_orjson": fast.dumps,
+        **ENCODERS,
+    }
+    return {
+        "config": {"artworks": args.artworks, "repeat": args.repeat},
+        "results": {
+            name: measure(encoder, body, args.repeat)
+            for name, encoder in encoders.items()
+        },
+    }
+
+
+def main(argv: list = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--artworks", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument(
+        "--output", help="write the json report to this file instead of stdout"
+    )
+    args = parser.parse_args(sys.argv[1:] if argv is None else argv)
+    report = json.dumps(run(args), indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report + "\n")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
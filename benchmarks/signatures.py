@@ -0,0 +1,117 @@
+"""
+Login throughput benchmark for the signature pool.
+
+Runs bursts of /auth/login verifications (signature recovery and token signing) from
+concurrent threads against an Authenticator for each number of signature processes, 0
+runs them on the request threads, and reports logins per second per pool size as json.
+
+usage: python -m benchmarks.signatures --processes 0,1,2,4 --logins 400 --output signatures.json
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+import sys
+import time
+
+from eth_account import Account
+from eth_account.messages import encode_defunct
+
+from benchmarks.load import eip4361_message
+from src.authentication.Authenticator import Authenticator
+
+DOMAIN = "artis-project"
+
+
+def signed_payloads(authenticator: Authenticator, wallets: list, count: int) -> list:
+    """Login bodies as clients send them, signed ahead of the measurement"""
+    payloads = []
+    for i in range(count):
+        wallet = wallets[i % len(wallets)]
+        payload = authenticator.generate_client_auth_payload(wallet.address, "1")
+        payload = payload["payload"]
+        message = encode_defunct(text=eip4361_message(payload))
+        signature = wallet.sign_message(message).signature.hex()
+        payloads.append({"payload": payload, "signature": signature})
+    return payloads
+
+
+def measure(
+    signing_key: str, processes: int, payloads: list, concurrency: int, warmup: list
+) -> dict:
+    authenticator = Authenticator(signing_key, signature_processes=processes)
+    try:
+        with ThreadPoolExecutor(concurrency) as threads:
+            # starts the pool processes outside of the measurement
+            list(
+                threads.map(
+                    lambda p: authenticator.generate_auth_token(DOMAIN, p), warmup
+                )
+            )
+            before = authenticator.signatures.metrics()
+            start = time.perf_counter()
+            list(
+                threads.map(
+                    lambda p: authenticator.generate_auth_token(DOMAIN, p), payloads
+                )
+            )
+            duration = time.perf_counter() - start
+        after = authenticator.signatures.metrics()
+    finally:
+        authenticator.signatures.shutdown()
+    batches = after["batches"] - before["batches"]
+    pooled = after["pooled"] - before["pooled"]
+    return {
+        "logins_per_second": round(len(payloads) / duration, 1),
+        "mean_login_ms": round(1000 * duration * concurrency / len(payloads), 2),
+        "mean_batch_size": round(pooled / batches, 2) if batches else 0.0,
+        "in_thread": after["in_thread"] - before["in_thread"],
+    }
+
+
+def run(args: argparse.Namespace) -> dict:
+    signing_key = Account.create().key.hex()
+    wallets = [Account.create() for _ in range(args.users)]
+    # nonces are bound to the signing key, every Authenticator below accepts them
+    issuer = Authenticator(signing_key)
+    results = {}
+    for processes in [int(p) for p in args.processes.split(",")]:
+        payloads = signed_payloads(issuer, wallets, args.logins)
+        warmup = signed_payloads(issuer, wallets, max(processes, 1) * 2)
+        results[str(processes)] = measure(
+            signing_key, processes, payloads, args.concurrency, warmup
+        )
+    return {
+        "config": {
+            "processes": args.processes,
+            "logins": args.logins,
+            "concurrency": args.concurrency,
+            "users": args.users,
+            "cpus": os.cpu_count(),
+        },
+        "results": results,
+    }
+
+
+def main(argv: list = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--processes", default="0,1,2,4", help="comma separated pool sizes"
+    )
+    parser.add_argument("--logins", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--users", type=int, default=8)
+    parser.add_argument(
+        "--output", help="write the json report to this file instead of stdout"
+    )
+    args = parser.parse_args(sys.argv[1:] if argv is None else argv)
+    report = json.dumps(run(args), indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report + "\n")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
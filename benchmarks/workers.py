@@ -0,0 +1,136 @@
+"""
+Worker scaling benchmark for the auth routes.
+
+Serves the app with gunicorn (gunicorn.conf.py, preloaded, shared memory caches) for
+each worker count against a MockChain served over http, runs the auth phases of the
+load test against it and reports throughput per worker count as json.
+
+usage: python -m benchmarks.workers --workers 1,2,4 --requests 400 --output workers.json
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import requests
+from eth_account import Account
+
+from benchmarks import load
+from benchmarks.mock_chain import ABI_PATH, MockChain, MockProviderServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def serve(workers: int, env: dict) -> tuple[subprocess.Popen, str]:
+    """Starts gunicorn with the given number of workers and waits until it answers"""
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app:app"],
+        cwd=ROOT,
+        env={**os.environ, **env, "PORT": str(port), "WEB_CONCURRENCY": str(workers)},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            requests.get(f"{url}/auth/user", timeout=1)
+            return process, url
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError(f"gunicorn with {workers} workers did not start")
+
+
+def run(args: argparse.Namespace) -> dict:
+    admin = Account.create()
+    chain = MockChain(admin.address)
+    provider = MockProviderServer(chain).start()
+    env = {
+        "SMARTCONTRACT_ADMIN_PRIVATE_KEY": admin.key.hex(),
+        "HTTP_PROVIDER_URL": provider.url,
+        "SMARTCONTRACT_ADDRESS": chain.address,
+        "SMARTCONTRACT_ABI_PATH": ABI_PATH,
+        **{rate: os.environ.get(rate, "0") for rate in load.RATE_LIMITS},
+    }
+    results = {}
+    try:
+        for workers in [int(w) for w in args.workers.split(",")]:
+            process, url = serve(workers, env)
+            try:
+                report = load.run(
+                    load.parse_args(
+                        [
+                            "--url",
+                            url,
+                            "--phases",
+                            args.phases,
+                            "--requests",
+                            str(args.requests),
+                            "--concurrency",
+                            str(args.concurrency),
+                            "--users",
+                            str(args.users),
+                        ]
+                    )
+                )
+            finally:
+                process.terminate()
+                process.wait(timeout=30)
+            results[str(workers)] = {
+                phase: {
+                    "throughput_rps": result["throughput_rps"],
+                    "errors": result["errors"],
+                    "p50_ms": result["latency_ms"]["p50"],
+                    "p99_ms": result["latency_ms"]["p99"],
+                }
+                for phase, result in report["results"].items()
+            }
+    finally:
+        provider.stop()
+    return {
+        "config": {
+            "workers": args.workers,
+            "phases": args.phases,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "users": args.users,
+            "cpus": os.cpu_count(),
+        },
+        "results": results,
+    }
+
+
+def main(argv: list = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--workers", default="1,2,4", help="comma separated worker counts"
+    )
+    parser.add_argument("--phases", default="auth_payload,auth_login,auth_user")
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--users", type=int, default=8)
+    parser.add_argument(
+        "--output", help="write the json report to this file instead of stdout"
+    )
+    args = parser.parse_args(sys.argv[1:] if argv is None else argv)
+    report = json.dumps(run(args), indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report + "\n")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,14 @@
+# gunicorn settings, `gunicorn -c gunicorn.conf.py app:app`
+# https://docs.gunicorn.org/en/stable/settings.html
+import os
+
+bind = f":{os.environ.get('PORT', 8080)}"
+# one worker process per core, WEB_CONCURRENCY > 1 also switches the app to shared
+# memory caches
+workers = int(os.environ.get("WEB_CONCURRENCY", 1))
+threads = 8
+# disabled to let Cloud Run handle instance scaling
+timeout = 0
+# the app (abi, contract setup and the shared memory caches) is loaded once in the
+# master and inherited by the forked workers
+preload_app = True
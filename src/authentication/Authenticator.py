@@ -1,4 +1,6 @@
 import base64
+import hashlib
+import hmac
 import json
 from datetime import datetime, timedelta
 from functools import wraps
@@ -12,10 +14,14 @@ from src.authentication.auth_types import (
     LoginPayloadData,
     VerifyOptions,
 )
-from eth_account.messages import encode_defunct
+from src.authentication.NonceIssuer import NonceIssuer
+from src.authentication.SignaturePool import SignaturePool
+from src.authentication.timestamps import ISO_FORMAT, format_timestamp
+from src.authentication.TokenVerifier import TokenVerifier
+from src.cache.SharedCache import SharedCache
 from flask import g, request
 from web3.eth.base_eth import Account
-from werkzeug.exceptions import Unauthorized
+from werkzeug.exceptions import Forbidden, Unauthorized
 
 
 class Authenticator:
@@ -23,12 +29,38 @@ class Authenticator:
         self,
         signing_key: str,
         timezone=pytz.timezone("Europe/Zurich"),
-        timeformat="%Y-%m-%dT%H:%M:%S%z",
+        timeformat=ISO_FORMAT,
+        token_cache_size: int = 1024,
+        shared_token_cache: SharedCache = None,
+        shared_nonces: SharedCache = None,
+        shared_revocations: SharedCache = None,
+        signature_processes: int = 0,
+        signature_queue: int = 256,
     ):
         self._signing_key = signing_key
         self.timezone = timezone
         self.timeformat = timeformat
         self.signing_account = Account.from_key(signing_key)
+        # signature recovery and signing in processes of their own, if any
+        self.signatures = SignaturePool(
+            signing_key, signature_processes, max_queue=signature_queue
+        )
+        self.token_verifier = TokenVerifier(
+            self.signing_account.address,
+            recover_address=self._recover_address,
+            cache_size=token_cache_size,
+            shared_cache=shared_token_cache,
+            revoked=shared_revocations,
+        )
+        # nonces are bound with a key derived from the signing key, so every instance
+        # sharing the signing key accepts them
+        self.nonces = NonceIssuer(
+            hmac.new(
+                self.signing_account.key, b"artis-project login nonce", hashlib.sha256
+            ).digest(),
+            validity=timedelta(hours=1),
+            used=shared_nonces,
+        )
 
     def user(self, domain: str, token: str) -> dict | str:
         """
@@ -41,6 +73,7 @@ class Authenticator:
             return "null"
 
     def generate_client_auth_payload(self, address: str, chain_id: str):
+        now = datetime.now(self.timezone)
         return {
             "payload": {
                 "version": "1",
@@ -48,11 +81,9 @@ class Authenticator:
                 "domain": "artis-project",
                 "address": address,
                 "chain_id": chain_id,
-                "nonce": str(uuid4()),
-                "issued_at": datetime.now(self.timezone).strftime(self.timeformat),
-                "expiration_time": (
-                    datetime.now(self.timezone) + timedelta(hours=1)
-                ).strftime(self.timeformat),
+                "nonce": self.nonces.issue(address),
+                "issued_at": self._format_time(now),
+                "expiration_time": self._format_time(now + timedelta(hours=1)),
             }
         }
 
@@ -93,6 +124,9 @@ class Authenticator:
                 f"Chain ID '{options.chain_id}' does not match payload chain ID '{payload.payload.chain_id}'"
             )
 
+        # Check that the nonce was issued by us for this address before paying for the signature recovery
+        self.nonces.check(payload.payload.nonce, payload.payload.address)
+
         # Check that the signing address is the claimed wallet address
         message = self._generate_message(payload.payload)
         user_address = self._recover_address(message, payload.signature)
@@ -101,6 +135,9 @@ class Authenticator:
                 f"The intended payload address '{payload.payload.address.lower()}' is not the payload signer"
             )
 
+        # Check that the nonce has not been used for a login before
+        self.nonces.consume(payload.payload.nonce, payload.payload.address)
+
         return user_address
 
     def generate_auth_token(
@@ -164,56 +201,23 @@ class Authenticator:
         :param token: The authentication token to authenticate with
         :return: The address of the authenticated wallet
         """
-        if token is None:
-            raise Unauthorized("missing token")
-
-        token = token.replace("Bearer ", "")
-        try:
-            _, payload, signature = token.split(".")
-        except ValueError:
-            raise Unauthorized("invalid token format")
-
-        token = token.replace("Bearer ", "")
-        encoded_payload = token.split(".")[1]
-        encoded_signature = token.split(".")[2]
-        payload_dict = json.loads(self._base64decode(encoded_payload))
-        payload = AuthenticationPayloadData(**payload_dict)
-        signature = self._base64decode(encoded_signature)
-
-        # Check that the intended audience matches the domain
-        if payload.aud != domain:
-            raise Unauthorized(
-                f"Expected token to be for the domain '{domain}', but found token with domain '{payload.aud}'"
-            )
-
-        # Check that the token is past the invalid before time
-        current_time = datetime.now(self.timezone)
-        if current_time < datetime.fromtimestamp(payload.nbf, self.timezone):
-            raise Unauthorized(
-                f"This token is invalid before epoch time '{payload.nbf}', current epoch time is '{int(current_time.timestamp())}'"
-            )
+        return self.token_verifier.verify(domain, token)
 
-        # Check that the token hasn't expired
-        if current_time > datetime.fromtimestamp(payload.exp, self.timezone):
-            raise Unauthorized(
-                f"This token expired at epoch time '{payload.exp}', current epoch time is '{int(current_time.timestamp())}'"
-            )
+    def logout(self, domain: str, token: str) -> None:
+        """
+        Revokes the authentication token until it expires, invalid tokens are rejected anyway
 
-        # Check that the connected wallet matches the token issuer
-        if self.signing_account.address.lower() != payload.iss.lower():
-            raise Unauthorized(
-                f"Expected the connected wallet address '{self.signing_account.address}' to match the token issuer address '{payload.iss}'"
-            )
+        :param domain: The domain of the application the token was issued for
+        :param token: The authentication token to revoke
+        """
+        try:
+            self.token_verifier.revoke(domain, token)
+        except Unauthorized:
+            pass
 
-        # Check that the connected wallet signed the token
-        admin_address = self._recover_address(
-            self._stringify(payload.__dict__), signature
-        )
-        if admin_address.lower() != self.signing_account.address.lower():
-            raise Unauthorized(
-                f"The connected wallet address '{self.signing_account.address}' did not sign the token"
-            )
-        return payload.sub
+    def cache_sizes(self) -> dict:
+        """Sizes of the token and nonce caches"""
+        return self.token_verifier.cache_sizes() | {"used_nonces": len(self.nonces)}
 
     def _stringify(self, value: Any) -> str:
         """
@@ -241,35 +245,39 @@ class Authenticator:
             suffixArray.append(chainField)
         nonceField = f"Nonce: {payload.nonce}"
         suffixArray.append(nonceField)
-        time = payload.issued_at.strftime(self.timeformat)
+        time = payload.issued_at_text or self._format_time(payload.issued_at)
         issuedAtField = f"Issued At: {time}"
         suffixArray.append(issuedAtField)
-        time = payload.expiration_time.strftime(self.timeformat)
+        time = payload.expiration_time_text or self._format_time(
+            payload.expiration_time
+        )
         expiryField = f"Expiration Time: {time}"
         suffixArray.append(expiryField)
 
         suffix = "\n".join(suffixArray)
         return f"{prefix}\n{suffix}"
 
+    def _format_time(self, value: datetime) -> str:
+        """
+        Formats a timestamp for auth payloads, the default format skips strftime
+        """
+        if self.timeformat == ISO_FORMAT:
+            return format_timestamp(value)
+        return value.strftime(self.timeformat)
+
     def _sign_message(self, message: str) -> str:
         """
         Sign a message with the admin wallet
         """
 
-        message_hash = encode_defunct(text=message)
-        sig = self.signing_account.sign_message(message_hash)
-        return sig.signature.hex()
+        return self.signatures.sign(message)
 
-    @staticmethod
-    def _recover_address(message: str, signature: str) -> str:
+    def _recover_address(self, message: str, signature: str) -> str:
         """
         Recover the signing address from a signed message
         """
 
-        message_hash = encode_defunct(text=message)
-        address = Account.recover_message(message_hash, signature=signature)
-
-        return address
+        return self.signatures.recover(message, signature)
 
     @staticmethod
     def _base64encode(message: str) -> str:
@@ -292,8 +300,25 @@ def auth_required(authenticator: Authenticator):
     def decorator(func):
         @wraps(func)
         def wrapper(*args, **kwargs):
-            print(token := request.headers.get("Authorization"))
+            token = request.headers.get("Authorization")
+            g.sender = authenticator.authenticate("artis-project", token)
+            return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def admin_required(authenticator: Authenticator):
+    """Like auth_required, but only admits the admin wallet signing the tokens"""
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            token = request.headers.get("Authorization")
             g.sender = authenticator.authenticate("artis-project", token)
+            if g.sender.lower() != authenticator.signing_account.address.lower():
+                raise Forbidden("only the admin wallet may use this route")
             return func(*args, **kwargs)
 
         return wrapper
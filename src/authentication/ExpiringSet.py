@@ -0,0 +1,62 @@
+import heapq
+import math
+import threading
+import time
+from typing import Hashable
+
+
+class ExpiringSet:
+    """
+    Set of keys that each expire at their own epoch time.
+
+    Keys are grouped into buckets by expiry time so expired keys are dropped a whole
+    bucket at a time on insertion, membership checks are a single dict lookup.
+    """
+
+    def __init__(self, granularity: int = 60, max_size: int = None):
+        self.granularity = granularity
+        self.max_size = max_size
+        self._expiry: dict[Hashable, float] = {}
+        self._buckets: dict[int, list] = {}
+        self._bucket_heap: list[int] = []
+        self._lock = threading.Lock()
+
+    def __contains__(self, key: Hashable) -> bool:
+        expires_at = self._expiry.get(key)
+        return expires_at is not None and expires_at > time.time()
+
+    def __len__(self) -> int:
+        return len(self._expiry)
+
+    def add(self, key: Hashable, expires_at: float) -> bool:
+        """
+        Adds key until expires_at
+
+        :return: False if the key was already present and has not expired yet
+        :raises OverflowError: if the set holds max_size unexpired keys
+        """
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            if key in self:
+                return False
+            if expires_at <= now:
+                return True
+            if self.max_size is not None and len(self._expiry) >= self.max_size:
+                raise OverflowError("expiring set is full")
+            index = math.ceil(expires_at / self.granularity)
+            if index not in self._buckets:
+                self._buckets[index] = []
+                heapq.heappush(self._bucket_heap, index)
+            self._buckets[index].append(key)
+            self._expiry[key] = expires_at
+            return True
+
+    def _expire(self, now: float) -> None:
+        """drops every bucket whose keys have all expired"""
+        while self._bucket_heap and self._bucket_heap[0] * self.granularity <= now:
+            index = heapq.heappop(self._bucket_heap)
+            for key in self._buckets.pop(index):
+                # the key may have been re-added with a later expiry
+                if self._expiry.get(key, math.inf) <= index * self.granularity:
+                    del self._expiry[key]
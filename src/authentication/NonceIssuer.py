@@ -0,0 +1,87 @@
+import hashlib
+import hmac
+import secrets
+import time
+from datetime import timedelta
+
+from werkzeug.exceptions import ServiceUnavailable, Unauthorized
+
+from src.authentication.ExpiringSet import ExpiringSet
+from src.cache.SharedCache import SharedCache
+
+# nonce layout (hex): 8 chars issue time | 16 chars random | 32 chars hmac
+TIME_LENGTH = 8
+RANDOM_LENGTH = 16
+MAC_LENGTH = 32
+NONCE_LENGTH = TIME_LENGTH + RANDOM_LENGTH + MAC_LENGTH
+
+
+class NonceIssuer:
+    """
+    Issues login nonces that are bound to the issue time and the wallet address by an
+    hmac, so any instance sharing the secret can check them without storage. Nonces
+    that were used for a login are remembered until they expire to reject replays.
+    """
+
+    def __init__(
+        self,
+        secret: bytes,
+        validity: timedelta = timedelta(hours=1),
+        max_clock_skew: timedelta = timedelta(seconds=30),
+        max_pending: int = 100_000,
+        used: SharedCache = None,
+    ):
+        self._secret = secret
+        self.validity = int(validity.total_seconds())
+        self.max_clock_skew = int(max_clock_skew.total_seconds())
+        # several gunicorn workers have to share the used nonces to reject replays
+        self._used = (
+            used
+            if used is not None
+            else ExpiringSet(granularity=60, max_size=max_pending)
+        )
+
+    def __len__(self) -> int:
+        """Number of used nonces kept until they expire"""
+        return len(self._used)
+
+    def issue(self, address: str) -> str:
+        """Generates a nonce for a login of address, valid for the configured validity"""
+        issued = f"{int(time.time()):0{TIME_LENGTH}x}"
+        random = secrets.token_hex(RANDOM_LENGTH // 2)
+        return f"{issued}{random}{self._mac(issued + random, address)}"
+
+    def check(self, nonce: str, address: str) -> int:
+        """
+        Checks that the nonce was issued by this server for address and is still valid
+
+        :return: the epoch time at which the nonce expires
+        """
+        if not isinstance(nonce, str) or len(nonce) != NONCE_LENGTH:
+            raise Unauthorized("invalid nonce")
+        body, mac = nonce[:-MAC_LENGTH], nonce[-MAC_LENGTH:]
+        if not hmac.compare_digest(mac, self._mac(body, address)):
+            raise Unauthorized("nonce was not issued for this address")
+
+        issued = int(body[:TIME_LENGTH], 16)
+        now = int(time.time())
+        if issued > now + self.max_clock_skew:
+            raise Unauthorized("nonce was issued in the future")
+        if now > issued + self.validity:
+            raise Unauthorized("nonce has expired")
+        return issued + self.validity
+
+    def consume(self, nonce: str, address: str) -> None:
+        """Checks the nonce and marks it as used, a nonce can only be consumed once"""
+        expires_at = self.check(nonce, address)
+        try:
+            first_use = self._used.add(nonce, expires_at)
+        except OverflowError:
+            raise ServiceUnavailable("too many pending logins, try again later")
+        if not first_use:
+            raise Unauthorized("nonce has already been used")
+
+    def _mac(self, body: str, address: str) -> str:
+        message = f"{body}:{(address or '').lower()}".encode("utf-8")
+        digest = hmac.new(self._secret, message, hashlib.sha256).hexdigest()
+        return digest[:MAC_LENGTH]
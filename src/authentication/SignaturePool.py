@@ -0,0 +1,257 @@
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import BrokenExecutor, Future, ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from functools import partial
+
+from eth_account import Account
+from eth_account.messages import encode_defunct
+from eth_keys.exceptions import BadSignature
+from eth_utils import ValidationError
+from werkzeug.exceptions import ServiceUnavailable
+
+
+# raised by recover_address for malformed or invalid signatures
+SIGNATURE_ERRORS = (ValueError, IndexError, ValidationError, BadSignature)
+
+
+def recover_address(message: str, signature: str) -> str:
+    """Recovers the address that signed a message"""
+    return Account.recover_message(encode_defunct(text=message), signature=signature)
+
+
+def sign_message(account: Account, message: str) -> str:
+    """Signs a message with account"""
+    return account.sign_message(encode_defunct(text=message)).signature.hex()
+
+
+def _execute(account: Account, task: tuple) -> str:
+    if task[0] == "sign":
+        return sign_message(account, task[1])
+    return recover_address(*task[1:])
+
+
+# the signing account of a pool process, set by its initializer
+_account: Account = None
+
+
+def _initialize(signing_key: str) -> None:
+    global _account
+    _account = Account.from_key(signing_key)
+
+
+def _run_batch(tasks: list[tuple]) -> list[tuple[bool, object]]:
+    """Runs in a pool process, the outcome of every task as (succeeded, result or error)"""
+    outcomes = []
+    for task in tasks:
+        try:
+            outcomes.append((True, _execute(_account, task)))
+        except Exception as error:
+            outcomes.append((False, error))
+    return outcomes
+
+
+class _PoolUnavailable(Exception):
+    """The pool broke or could not be started, the task runs on the calling thread"""
+
+
+class SignaturePool:
+    """
+    Runs the ECDSA signature recovery and signing of the Authenticator in a pool of
+    processes, so login bursts are not serialized on the GIL of the request threads.
+    Tasks arriving while every process is busy are sent together as one batch once a
+    process is free, at most max_queue tasks wait and beyond that requests are answered
+    with 503. Without processes, or while the pool can not be started or is broken, the
+    tasks run on the calling thread, a broken pool is started again after
+    restart_delay seconds. A task not answered within timeout seconds is answered with
+    503 and the processes of the pool are terminated, so a hung process can not hold
+    up the request threads, the pool is then restarted like a broken one. The pool is
+    started on first use in every process using it, gunicorn workers forked from a
+    preloaded app start their own.
+    """
+
+    def __init__(
+        self,
+        signing_key: str,
+        processes: int = 0,
+        max_queue: int = 256,
+        batch_size: int = 32,
+        restart_delay: float = 30.0,
+        timeout: float = 30.0,
+        retry_after: int = 1,
+    ):
+        self.processes = processes
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.restart_delay = restart_delay
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self._signing_key = signing_key
+        self._account = Account.from_key(signing_key)
+        self._lock = threading.Lock()
+        self._pid = None
+        self._pool: ProcessPoolExecutor = None
+        self._unavailable_until = 0.0
+        self._counters = dict.fromkeys(
+            ("batches", "pooled", "in_thread", "rejected", "timed_out"), 0
+        )
+
+    def recover(self, message: str, signature: str) -> str:
+        """
+        Recovers the address that signed a message
+
+        :raises ServiceUnavailable: if the pool is saturated or does not answer in time
+        """
+        return self._run(("recover", message, signature))
+
+    def sign(self, message: str) -> str:
+        """
+        Signs a message with the signing key
+
+        :raises ServiceUnavailable: if the pool is saturated or does not answer in time
+        """
+        return self._run(("sign", message))
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {"processes": self.processes, **self._counters}
+
+    def shutdown(self) -> None:
+        """Stops the pool processes, later tasks run on the calling thread"""
+        with self._lock:
+            self._unavailable_until = float("inf")
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def _run(self, task: tuple) -> str:
+        if self._available():
+            future = Future()
+            try:
+                self._queue.put_nowait((task, future))
+            except queue.Full:
+                with self._lock:
+                    self._counters["rejected"] += 1
+                raise ServiceUnavailable(
+                    "signature pool is saturated, retry later",
+                    retry_after=self.retry_after,
+                )
+            try:
+                return future.result(timeout=self.timeout)
+            except _PoolUnavailable:
+                pass
+            except FutureTimeout:
+                # not the builtin TimeoutError before python 3.11
+                self._hung()
+                raise ServiceUnavailable(
+                    "signature pool did not answer in time, retry later",
+                    retry_after=self.retry_after,
+                )
+        with self._lock:
+            self._counters["in_thread"] += 1
+        return _execute(self._account, task)
+
+    def _available(self) -> bool:
+        """Whether tasks go to the pool, starts the dispatcher once per process"""
+        if not self.processes or time.monotonic() < self._unavailable_until:
+            return False
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    # the pool of a parent process is not usable after a fork
+                    self._pool = None
+                    self._queue = queue.Queue(self.max_queue)
+                    # one batch in flight per process, tasks queue up meanwhile
+                    self._slots = threading.Semaphore(self.processes)
+                    threading.Thread(
+                        target=self._dispatch, name="signatures", daemon=True
+                    ).start()
+                    self._pid = os.getpid()
+        return True
+
+    def _dispatch(self) -> None:
+        requests, slots = self._queue, self._slots
+        while True:
+            batch = [requests.get()]
+            slots.acquire()
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(requests.get_nowait())
+                except queue.Empty:
+                    break
+            pool = self._executor()
+            try:
+                if pool is None:
+                    raise _PoolUnavailable()
+                future = pool.submit(_run_batch, [task for task, _ in batch])
+            except (BrokenExecutor, OSError, RuntimeError, _PoolUnavailable):
+                self._broken(pool)
+                self._resolve(slots, batch, _PoolUnavailable())
+                continue
+            with self._lock:
+                self._counters["batches"] += 1
+                self._counters["pooled"] += len(batch)
+            future.add_done_callback(partial(self._done, pool, slots, batch))
+
+    def _executor(self) -> ProcessPoolExecutor | None:
+        """The pool, started if there is none and the restart delay passed"""
+        with self._lock:
+            if self._pool is None and time.monotonic() >= self._unavailable_until:
+                try:
+                    # spawned, forking would copy the threads and locks of the app
+                    self._pool = ProcessPoolExecutor(
+                        self.processes,
+                        mp_context=multiprocessing.get_context("spawn"),
+                        initializer=_initialize,
+                        initargs=(self._signing_key,),
+                    )
+                except OSError:
+                    self._unavailable_until = time.monotonic() + self.restart_delay
+            return self._pool
+
+    def _hung(self) -> None:
+        """Terminates the processes of the pool, its batches fail and it is restarted later"""
+        with self._lock:
+            self._counters["timed_out"] += 1
+            pool = self._pool
+        if pool is not None:
+            # the executor notices the terminated processes and fails their batches
+            for process in list((pool._processes or {}).values()):
+                process.terminate()
+
+    def _broken(self, pool: ProcessPoolExecutor | None) -> None:
+        with self._lock:
+            if pool is None or self._pool is not pool:
+                return
+            self._pool = None
+            self._unavailable_until = time.monotonic() + self.restart_delay
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def _done(
+        self,
+        pool: ProcessPoolExecutor,
+        slots: threading.Semaphore,
+        batch: list,
+        future: Future,
+    ) -> None:
+        error = future.exception()
+        if isinstance(error, BrokenExecutor):
+            self._broken(pool)
+            error = _PoolUnavailable()
+        self._resolve(slots, batch, error or future.result())
+
+    @staticmethod
+    def _resolve(
+        slots: threading.Semaphore, batch: list, outcome: list | Exception
+    ) -> None:
+        slots.release()
+        for i, (_, future) in enumerate(batch):
+            if isinstance(outcome, Exception):
+                future.set_exception(outcome)
+            elif outcome[i][0]:
+                future.set_result(outcome[i][1])
+            else:
+                future.set_exception(outcome[i][1])
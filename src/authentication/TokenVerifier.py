@@ -0,0 +1,184 @@
+import base64
+import binascii
+import json
+import time
+from functools import lru_cache
+from typing import Callable
+
+from werkzeug.exceptions import ServiceUnavailable, Unauthorized
+
+from src.authentication.ExpiringSet import ExpiringSet
+from src.authentication.SignaturePool import SIGNATURE_ERRORS
+from src.cache.SharedCache import SharedCache
+
+CLAIMS = ("iss", "sub", "aud", "exp", "nbf", "iat", "jti")
+# claims holding addresses, the domain and the token id
+TEXT_CLAIMS = ("iss", "sub", "aud", "jti")
+# claims holding epoch times
+TIME_CLAIMS = ("exp", "nbf", "iat")
+
+
+class TokenVerifier:
+    """
+    Verifies the authentication tokens issued by an Authenticator.
+
+    The token is split and decoded exactly once, the signature is checked against the
+    decoded payload text the issuer signed instead of a re-serialization of it and all
+    issuer constants are computed at construction. Signature checks of recently seen
+    tokens are kept in a bounded lru cache so repeated requests with the same token
+    skip the ecdsa recovery, expiry and audience are still checked on every call.
+    With a SharedCache the signature checks are shared by all gunicorn workers.
+
+    Revoked token ids are kept until the token expires and are checked before anything
+    else, a cached signature check never lets a revoked token through.
+    """
+
+    def __init__(
+        self,
+        issuer_address: str,
+        recover_address: Callable[[str, str], str],
+        cache_size: int = 1024,
+        shared_cache: SharedCache = None,
+        shared_ttl: float = 24 * 60 * 60,
+        revoked: ExpiringSet | SharedCache = None,
+    ):
+        self.issuer_address = issuer_address
+        self._issuer = issuer_address.lower()
+        self._recover_address = recover_address
+        self._shared_cache = shared_cache
+        self._revoked = (
+            revoked
+            if revoked is not None
+            else ExpiringSet(granularity=60, max_size=100_000)
+        )
+        if shared_cache is None:
+            self._signed_by_issuer = lru_cache(maxsize=cache_size)(
+                self._signed_by_issuer
+            )
+        else:
+            self._signed_by_issuer = self._shared(
+                shared_cache, shared_ttl, self._signed_by_issuer
+            )
+
+    def verify(self, domain: str, token: str) -> str:
+        """
+        Verifies the token for the given domain and returns the authenticated address
+
+        :param domain: The domain of the application the token must be issued for
+        :param token: The authentication token, optionally prefixed with "Bearer "
+        :return: The address of the authenticated wallet
+        """
+        claims, data, signature = self.decode(token)
+
+        # Check that the token was not revoked by a logout
+        if str(claims["jti"]) in self._revoked:
+            raise Unauthorized("This token has been revoked")
+
+        # Check that the intended audience matches the domain
+        if claims["aud"] != domain:
+            raise Unauthorized(
+                f"Expected token to be for the domain '{domain}', but found token with domain '{claims['aud']}'"
+            )
+
+        # Check that the token is past the invalid before time
+        now = int(time.time())
+        if now < claims["nbf"]:
+            raise Unauthorized(
+                f"This token is invalid before epoch time '{claims['nbf']}', current epoch time is '{now}'"
+            )
+
+        # Check that the token hasn't expired
+        if now > claims["exp"]:
+            raise Unauthorized(
+                f"This token expired at epoch time '{claims['exp']}', current epoch time is '{now}'"
+            )
+
+        # Check that the connected wallet matches the token issuer
+        if claims["iss"].lower() != self._issuer:
+            raise Unauthorized(
+                f"Expected the connected wallet address '{self.issuer_address}' to match the token issuer address '{claims['iss']}'"
+            )
+
+        # Check that the connected wallet signed the token
+        if not self._signed_by_issuer(data, signature):
+            raise Unauthorized(
+                f"The connected wallet address '{self.issuer_address}' did not sign the token"
+            )
+        return claims["sub"]
+
+    def cache_sizes(self) -> dict:
+        """Number of cached signature checks and of revoked tokens"""
+        if self._shared_cache is not None:
+            signatures = len(self._shared_cache)
+        else:
+            signatures = self._signed_by_issuer.cache_info().currsize
+        return {"token_signatures": signatures, "revoked_tokens": len(self._revoked)}
+
+    def revoke(self, domain: str, token: str) -> None:
+        """
+        Revokes a valid token until it expires
+
+        :raises ServiceUnavailable: if too many unexpired tokens are revoked
+        """
+        self.verify(domain, token)
+        claims, _, _ = self.decode(token)
+        try:
+            # a token is still valid during the second of its exp
+            self._revoked.add(str(claims["jti"]), claims["exp"] + 1)
+        except OverflowError:
+            raise ServiceUnavailable("too many revoked tokens, try again later")
+
+    @staticmethod
+    def decode(token: str) -> tuple[dict, str, str]:
+        """
+        Splits and decodes the token in a single pass
+
+        :return: the claims, the signed payload text and the signature
+        """
+        if token is None:
+            raise Unauthorized("missing token")
+        if token.startswith("Bearer "):
+            token = token[7:]
+        try:
+            _, encoded_payload, encoded_signature = token.split(".")
+        except ValueError:
+            raise Unauthorized("invalid token format")
+
+        try:
+            data = base64.b64decode(encoded_payload).decode("utf-8")
+            signature = base64.b64decode(encoded_signature).decode("utf-8")
+            claims = json.loads(data)
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise Unauthorized("invalid token encoding")
+        if not isinstance(claims, dict) or any(c not in claims for c in CLAIMS):
+            raise Unauthorized("invalid token payload")
+        if not all(isinstance(claims[c], str) for c in TEXT_CLAIMS) or not all(
+            isinstance(claims[c], (int, float)) and not isinstance(claims[c], bool)
+            for c in TIME_CLAIMS
+        ):
+            raise Unauthorized("invalid token claims")
+        return claims, data, signature
+
+    @staticmethod
+    def _shared(
+        cache: SharedCache, ttl: float, check: Callable[[str, str], bool]
+    ) -> Callable[[str, str], bool]:
+        def signed_by_issuer(data: str, signature: str) -> bool:
+            key = f"{data}.{signature}"
+            if (known := cache.get(key)) is not None:
+                return known == b"\x01"
+            signed = check(data, signature)
+            cache.set(key, b"\x01" if signed else b"\x00", time.time() + ttl)
+            return signed
+
+        return signed_by_issuer
+
+    def _signed_by_issuer(self, data: str, signature: str) -> bool:
+        """
+        checks the signature over the payload text as it was signed by the issuer, errors
+        other than invalid signatures (a saturated signature pool) propagate uncached
+        """
+        try:
+            return self._recover_address(data, signature).lower() == self._issuer
+        except SIGNATURE_ERRORS:
+            return False
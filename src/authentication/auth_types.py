@@ -1,7 +1,9 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime
 from typing import Any, Dict, Optional
 
+from src.authentication.timestamps import ISO_FORMAT, parse_timestamp
+
 
 @dataclass
 class LoginOptions:
@@ -21,19 +23,28 @@ class LoginPayloadData:
     issued_at: datetime
     statement: Optional[str] = None
     chain_id: Optional[int] = None
+    # the timestamps exactly as the client signed them
+    expiration_time_text: Optional[str] = field(default=None, repr=False, compare=False)
+    issued_at_text: Optional[str] = field(default=None, repr=False, compare=False)
 
     @staticmethod
     def from_json(json: Dict[str, Any], timeformat: str) -> "LoginPayloadData":
+        if timeformat == ISO_FORMAT:
+            parse = parse_timestamp
+        else:
+            parse = lambda value: datetime.strptime(value, timeformat)
         return LoginPayloadData(
             json["domain"],
             json["address"],
             json["nonce"],
             json["type"],
             json["version"],
-            datetime.strptime(json["expiration_time"], timeformat),
-            datetime.strptime(json["issued_at"], timeformat),
+            parse(json["expiration_time"]),
+            parse(json["issued_at"]),
             json.get("statement"),
             json.get("chain_id"),
+            json["expiration_time"],
+            json["issued_at"],
         )
 
 
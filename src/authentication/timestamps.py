@@ -0,0 +1,74 @@
+from datetime import datetime, timedelta, timezone
+
+ISO_FORMAT = "%Y-%m-%dT%H:%M:%S%z"
+
+# offsets seen in payloads are few, timezone objects are reused for each of them
+_timezones: dict[str, timezone] = {"Z": timezone.utc}
+
+
+def parse_timestamp(value: str) -> datetime:
+    """
+    Parses a timestamp in ISO_FORMAT, equivalent to datetime.strptime(value, ISO_FORMAT)
+    but without going through the locale dependent regex machinery of strptime
+    """
+    if (
+        not isinstance(value, str)
+        or len(value) < 20
+        or value[4] != "-"
+        or value[7] != "-"
+        or value[10] != "T"
+        or value[13] != ":"
+        or value[16] != ":"
+        or not (
+            value[0:4]
+            + value[5:7]
+            + value[8:10]
+            + value[11:13]
+            + value[14:16]
+            + value[17:19]
+        ).isdigit()
+    ):
+        raise ValueError(f"time data {value!r} does not match format {ISO_FORMAT!r}")
+    offset = value[19:]
+    tz = _timezones.get(offset)
+    if tz is None:
+        tz = _timezones[offset] = _parse_offset(value, offset)
+    try:
+        return datetime(
+            int(value[0:4]),
+            int(value[5:7]),
+            int(value[8:10]),
+            int(value[11:13]),
+            int(value[14:16]),
+            int(value[17:19]),
+            tzinfo=tz,
+        )
+    except ValueError:
+        raise ValueError(f"time data {value!r} does not match format {ISO_FORMAT!r}")
+
+
+def format_timestamp(value: datetime) -> str:
+    """Formats a datetime, equivalent to value.strftime(ISO_FORMAT)"""
+    text = (
+        f"{value.year:04d}-{value.month:02d}-{value.day:02d}"
+        f"T{value.hour:02d}:{value.minute:02d}:{value.second:02d}"
+    )
+    if (utcoffset := value.utcoffset()) is None:
+        return text
+    offset = int(utcoffset.total_seconds()) // 60
+    sign = "-" if offset < 0 else "+"
+    hours, minutes = divmod(abs(offset), 60)
+    return f"{text}{sign}{hours:02d}{minutes:02d}"
+
+
+def _parse_offset(value: str, offset: str) -> timezone:
+    digits = offset[1:].replace(":", "")
+    if (
+        offset[:1] not in ("+", "-")
+        or len(digits) != 4
+        or not digits.isdigit()
+        or (":" in offset and offset[3] != ":")
+    ):
+        raise ValueError(f"time data {value!r} does not match format {ISO_FORMAT!r}")
+    delta = timedelta(hours=int(digits[:2]), minutes=int(digits[2:]))
+    return timezone(-delta if offset[0] == "-" else delta)
@@ -0,0 +1,139 @@
+import hashlib
+import mmap
+import multiprocessing
+import struct
+import time
+from typing import Callable
+
+# per entry: blake2b digest of the key, expiry epoch time (0 for an empty slot), value length
+ENTRY = struct.Struct("<16sdI")
+
+
+class SharedCache:
+    """
+    Fixed size hash table in an anonymous shared mmap. Created before gunicorn forks its
+    workers (preload_app), every worker reads and writes the same memory, so a cache
+    hit in one worker is a hit in all of them.
+
+    The table is set associative: a key hashes to a bucket of `ways` slots and is only
+    ever stored there, buckets are guarded by a striped set of process shared locks.
+    Values are bytes of at most value_size, keys are only kept as their digest.
+    """
+
+    def __init__(
+        self, slots: int = 4096, value_size: int = 64, ways: int = 8, stripes: int = 64
+    ):
+        self.ways = ways
+        self.buckets = max(1, slots // ways)
+        self.value_size = value_size
+        self._entry_size = ENTRY.size + value_size
+        self._memory = mmap.mmap(-1, self.buckets * ways * self._entry_size)
+        self._locks = [
+            multiprocessing.Lock() for _ in range(min(stripes, self.buckets))
+        ]
+
+    def __len__(self) -> int:
+        """Number of unexpired entries, scans the whole table"""
+        now = time.time()
+        return sum(
+            ENTRY.unpack_from(self._memory, position)[1] > now
+            for position in range(0, len(self._memory), self._entry_size)
+        )
+
+    def __contains__(self, key: str | bytes) -> bool:
+        return self.get(key) is not None
+
+    def get(self, key: str | bytes) -> bytes | None:
+        """The value stored for key, None if it is missing or expired"""
+        digest, offset, lock = self._locate(key)
+        now = time.time()
+        with lock:
+            for position in self._slots(offset):
+                stored, expires_at, length = ENTRY.unpack_from(self._memory, position)
+                if stored == digest and expires_at > now:
+                    start = position + ENTRY.size
+                    return self._memory[start : start + length]
+        return None
+
+    def set(self, key: str | bytes, value: bytes, expires_at: float) -> bool:
+        """
+        Stores value until expires_at, evicting the entry of the bucket expiring first
+
+        :return: False if the value is too large to be cached
+        """
+        return self.update(key, lambda _: value, expires_at)
+
+    def update(
+        self,
+        key: str | bytes,
+        fn: Callable[[bytes | None], bytes],
+        expires_at: float,
+    ) -> bool:
+        """
+        Replaces the value of key by fn(current value or None) in a single step for all processes
+
+        :return: False if the new value is too large to be cached
+        """
+        digest, offset, lock = self._locate(key)
+        now = time.time()
+        with lock:
+            current, victim, victim_expiry = None, None, None
+            for position in self._slots(offset):
+                stored, stored_expiry, length = ENTRY.unpack_from(
+                    self._memory, position
+                )
+                if stored == digest and stored_expiry > now:
+                    start = position + ENTRY.size
+                    current, victim = self._memory[start : start + length], position
+                    break
+                if stored == digest or stored_expiry <= now:
+                    victim, victim_expiry = position, 0.0
+                elif victim is None or stored_expiry < victim_expiry:
+                    victim, victim_expiry = position, stored_expiry
+            value = fn(current)
+            if len(value) > self.value_size:
+                return False
+            self._write(victim, digest, value, expires_at)
+        return True
+
+    def add(self, key: str | bytes, expires_at: float, value: bytes = b"") -> bool:
+        """
+        Stores key until expires_at unless it is present, unexpired entries are never evicted
+
+        :return: False if the key was already present and has not expired yet
+        :raises OverflowError: if every slot of the bucket of key holds an unexpired entry
+        """
+        if len(value) > self.value_size:
+            raise ValueError(f"values are limited to {self.value_size} bytes")
+        digest, offset, lock = self._locate(key)
+        now = time.time()
+        with lock:
+            free = None
+            for position in self._slots(offset):
+                stored, stored_expiry, _ = ENTRY.unpack_from(self._memory, position)
+                if stored_expiry > now:
+                    if stored == digest:
+                        return False
+                elif free is None:
+                    free = position
+            if free is None:
+                raise OverflowError("shared cache bucket is full")
+            if expires_at > now:
+                self._write(free, digest, value, expires_at)
+            return True
+
+    def _locate(self, key: str | bytes) -> tuple:
+        if isinstance(key, str):
+            key = key.encode("utf-8")
+        digest = hashlib.blake2b(key, digest_size=16).digest()
+        bucket = int.from_bytes(digest[:8], "little") % self.buckets
+        offset = bucket * self.ways * self._entry_size
+        return digest, offset, self._locks[bucket % len(self._locks)]
+
+    def _slots(self, offset: int) -> range:
+        return range(offset, offset + self.ways * self._entry_size, self._entry_size)
+
+    def _write(self, position: int, digest: bytes, value: bytes, expires_at: float):
+        ENTRY.pack_into(self._memory, position, digest, expires_at, len(value))
+        start = position + ENTRY.size
+        self._memory[start : start + len(value)] = value
@@ -1,6 +1,6 @@
 from marshmallow import Schema, fields, pre_load
 
-from src.models.Fields import Address
+from src.models.Fields import Address, Signature
 
 
 class StatusSchema(Schema):
@@ -55,3 +55,12 @@ class ArtworkMintSchema(Schema):
     carrier = Address()
     logger = Address()
     recipient = Address()
+
+
+class ApprovalSchema(Schema):
+    requestedStatus = fields.String(
+        required=True,
+        validate=lambda s: s in ["TO_BE_DELIVERED", "IN_TRANSIT", "DELIVERED"],
+    )
+    deadline = fields.Int(required=True)
+    signature = Signature(required=True)
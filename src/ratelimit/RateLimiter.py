@@ -0,0 +1,120 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from typing import Callable
+
+from flask import g, request
+from werkzeug.exceptions import TooManyRequests
+
+from src.cache.SharedCache import SharedCache
+from src.ratelimit.TokenBucket import TokenBucket
+
+
+class RateLimiter:
+    """
+    A token bucket per key (address, ip), admitting rate requests per second with bursts
+    of up to burst requests. Buckets of the least recently seen keys are dropped beyond
+    max_keys, they were idle the longest and are likely full again. With a SharedCache the
+    buckets are shared by all gunicorn workers. A rate of 0 admits everything.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        rate: float,
+        burst: float,
+        max_keys: int = 100_000,
+        shared_cache: SharedCache = None,
+    ):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._shared = shared_cache
+        self._lock = threading.Lock()
+        self._buckets: OrderedDict[str, TokenBucket] = OrderedDict()
+
+    def __len__(self) -> int:
+        """Number of buckets kept, with a SharedCache of all limiters sharing it"""
+        return len(self._shared) if self._shared is not None else len(self._buckets)
+
+    def reserve(
+        self, key: str, cost: float = 1.0, max_wait: float = 0.0
+    ) -> tuple[bool, float]:
+        """
+        Takes cost tokens of the bucket of key if they are available within max_wait seconds
+
+        :return: whether they were taken and the seconds until they are available
+        """
+        if not self.rate:
+            return True, 0.0
+        if self._shared is not None:
+            return self._reserveShared(key, cost, max_wait)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(self.rate, self.burst)
+                if len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+            return bucket.reserve(cost, max_wait)
+
+    def check(self, key: str, cost: float = 1.0) -> None:
+        """
+        Admits a request of key
+
+        :raises TooManyRequests: if the budget of key is used up
+        """
+        admitted, wait = self.reserve(key, cost)
+        if not admitted:
+            raise TooManyRequests(
+                f"{self.name} rate limit exceeded, retry later",
+                retry_after=max(1, math.ceil(wait)),
+            )
+
+    def _reserveShared(
+        self, key: str, cost: float, max_wait: float
+    ) -> tuple[bool, float]:
+        reserved = []
+
+        def take(state: bytes | None) -> bytes:
+            bucket = (
+                TokenBucket(self.rate, self.burst)
+                if state is None
+                else TokenBucket.unpack(self.rate, self.burst, state)
+            )
+            reserved.append(bucket.reserve(cost, max_wait))
+            return bucket.pack()
+
+        # a bucket may expire once it is full again, a missing bucket is a full one,
+        # reservations take it at most max_wait * rate tokens below empty
+        self._shared.update(
+            f"{self.name}:{key}",
+            take,
+            time.time() + max_wait + self.burst / self.rate + 1,
+        )
+        return reserved[0]
+
+
+def client_address() -> str:
+    """The address of the client, behind the proxies trusted by ProxyFix"""
+    return request.remote_addr or "unknown"
+
+
+def rate_limited(
+    limiter: RateLimiter, key: Callable[[], str] = None, cost: float = 1.0
+):
+    """Admits requests of the authenticated sender (or key()) within the budget of limiter"""
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            limiter.check(g.sender if key is None else key(), cost)
+            return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,45 @@
+import struct
+import time
+
+# tokens, epoch time of the last refill
+STATE = struct.Struct("<dd")
+
+
+class TokenBucket:
+    """
+    Holds up to burst tokens, refilled at rate tokens per second. Not thread safe, the
+    owner serializes access. The state packs into 16 bytes to live in a SharedCache.
+    """
+
+    def __init__(
+        self, rate: float, burst: float, tokens: float = None, updated: float = None
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst if tokens is None else tokens
+        self.updated = time.time() if updated is None else updated
+
+    def reserve(self, cost: float = 1.0, max_wait: float = 0.0) -> tuple[bool, float]:
+        """
+        Takes cost tokens if they are available within max_wait seconds
+
+        :return: whether they were taken and the seconds until they are available
+        """
+        now = time.time()
+        self.tokens = min(
+            self.burst, self.tokens + max(0.0, now - self.updated) * self.rate
+        )
+        self.updated = now
+        wait = max(0.0, (cost - self.tokens) / self.rate)
+        if wait > max_wait:
+            return False, wait
+        # taken ahead of time, the caller waits for them
+        self.tokens -= cost
+        return True, wait
+
+    def pack(self) -> bytes:
+        return STATE.pack(self.tokens, self.updated)
+
+    @classmethod
+    def unpack(cls, rate: float, burst: float, data: bytes) -> "TokenBucket":
+        return cls(rate, burst, *STATE.unpack(data))
@@ -0,0 +1,251 @@
+import pickle
+import threading
+import time
+from dataclasses import dataclass
+from functools import cached_property, partial
+from typing import Callable
+
+from eth_account import Account
+from eth_account.messages import encode_structured_data
+from werkzeug.exceptions import BadRequest, Forbidden, ServiceUnavailable, Unauthorized
+
+from src.cache.SharedCache import SharedCache
+from src.models.Artwork import Artwork
+from src.smartcontract.ArtworkConnector import ArtworkConnector
+
+# the parties whose approval a status change needs
+ROLES = ("owner", "carrier", "recipient")
+
+APPROVAL_TYPES = {
+    "EIP712Domain": [
+        {"name": "name", "type": "string"},
+        {"name": "version", "type": "string"},
+        {"name": "chainId", "type": "uint256"},
+        {"name": "verifyingContract", "type": "address"},
+    ],
+    "StatusApproval": [
+        {"name": "artworkId", "type": "uint256"},
+        {"name": "requestedStatus", "type": "string"},
+        {"name": "approver", "type": "address"},
+        {"name": "deadline", "type": "uint256"},
+    ],
+}
+
+
+@dataclass
+class Approval:
+    approver: str
+    signature: str
+    deadline: int
+
+
+class ApprovalAggregator:
+    """
+    Collects EIP-712 signed status change approvals of the parties of an artwork off
+    chain and submits them together once every role that still has to approve has
+    signed, so a delivery step is one write instead of one write per party.
+
+    With a SharedCache the pending approvals are shared by all gunicorn workers, so the
+    parties may reach different workers. The approvals of an artwork are then kept up
+    to shared_ttl seconds after its last approval.
+    """
+
+    def __init__(
+        self,
+        sc: ArtworkConnector,
+        domain_name: str = "artis-project",
+        version: str = "1",
+        max_pending: int = 10_000,
+        shared_cache: SharedCache = None,
+        shared_ttl: float = 7 * 24 * 60 * 60,
+    ):
+        self._sc = sc
+        self.domain_name = domain_name
+        self.version = version
+        self.max_pending = max_pending
+        self.shared_ttl = shared_ttl
+        self._shared = shared_cache
+        # artwork id -> requested status -> role -> approval
+        self._pending: dict[int, dict[str, dict[str, Approval]]] = {}
+        self._lock = threading.Lock()
+
+    @cached_property
+    def domain(self) -> dict:
+        return {
+            "name": self.domain_name,
+            "version": self.version,
+            "chainId": self._sc.chainId,
+            "verifyingContract": self._sc.address,
+        }
+
+    def typed_data(
+        self, artwork_id: int, requested_status: str, approver: str, deadline: int
+    ) -> dict:
+        """The EIP-712 typed data a party signs to approve the status change"""
+        return {
+            "types": APPROVAL_TYPES,
+            "primaryType": "StatusApproval",
+            "domain": self.domain,
+            "message": {
+                "artworkId": artwork_id,
+                "requestedStatus": requested_status,
+                "approver": approver,
+                "deadline": deadline,
+            },
+        }
+
+    def submit(
+        self,
+        artwork_id: int,
+        requested_status: str,
+        deadline: int,
+        signature: str,
+        sender: str,
+    ) -> Artwork | None:
+        """
+        Adds the signed approval of sender to the pending approvals of the status change
+
+        :return: the updated artwork if the approval completed the set and it was
+            submitted or the change was approved on chain already, None if approvals
+            of other parties are still missing
+        """
+        if deadline <= time.time():
+            raise BadRequest("approval deadline has passed")
+        signable = encode_structured_data(
+            self.typed_data(artwork_id, requested_status, sender, deadline)
+        )
+        try:
+            signer = Account.recover_message(signable, signature=signature)
+        except Exception:
+            raise Unauthorized("invalid approval signature")
+        if signer.lower() != sender.lower():
+            raise Unauthorized("approval is not signed by the sender")
+
+        record = self._sc.getArtworkRecord(artwork_id, sender)
+        roles = [r for r in ROLES if record[r].lower() == sender.lower()]
+        if not roles:
+            raise Forbidden("only owner, carrier and recipient approve status changes")
+        if record["requestedStatus"] == requested_status:
+            required = {r for r in ROLES if not record[f"{r}Approval"]}
+        else:
+            # a new request resets the approvals on chain
+            required = set(ROLES)
+        if not required:
+            # every party already approved on chain, nothing is left to submit
+            return Artwork.load(data=record)
+
+        approval, now = Approval(signer, signature, deadline), time.time()
+        complete: dict[str, Approval] = {}
+
+        def add(requests: dict[str, dict[str, Approval]]) -> dict:
+            approvals = requests.setdefault(requested_status, {})
+            for role, pending in list(approvals.items()):
+                if pending.deadline <= now:
+                    del approvals[role]
+            approvals.update({role: approval for role in roles})
+            if required <= approvals.keys():
+                # removed before submitting, a concurrent approval can not submit twice
+                complete.update(requests.pop(requested_status))
+            return requests
+
+        self._update(artwork_id, add, now)
+        if not complete:
+            return None
+
+        signed = {}
+        for role in ROLES:
+            if role in required:
+                signed.setdefault(complete[role].approver, complete[role].signature)
+        try:
+            return self._sc.approveStatusChange(
+                artwork_id, requested_status, list(signed.items())
+            )
+        except Exception:
+            # the signed approvals stay pending, the next approval submits them again
+            self._update(
+                artwork_id,
+                partial(self._restore, requested_status, complete),
+                time.time(),
+            )
+            raise
+
+    def pending(self, artwork_id: int, sender: str) -> list[dict]:
+        """The pending approvals of the artwork, readable by everyone who can read the artwork"""
+        self._sc.getArtworkRecord(artwork_id, sender)
+        now = time.time()
+        requests = {
+            status: {
+                role: approval.approver
+                for role, approval in approvals.items()
+                if approval.deadline > now
+            }
+            for status, approvals in self._requests(artwork_id).items()
+        }
+        return [
+            {"requestedStatus": status, "approvals": approvals}
+            for status, approvals in requests.items()
+            if approvals
+        ]
+
+    @staticmethod
+    def _restore(
+        requested_status: str,
+        restored: dict[str, Approval],
+        requests: dict[str, dict[str, Approval]],
+    ) -> dict:
+        """Adds approvals back to the pending ones, approvals given meanwhile win"""
+        approvals = requests.setdefault(requested_status, {})
+        for role, approval in restored.items():
+            approvals.setdefault(role, approval)
+        return requests
+
+    def _requests(self, artwork_id: int) -> dict[str, dict[str, Approval]]:
+        """The pending approvals of the artwork by requested status and role"""
+        if self._shared is not None:
+            data = self._shared.get(f"approvals:{artwork_id}")
+            return {} if data is None else pickle.loads(data)
+        with self._lock:
+            requests = self._pending.get(artwork_id, {})
+            return {status: dict(approvals) for status, approvals in requests.items()}
+
+    def _update(
+        self,
+        artwork_id: int,
+        apply: Callable[[dict[str, dict[str, Approval]]], dict],
+        now: float,
+    ) -> None:
+        """Replaces the pending approvals of the artwork by apply(approvals) in one step"""
+        if self._shared is not None:
+            stored = self._shared.update(
+                f"approvals:{artwork_id}",
+                lambda data: pickle.dumps(
+                    apply({} if data is None else pickle.loads(data))
+                ),
+                now + self.shared_ttl,
+            )
+            if not stored:
+                raise ServiceUnavailable("too many pending approvals")
+            return
+        with self._lock:
+            if artwork_id not in self._pending:
+                if len(self._pending) >= self.max_pending:
+                    self._expire(now)
+                if len(self._pending) >= self.max_pending:
+                    raise ServiceUnavailable("too many pending approvals")
+            requests = apply(self._pending.get(artwork_id, {}))
+            if requests:
+                self._pending[artwork_id] = requests
+            else:
+                self._pending.pop(artwork_id, None)
+
+    def _expire(self, now: float) -> None:
+        """Drops approvals past their deadline, the lock must be held"""
+        for artwork_id, requests in list(self._pending.items()):
+            for status, approvals in list(requests.items()):
+                for role, approval in list(approvals.items()):
+                    if approval.deadline <= now:
+                        del approvals[role]
+                if not approvals:
+                    del requests[status]
+            if not requests:
+                del self._pending[artwork_id]
@@ -1,56 +1,170 @@
 import json
 import os
+from typing import Any
 
 import requests
+from eth_utils.abi import event_abi_to_log_topic
 from hexbytes import HexBytes
+from web3.exceptions import ContractLogicError
 
 from src.models.Artwork import Artwork
 from src.models.Fields import Address
-from src.smartcontract.SmartcontractConnector import SmartcontractConnector
+from src.smartcontract.LogScanner import LogScanner
+from src.smartcontract.SmartcontractConnector import SmartcontractConnector, write
+
+ARTWORK_EVENTS = ("Transfer", "Updated")
+
+# the parties allowed to read an artwork
+READERS = ("owner", "carrier", "logger", "recipient")
+
+# seconds a read waits for the provider to see a write it can not answer from the overlay
+CATCH_UP_WAIT = 1.0
 
 
 class ArtworkConnector(SmartcontractConnector):
-    def __init__(self, signing_private_key: str, http_provider_url: str):
-        super().__init__(signing_private_key, http_provider_url)
+    def __init__(
+        self,
+        signing_private_key: str,
+        http_provider_url: str,
+        simulate_writes: bool = False,
+        deployment_block: int = 0,
+        **options: Any,
+    ):
+        super().__init__(
+            signing_private_key, http_provider_url, simulate_writes, **options
+        )
+        # no artwork events exist before the block the smartcontract was deployed in
+        self.deployment_block = deployment_block
+        self._eventNames = {
+            event_abi_to_log_topic(item): item["name"]
+            for item in self._abi
+            if item.get("type") == "event" and item["name"] in ARTWORK_EVENTS
+        }
+        self._eventTopics = {
+            name: HexBytes(topic).hex() for topic, name in self._eventNames.items()
+        }
+        self._scanner = LogScanner(self._getLogs)
 
     @property
     def smartcontractAdmin(self) -> str:
-        return self._contract.functions.smartcontractAdmin().call()
+        return self._call("smartcontractAdmin")
 
     @smartcontractAdmin.setter
+    @write
     def smartcontractAdmin(self, new_admin: str) -> None:
         Address._validate(new_admin)
-        tx_hash = self._contract.functions.changeSmartContractAdmin(
-            new_admin
-        ).transact()
+        tx_hash = self._transact("changeSmartContractAdmin", new_admin, pooled=False)
 
-    def safeMint(self, to: bytes, data: Artwork) -> int:
+    @write
+    def safeMint(self, to: bytes, data: Artwork, idempotency_key: str = None) -> int:
         """Invoking safeMint function of smartcontract"""
         owner, mint_data = data.to_sc_mint()
-        tx_hash = self._contract.functions.safeMint(
-            to if not owner else owner, mint_data
-        ).transact()
-        event_args = self._handleEvent(tx_hash, "Transfer")
+        tx_hash = self._send(
+            idempotency_key,
+            "safeMint",
+            to if not owner else owner,
+            mint_data,
+            sender=to,
+        )
+        event_args = self._handleEvent(tx_hash, "Transfer", idempotency_key)
         return event_args.get("tokenId")
 
-    def updateArtworkData(self, newArtworkData: Artwork, sender: bytes) -> Artwork:
+    @write
+    def updateArtworkData(
+        self, newArtworkData: Artwork, sender: bytes, idempotency_key: str = None
+    ) -> Artwork:
         """Invoking updateArtworkData function of smartcontract"""
-        tx_hash = self._contract.functions.updateArtworkData(
-            newArtworkData.to_sc_update(), sender
-        ).transact(transaction={})
-        event_args = self._handleEvent(tx_hash, "Updated")
-        new_data = event_args.get("newData")
-        new_data = dict(new_data, **{"owner": event_args.get("owner")})
-        new_data["status"] = dict(
-            new_data["status"], **{"approvals": event_args.get("approvals")}
+        tx_hash = self._send(
+            idempotency_key,
+            "updateArtworkData",
+            newArtworkData.to_sc_update(),
+            sender,
+            sender=sender,
+        )
+        return self._loadUpdated(
+            self._handleEvent(
+                tx_hash, "Updated", idempotency_key, artworkId=newArtworkData.id
+            )
+        )
+
+    @write
+    def approveStatusChange(
+        self, artworkId: int, requestedStatus: str, approvals: list[tuple[str, str]]
+    ) -> Artwork:
+        """Submit the signed (approver, signature) approvals of a status change, as a single transaction if the smartcontract supports it"""
+        approvers = [approver for approver, _ in approvals]
+        if self.hasFunction("approveStatusChange"):
+            tx_hash = self._transact(
+                "approveStatusChange",
+                artworkId,
+                requestedStatus,
+                approvers,
+                [HexBytes(signature) for _, signature in approvals],
+            )
+            return self._loadUpdated(
+                self._handleEvent(tx_hash, "Updated", artworkId=artworkId)
+            )
+        # without contract support every approval is its own updateArtworkData, sent
+        # back to back they are mined together and only cost a single block wait. They
+        # are sent from one signer, its nonces keep them mined in the order they are sent
+        update = Artwork.load(
+            {"id": artworkId, "requestedStatus": requestedStatus}
+        ).to_sc_update()
+        tx_hashes = [self._transact("updateArtworkData", update, approvers[0])]
+        signer = self._signers.sender(tx_hashes[0])
+        tx_hashes += [
+            self._transact("updateArtworkData", update, approver, signer=signer)
+            for approver in approvers[1:]
+        ]
+        events = [
+            self._handleEvent(tx_hash, "Updated", artworkId=artworkId)
+            for tx_hash in tx_hashes
+        ]
+        return self._loadUpdated(events[-1])
+
+    def blockNumber(self) -> int:
+        return self._breaker.call(lambda: self._w3.eth.block_number)
+
+    def getArtworkEvents(self, fromBlock: int, toBlock: int) -> list[dict]:
+        """Transfer and Updated events of the smartcontract in the block range"""
+        topics = list(self._eventTopics.values())
+        logs = self._scanner.scan(
+            [{"address": self._address, "topics": [topics]}], fromBlock, toBlock
+        )
+        return self._decodeEvents(logs)
+
+    def getArtworkHistory(
+        self, artworkId: int, sender: str, fromBlock: int = None, toBlock: int = None
+    ) -> list[dict]:
+        """Transfer and Updated events of an artwork the sender may read, from the deployment of the smartcontract up to the head by default"""
+        # reverts if the sender is not allowed to read the artwork
+        self.getArtworkRecord(artworkId, sender)
+        token = HexBytes(artworkId.to_bytes(32, "big")).hex()
+        transfer, updated = self._eventTopics["Transfer"], self._eventTopics["Updated"]
+        # the token id is the fourth topic of Transfer and the second of Updated
+        filters = [
+            {"address": self._address, "topics": [transfer, None, None, token]},
+            {"address": self._address, "topics": [updated, token]},
+        ]
+        return self._decodeEvents(
+            self._scanner.scan(
+                filters,
+                self.deployment_block if fromBlock is None else fromBlock,
+                self.blockNumber() if toBlock is None else toBlock,
+            )
         )
-        return Artwork.load(data=new_data)
 
     def getArtworkIdsByAddress(self, address: str) -> dict:
         """Invoking getArtworkIdsByAddress function of smartcontract"""
-        artwork_ids = (
-            self._contract.functions.getArtworkIdsByAddress(address).call()._asdict()
-        )
+        key = f"address:{address.lower()}"
+        head = None
+        if (entry := self._overlay.get(key)) is not None and entry.block_number:
+            # waits for the provider to list the artworks minted or assigned to address
+            head = self._caughtUp(key, entry.block_number, CATCH_UP_WAIT)
+        if head is not None:
+            artwork_ids = self._callAt(head, "getArtworkIdsByAddress", address)
+        else:
+            artwork_ids = self._call("getArtworkIdsByAddress", address)
         # incoming lists are zero padded to the total supply of tokens, they can safely be removed
         remove_zeros = lambda d: {
             k: list(filter(lambda x: x != 0, v)) for k, v in d.items()
@@ -59,17 +173,145 @@ class ArtworkConnector(SmartcontractConnector):
 
     def getArtworkData(self, artworkId: int, sender: str) -> Artwork:
         """Invoking getArtworkData function of smartcontract"""
-        data = self._contract.functions.getArtworkData(artworkId, sender).call()
-        return Artwork.load(data=dict(data._asdict()))
+        return Artwork.load(data=self.getArtworkRecord(artworkId, sender))
+
+    def getArtworkRecord(self, artworkId: int, sender: str) -> dict:
+        """
+        Invoking getArtworkData function of smartcontract, returns the record as stored on chain without loading it into an Artwork.
+        Until the provider caught up with a write of this service the record it produced is returned.
+        """
+        key = f"artwork:{artworkId}"
+        if (entry := self._overlay.get(key)) is not None and entry.block_number:
+            wait = 0.0 if entry.record is not None else CATCH_UP_WAIT
+            if (head := self._caughtUp(key, entry.block_number, wait)) is not None:
+                return dict(self._callAt(head, "getArtworkData", artworkId, sender))
+            if entry.record is not None and sender.lower() in (
+                entry.record[role].lower() for role in READERS
+            ):
+                return dict(entry.record)
+        # copied, the decoded record is shared between coalesced callers
+        return dict(self._call("getArtworkData", artworkId, sender))
+
+    def pendingTransactions(self, artworkId: int) -> list[str]:
+        """Hashes of the transactions of this service changing the artwork that are not mined yet"""
+        entry = self._overlay.get(f"artwork:{artworkId}")
+        return [] if entry is None else list(entry.pending)
 
-    def _handleEvent(self, tx_hash: HexBytes, event_name: str) -> dict:
-        """Wait for the transaction to be mined and return the arguments of the emitted event"""
-        tx_receipt = self._w3.eth.wait_for_transaction_receipt(tx_hash)
+    def _handleEvent(
+        self,
+        tx_hash: HexBytes,
+        event_name: str,
+        idempotency_key: str = None,
+        artworkId: int = None,
+    ) -> dict:
+        """
+        Wait for the transaction to be mined and return the arguments of the emitted event. Meanwhile the
+        transaction is pending for reads of artworkId, afterwards reads see its result.
+
+        :raises ContractLogicError: if the transaction was reverted when it was mined
+        """
+        if artworkId is not None:
+            self._overlay.sent(f"artwork:{artworkId}", tx_hash.hex())
+        tx_receipt = self._waitForReceipt(tx_hash)
+        if idempotency_key is not None:
+            self._journal.mined(idempotency_key)
         logs = self._contract.events[event_name]().process_receipt(tx_receipt)
+        self._overlayWrite(
+            tx_hash,
+            tx_receipt["blockNumber"],
+            logs[0]["args"] if logs else None,
+            artworkId,
+        )
+        if tx_receipt["status"] == 0 or not logs:
+            # the status code is the last three characters, like the reverts of the contract
+            raise ContractLogicError(f"transaction {tx_hash.hex()} reverted 409")
         return logs[0]["args"]
 
+    def _overlayWrite(
+        self,
+        tx_hash: HexBytes,
+        block_number: int,
+        event_args: dict | None,
+        artworkId: int = None,
+    ) -> None:
+        """Keeps the result of a mined write for the reads of the artwork and of the addresses it concerns"""
+        if event_args is None:
+            # reverted, nothing changed
+            if artworkId is not None:
+                self._overlay.mined(f"artwork:{artworkId}", tx_hash.hex())
+            return
+        record = self._recordOf(event_args) if "newData" in event_args else None
+        self._overlay.mined(
+            f"artwork:{event_args['tokenId']}", tx_hash.hex(), block_number, record
+        )
+        addresses = (
+            [event_args["to"]] if record is None else [record[r] for r in READERS]
+        )
+        for address in set(addresses):
+            self._overlay.mined(f"address:{address.lower()}", None, block_number)
+
+    def _getLogs(self, filter_params: dict) -> list:
+        return self._breaker.call(lambda: self._w3.eth.get_logs(filter_params))
+
+    def _decodeEvents(self, logs: list) -> list[dict]:
+        """Decodes Transfer and Updated logs into events with the artwork data"""
+        events = []
+        for log in logs:
+            name = self._eventNames[bytes(log["topics"][0])]
+            args = self._contract.events[name]().process_log(log)["args"]
+            if name == "Transfer":
+                data = {
+                    "from": args["from"],
+                    "to": args["to"],
+                    "tokenId": args["tokenId"],
+                }
+            else:
+                data = self._loadUpdated(args).dump()
+            events.append(
+                {
+                    "event": name,
+                    "blockNumber": log["blockNumber"],
+                    "logIndex": log["logIndex"],
+                    "transactionHash": HexBytes(log["transactionHash"]).hex(),
+                    "data": data,
+                }
+            )
+        return events
+
+    @staticmethod
+    def _recordOf(event_args: dict) -> dict:
+        """The getArtworkData record of the state an Updated event carries"""
+        new_data, approvals = event_args["newData"], event_args["approvals"]
+        return {
+            "id": new_data["id"],
+            "objectId": new_data["objectId"],
+            "owner": event_args["owner"],
+            "carrier": new_data["carrier"],
+            "logger": new_data["logger"],
+            "recipient": new_data["recipient"],
+            "currentStatus": new_data["status"]["currentStatus"],
+            "requestedStatus": new_data["status"]["requestedStatus"],
+            "ownerApproval": approvals["owner"],
+            "carrierApproval": approvals["carrier"],
+            "recipientApproval": approvals["recipient"],
+            "violationTimestamp": new_data["violationTimestamp"],
+        }
+
+    @staticmethod
+    def _loadUpdated(event_args: dict) -> Artwork:
+        """Load the artwork from the arguments of an Updated event"""
+        new_data = event_args.get("newData")
+        new_data = dict(new_data, **{"owner": event_args.get("owner")})
+        new_data["status"] = dict(
+            new_data["status"], **{"approvals": event_args.get("approvals")}
+        )
+        return Artwork.load(data=new_data)
+
     def _getSmartContractAbi(self) -> dict:
-        """Get the smart contract abi from etherscan.io api"""
+        """Get the smart contract abi from a local file if configured, otherwise from etherscan.io api"""
+        if abi_path := os.environ.get("SMARTCONTRACT_ABI_PATH"):
+            with open(abi_path) as f:
+                return json.load(f)
         api_key = os.environ.get("ETHERSCAN_API_KEY")
         response = requests.get(
             f"https://api-sepolia.etherscan.io/api?module=contract&action=getabi&address={self.address}&apikey={api_key}"
@@ -77,7 +319,9 @@ class ArtworkConnector(SmartcontractConnector):
         return json.loads(response.json()["result"])
 
     def _getSmartContractAddress(self) -> str:
-        """Get the smart contract address from github actions secrets"""
+        """Get the smart contract address from the environment if configured, otherwise from github actions secrets"""
+        if address := os.environ.get("SMARTCONTRACT_ADDRESS"):
+            return address
         access_token = os.environ.get("GITHUB_VARIABLES_ACCESS_TOKEN")
         org_name = os.environ.get("GITHUB_ORG_NAME")
         variable_name = os.environ.get("GITHUB_SC_ADDRESS_VARIABLE_NAME")
@@ -0,0 +1,93 @@
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable
+
+from werkzeug.exceptions import ServiceUnavailable
+
+
+class BoundedExecutor:
+    """
+    Thread pool with a limit on the work waiting for a worker. Calls beyond
+    max_workers + max_queue are rejected with 503 and a Retry-After instead of queueing,
+    so a burst of one kind of provider work can not hold all request threads.
+    """
+
+    def __init__(
+        self, name: str, max_workers: int, max_queue: int, retry_after: int = 1
+    ):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self._pool = ThreadPoolExecutor(max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._active = 0
+        self._counters = dict.fromkeys(
+            ("submitted", "completed", "failed", "rejected"), 0
+        )
+        self._wait_seconds = 0.0
+        self._run_seconds = 0.0
+
+    def run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """
+        Runs fn on the pool and waits for its result
+
+        :raises ServiceUnavailable: if the workers are busy and the queue is full
+        """
+        return self.submit(fn, *args, **kwargs).result()
+
+    def submit(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Future:
+        """
+        Schedules fn on the pool without waiting for it
+
+        :raises ServiceUnavailable: if the workers are busy and the queue is full
+        """
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue:
+                self._counters["rejected"] += 1
+                raise ServiceUnavailable(
+                    f"{self.name} pool is saturated, retry later",
+                    retry_after=self.retry_after,
+                )
+            self._pending += 1
+            self._counters["submitted"] += 1
+        return self._pool.submit(self._execute, time.monotonic(), fn, args, kwargs)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            finished = self._counters["completed"] + self._counters["failed"]
+            return {
+                "workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "active": self._active,
+                "queued": self._pending - self._active,
+                **self._counters,
+                "mean_wait_ms": round(1000 * self._wait_seconds / finished, 3)
+                if finished
+                else 0.0,
+                "mean_run_ms": round(1000 * self._run_seconds / finished, 3)
+                if finished
+                else 0.0,
+            }
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=True)
+
+    def _execute(self, submitted: float, fn: Callable, args: tuple, kwargs: dict):
+        started = time.monotonic()
+        with self._lock:
+            self._active += 1
+        outcome = "failed"
+        try:
+            result = fn(*args, **kwargs)
+            outcome = "completed"
+            return result
+        finally:
+            with self._lock:
+                self._active -= 1
+                self._pending -= 1
+                self._counters[outcome] += 1
+                self._wait_seconds += started - submitted
+                self._run_seconds += time.monotonic() - started
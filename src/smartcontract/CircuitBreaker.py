@@ -0,0 +1,110 @@
+import threading
+import time
+from typing import Any, Callable
+
+from requests.exceptions import RequestException
+from web3.exceptions import TimeExhausted
+from werkzeug.exceptions import ServiceUnavailable
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# errors of the provider itself, reverts are answers of a healthy provider
+PROVIDER_ERRORS = (RequestException, ConnectionError, TimeoutError)
+
+
+class CircuitOpen(ServiceUnavailable):
+    """Raised instead of calling the provider while the circuit is open"""
+
+
+class CircuitBreaker:
+    """
+    Stops calling the provider after failure_threshold consecutive failures or calls
+    slower than slow_call_seconds. Calls fail fast while open, after reset_seconds a
+    single probe call is let through (half open) and closes the circuit if it succeeds.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        slow_call_seconds: float = 5.0,
+        reset_seconds: float = 10.0,
+    ):
+        self.failure_threshold = failure_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == OPEN and self._retry_in() <= 0:
+                return HALF_OPEN
+            return self._state
+
+    def call(self, fn: Callable[[], Any], timed: bool = True) -> Any:
+        """
+        Calls fn unless the circuit is open, slow calls only count as failures if timed
+
+        :raises CircuitOpen: while the circuit is open or another probe is running
+        """
+        probe = self._acquire()
+        started = time.monotonic()
+        try:
+            result = fn()
+        except PROVIDER_ERRORS:
+            self._record(False, probe)
+            raise
+        except (ServiceUnavailable, TimeExhausted):
+            # a saturated pool or an exhausted call budget did not reach the provider, a
+            # receipt not mined in time is a slow chain while the provider kept answering
+            self._release(probe)
+            raise
+        except Exception:
+            # the provider answered, e.g. with a revert
+            self._record(True, probe)
+            raise
+        slow = timed and time.monotonic() - started > self.slow_call_seconds
+        self._record(not slow, probe)
+        return result
+
+    def _acquire(self) -> bool:
+        """Checks that a call may pass, returns whether it is the probe of a half open circuit"""
+        with self._lock:
+            if self._state == CLOSED:
+                return False
+            retry_in = self._retry_in()
+            if retry_in > 0 or self._probing:
+                raise CircuitOpen(
+                    "ethereum provider is unavailable",
+                    retry_after=max(1, int(retry_in + 0.999)),
+                )
+            self._probing = True
+            return True
+
+    def _release(self, probe: bool) -> None:
+        """Lets the next call probe again without recording an outcome"""
+        if probe:
+            with self._lock:
+                self._probing = False
+
+    def _record(self, success: bool, probe: bool) -> None:
+        with self._lock:
+            if probe:
+                self._probing = False
+            if success:
+                self._failures = 0
+                self._state = CLOSED
+                return
+            self._failures += 1
+            if probe or self._failures >= self.failure_threshold:
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+
+    def _retry_in(self) -> float:
+        return self._opened_at + self.reset_seconds - time.monotonic()
@@ -0,0 +1,209 @@
+import json
+import queue
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Iterator
+
+from werkzeug.exceptions import BadRequest, ServiceUnavailable
+
+from src.smartcontract.ArtworkConnector import ArtworkConnector
+from utils.logging import logger
+
+# fields of the event data naming the parties of an artwork
+PARTY_FIELDS = ("from", "to", "owner", "carrier", "logger", "recipient")
+
+
+def event_id(event: dict) -> tuple[int, int]:
+    return event["blockNumber"], event["logIndex"]
+
+
+def parse_event_id(value: str | None) -> tuple[int, int] | None:
+    """Parses a Last-Event-ID of the form <block number>-<log index>"""
+    try:
+        block, index = value.split("-")
+        return int(block), int(index)
+    except (AttributeError, ValueError):
+        return None
+
+
+def parties(event: dict) -> set[str]:
+    return {
+        value.lower()
+        for key in PARTY_FIELDS
+        if isinstance(value := event["data"].get(key), str)
+    }
+
+
+@dataclass(eq=False)
+class Subscription:
+    address: str
+    queue: queue.Queue
+    overflowed: bool = False
+    backlog: list = field(default_factory=list)
+
+
+class EventStream:
+    """
+    Polls the artwork events of the smartcontract once per poll_interval in a single
+    background thread and fans them out to the subscribed clients, filtered by the
+    parties of the event. The most recent events are buffered so reconnecting clients
+    resume from their Last-Event-ID, older ones are fetched from the provider from the
+    deployment block of the smartcontract on, but at most max_replay blocks before the
+    buffer.
+    """
+
+    def __init__(
+        self,
+        sc: ArtworkConnector,
+        poll_interval: float = 2.0,
+        history: int = 1024,
+        max_subscribers: int = 4,
+        queue_size: int = 256,
+        heartbeat: float = 15.0,
+        max_duration: float = 300.0,
+        max_catch_up: int = 10_000,
+        max_replay: int = 10_000,
+    ):
+        self._sc = sc
+        self.poll_interval = poll_interval
+        self.max_subscribers = max_subscribers
+        self.queue_size = queue_size
+        self.heartbeat = heartbeat
+        self.max_duration = max_duration
+        self.max_catch_up = max_catch_up
+        self.max_replay = max_replay
+        self._lock = threading.Lock()
+        self._has_subscribers = threading.Condition(self._lock)
+        self._subscribers: set[Subscription] = set()
+        self._buffer: deque[dict] = deque(maxlen=history)
+        # the events of blocks [_buffered_from, _polled_to] are in the buffer
+        self._buffered_from = None
+        self._polled_to = None
+        self._poller = None
+
+    def subscribe(self, address: str, last_event_id: str = None) -> Subscription:
+        """
+        Registers a client for the events of address, replaying the events after last_event_id
+
+        :raises ServiceUnavailable: if the maximum number of streams is open
+        :raises BadRequest: if last_event_id is more than max_replay blocks before the buffer
+        """
+        self._start()
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                raise ServiceUnavailable("too many open event streams", retry_after=5)
+            subscription = Subscription(address.lower(), queue.Queue(self.queue_size))
+            self._subscribers.add(subscription)
+            self._has_subscribers.notify()
+            buffered = list(self._buffer)
+            buffered_from, polled_to = self._buffered_from, self._polled_to
+
+        # events up to polled_to are replayed here, later ones arrive on the queue
+        if (after := parse_event_id(last_event_id)) is not None:
+            # there are no events before the smartcontract was deployed
+            start = max(after[0], self._sc.deployment_block)
+            if start < buffered_from:
+                try:
+                    if buffered_from - start > self.max_replay:
+                        raise BadRequest(
+                            "Last-Event-ID is too old to resume from, fetch the history of the artworks and reconnect without it"
+                        )
+                    buffered = self._sc.getArtworkEvents(start, polled_to)
+                except Exception:
+                    self.unsubscribe(subscription)
+                    raise
+            subscription.backlog = [
+                event
+                for event in buffered
+                if event_id(event) > after and subscription.address in parties(event)
+            ]
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def sse(self, subscription: Subscription) -> Iterator[str]:
+        """Server-sent events of the subscription, ends after max_duration so clients reconnect"""
+        try:
+            yield f"retry: {int(self.poll_interval * 1000)}\n\n"
+            for event in subscription.backlog:
+                yield self._format(event)
+            deadline = time.monotonic() + self.max_duration
+            while time.monotonic() < deadline and not subscription.overflowed:
+                try:
+                    event = subscription.queue.get(timeout=self.heartbeat)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield self._format(event)
+        finally:
+            self.unsubscribe(subscription)
+
+    def _start(self) -> None:
+        """Starts polling at the current head on the first subscription"""
+        if self._poller is not None:
+            return
+        head = self._sc.blockNumber()
+        with self._lock:
+            if self._poller is None:
+                self._reset(head)
+                self._poller = threading.Thread(
+                    target=self._poll, name="event-stream", daemon=True
+                )
+                self._poller.start()
+
+    def _poll(self) -> None:
+        """Polls the new blocks for events, pauses while nobody is subscribed"""
+        while True:
+            with self._lock:
+                while not self._subscribers:
+                    self._has_subscribers.wait()
+                polled_to = self._polled_to
+            try:
+                head = self._sc.blockNumber()
+                if head - polled_to > self.max_catch_up:
+                    # idle for too long, resuming before head needs the provider
+                    with self._lock:
+                        self._reset(head)
+                elif head > polled_to:
+                    self._publish(self._sc.getArtworkEvents(polled_to + 1, head), head)
+            except Exception as e:
+                # provider failures are retried with the next poll
+                logger.warning(f"Polling artwork events failed, retrying: {e!r}")
+            time.sleep(self.poll_interval)
+
+    def _reset(self, head: int) -> None:
+        """Empties the buffer and continues after head, the lock must be held"""
+        self._buffer.clear()
+        self._buffered_from, self._polled_to = head + 1, head
+
+    def _publish(self, events: list[dict], to_block: int) -> None:
+        with self._lock:
+            for event in events:
+                if len(self._buffer) == self._buffer.maxlen:
+                    # the block of the evicted event is no longer complete in the buffer
+                    self._buffered_from = self._buffer.popleft()["blockNumber"] + 1
+                self._buffer.append(event)
+            self._polled_to = to_block
+            subscribers = list(self._subscribers)
+        for event in events:
+            addresses = parties(event)
+            for subscription in subscribers:
+                if subscription.address not in addresses:
+                    continue
+                try:
+                    subscription.queue.put_nowait(event)
+                except queue.Full:
+                    # a client too slow to keep up reconnects and resumes from its last id
+                    subscription.overflowed = True
+
+    @staticmethod
+    def _format(event: dict) -> str:
+        return (
+            f"id: {event['blockNumber']}-{event['logIndex']}\n"
+            f"event: {event['event']}\n"
+            f"data: {json.dumps(event, separators=(',', ':'))}\n\n"
+        )
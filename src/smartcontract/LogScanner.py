@@ -0,0 +1,133 @@
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from typing import Callable
+
+from requests.exceptions import Timeout
+
+from src.smartcontract.BoundedExecutor import BoundedExecutor
+
+# parts of the eth_getLogs errors of providers asking for a smaller block range
+RANGE_ERRORS = (
+    "more than",
+    "too many",
+    "limit exceeded",
+    "response size",
+    "block range",
+    "range is too large",
+    "timeout",
+    "timed out",
+)
+
+
+def range_too_large(error: Exception) -> bool:
+    """Whether the provider refused a range it would answer in smaller parts"""
+    if isinstance(error, (Timeout, TimeoutError)):
+        return True
+    if isinstance(error, ValueError):
+        message = str(error).lower()
+        return any(part in message for part in RANGE_ERRORS)
+    return False
+
+
+class LogScanner:
+    """
+    Fetches the logs matching a set of filters over large block ranges. The range is
+    split into windows fetched in parallel (at most concurrency per scan, at most
+    max_workers for all scans), a window the provider refuses for its size is halved
+    and retried. The window size adapts to the density of the logs: it is halved on a
+    refusal and doubled after a window with less than target_logs / 2 logs, but within
+    a scan never grows beyond half the size of a refused window.
+    """
+
+    def __init__(
+        self,
+        get_logs: Callable[[dict], list],
+        max_workers: int = 4,
+        max_queue: int = 16,
+        concurrency: int = 4,
+        initial_window: int = 2_000,
+        max_window: int = 500_000,
+        target_logs: int = 1_000,
+    ):
+        self._get_logs = get_logs
+        self.concurrency = concurrency
+        self.max_window = max_window
+        self.target_logs = target_logs
+        self._pool = BoundedExecutor("logs", max_workers, max_queue)
+        self._lock = threading.Lock()
+        self._window = initial_window
+
+    @property
+    def window(self) -> int:
+        return self._window
+
+    def scan(self, filters: list[dict], from_block: int, to_block: int) -> list:
+        """
+        The logs of every filter in the blocks [from_block, to_block], ordered by block and log index
+
+        :raises ServiceUnavailable: if the scan pool is saturated
+        """
+        logs = []
+        cursor = from_block
+        ceiling = self.max_window
+        # refused ranges, fetched again in windows of the reduced size before the range continues
+        refused: list[tuple[dict, int, int]] = []
+        running: dict[Future, tuple[dict, int, int]] = {}
+        try:
+            while running or refused or cursor <= to_block:
+                while len(running) < self.concurrency and (
+                    refused or cursor <= to_block
+                ):
+                    if refused:
+                        selected, start, end = refused.pop()
+                        split = min(end, start + self._window - 1)
+                        if split < end:
+                            refused.append((selected, split + 1, end))
+                        windows = [(selected, start, split)]
+                    else:
+                        end = min(to_block, cursor + self._window - 1)
+                        windows = [(selected, cursor, end) for selected in filters]
+                        cursor = end + 1
+                    for window in windows:
+                        running[self._pool.submit(self._fetch, *window)] = window
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    window = running.pop(future)
+                    try:
+                        fetched = future.result()
+                    except Exception as error:
+                        ceiling = min(ceiling, self._shrink(window, error))
+                        refused.append(window)
+                        continue
+                    logs.extend(fetched)
+                    self._grow(window, len(fetched), ceiling)
+        finally:
+            for future in running:
+                future.cancel()
+        return sorted(logs, key=lambda log: (log["blockNumber"], log["logIndex"]))
+
+    def _fetch(self, selected: dict, start: int, end: int) -> list:
+        return self._get_logs(selected | {"fromBlock": start, "toBlock": end})
+
+    def _grow(self, window: tuple, count: int, ceiling: int) -> None:
+        """Doubles the window after a sparse window of the full size, up to the ceiling"""
+        _, start, end = window
+        if count >= self.target_logs // 2:
+            return
+        with self._lock:
+            if end - start + 1 >= self._window:
+                self._window = max(self._window, min(ceiling, self._window * 2))
+
+    def _shrink(self, window: tuple, error: Exception) -> int:
+        """
+        Halves the window after a refused one, returns the half of the refused size
+
+        :raises: the error if it is not a refusal of the size or a single block was refused
+        """
+        _, start, end = window
+        if start == end or not range_too_large(error):
+            raise error
+        half = (end - start + 1) // 2
+        with self._lock:
+            self._window = min(self._window, half)
+        return half
@@ -0,0 +1,54 @@
+from typing import Any, Callable
+
+from eth_abi import decode, encode
+from eth_utils import to_checksum_address
+from eth_utils.abi import collapse_if_tuple, function_abi_to_4byte_selector
+
+
+def _converter(abi: dict) -> Callable[[Any], Any]:
+    """Builds the function turning a decoded eth_abi value into the value web3 would return"""
+    abi_type = abi["type"]
+    if abi_type.startswith("tuple"):
+        names = [component["name"] for component in abi["components"]]
+        converters = [_converter(component) for component in abi["components"]]
+        convert = lambda value: {
+            name: c(v) for name, c, v in zip(names, converters, value)
+        }
+    elif abi_type.startswith("address"):
+        convert = to_checksum_address
+    else:
+        convert = None
+
+    if abi_type.endswith("]"):
+        if convert is None:
+            return list
+        return lambda values: [convert(v) for v in values]
+    return convert or (lambda value: value)
+
+
+class PrecompiledFunction:
+    """
+    A contract function with its selector, argument and output types resolved once from
+    the abi, so calls are encoded and decoded with eth_abi directly instead of going
+    through web3's ContractFunction lookup, normalization and namedtuple decoding.
+    Tuple outputs are decoded into dicts keyed by the component names.
+    """
+
+    def __init__(self, abi: dict):
+        self.name = abi["name"]
+        self.selector = function_abi_to_4byte_selector(abi)
+        self.input_types = [collapse_if_tuple(i) for i in abi["inputs"]]
+        self.output_types = [collapse_if_tuple(o) for o in abi["outputs"]]
+        self._output_converters = [_converter(o) for o in abi["outputs"]]
+
+    def encode(self, *args: Any) -> bytes:
+        return self.selector + encode(self.input_types, args)
+
+    def decode(self, data: bytes) -> Any:
+        values = [
+            convert(value)
+            for convert, value in zip(
+                self._output_converters, decode(self.output_types, data)
+            )
+        ]
+        return values[0] if len(values) == 1 else tuple(values)
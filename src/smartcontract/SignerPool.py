@@ -0,0 +1,130 @@
+import multiprocessing
+import threading
+import time
+from typing import Callable
+
+from hexbytes import HexBytes
+
+
+class Lane:
+    """
+    A signing account with its own nonce sequence. The state lives in shared memory
+    and the lock is a process lock, the forked gunicorn workers share the lane.
+    """
+
+    def __init__(self, address: str):
+        self.address = address
+        # held from reading the nonce until the transaction is broadcast
+        self.lock = multiprocessing.Lock()
+        # the nonce of the next transaction as far as this instance knows, -1 if unknown
+        self.nonce = multiprocessing.Value("q", -1, lock=False)
+        # transactions scheduled or sent whose receipt was not seen yet
+        self.in_flight = multiprocessing.Value("i", 0, lock=False)
+        # a lane with a transaction that was not mined in time is set aside until then
+        self.stuck_until = multiprocessing.Value("d", 0.0, lock=False)
+
+
+class SignerPool:
+    """
+    Schedules transactions onto the lane of the least loaded signing account. Every lane
+    tracks its nonce locally and takes the pending transaction count of the node if
+    that is higher, so transactions another instance sent with the same key are
+    accounted for while the local nonce covers a node that lags behind. A lane whose transaction was not mined in time is set aside for
+    stuck_timeout seconds so the transactions queued behind it in the mempool do not
+    hold up the other lanes, it is only used meanwhile if every lane is stuck.
+    """
+
+    def __init__(self, addresses: list[str], stuck_timeout: float = 600.0):
+        self.stuck_timeout = stuck_timeout
+        self.lanes = [Lane(address) for address in addresses]
+        self._lanes = {lane.address: lane for lane in self.lanes}
+        # guards the load counters of all lanes
+        self._lock = multiprocessing.Lock()
+        # lanes of the transactions sent by this process
+        self._sent: dict[str, Lane] = {}
+        self._sent_lock = threading.Lock()
+
+    def send(
+        self,
+        transact: Callable[[str, int], HexBytes],
+        get_nonce: Callable[[str], int],
+        address: str = None,
+        prepare: Callable[[str], None] = None,
+    ) -> HexBytes:
+        """
+        Broadcasts a transaction with transact(address, nonce) from the least loaded lane or the lane of address
+
+        :param get_nonce: reads the pending transaction count of an address from the node
+        :param prepare: called with the address of the lane before its nonce is read, e.g. to simulate the transaction
+        :return: the hash of the transaction, pass it to done() once its receipt was seen
+        """
+        lane = self._schedule(address)
+        try:
+            if prepare is not None:
+                prepare(lane.address)
+            with lane.lock:
+                nonce = max(lane.nonce.value, get_nonce(lane.address))
+                try:
+                    tx_hash = transact(lane.address, nonce)
+                except Exception:
+                    # the broadcast may or may not have happened, the node knows
+                    lane.nonce.value = -1
+                    raise
+                lane.nonce.value = nonce + 1
+        except Exception:
+            self._release(lane)
+            raise
+        with self._sent_lock:
+            self._sent[HexBytes(tx_hash).hex()] = lane
+        return tx_hash
+
+    def done(self, tx_hash: HexBytes | str, stuck: bool = False) -> None:
+        """Releases the lane of a transaction sent by send(), a stuck one sets the lane aside"""
+        with self._sent_lock:
+            lane = self._sent.pop(HexBytes(tx_hash).hex(), None)
+        if lane is None:
+            return
+        if stuck:
+            with lane.lock:
+                lane.nonce.value = -1
+            with self._lock:
+                lane.stuck_until.value = time.time() + self.stuck_timeout
+        self._release(lane)
+
+    def sender(self, tx_hash: HexBytes | str) -> str | None:
+        """The address a transaction sent by send() and not done yet was sent from"""
+        with self._sent_lock:
+            lane = self._sent.get(HexBytes(tx_hash).hex())
+        return None if lane is None else lane.address
+
+    def metrics(self) -> list[dict]:
+        now = time.time()
+        with self._lock:
+            return [
+                {
+                    "address": lane.address,
+                    "in_flight": lane.in_flight.value,
+                    "stuck": lane.stuck_until.value > now,
+                }
+                for lane in self.lanes
+            ]
+
+    def _schedule(self, address: str | None) -> Lane:
+        now = time.time()
+        with self._lock:
+            if address is not None:
+                lane = self._lanes[address]
+            else:
+                lane = min(
+                    self.lanes,
+                    key=lambda lane: (
+                        lane.stuck_until.value > now,
+                        lane.in_flight.value,
+                    ),
+                )
+            lane.in_flight.value += 1
+            return lane
+
+    def _release(self, lane: Lane) -> None:
+        with self._lock:
+            lane.in_flight.value -= 1
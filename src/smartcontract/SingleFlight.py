@@ -0,0 +1,54 @@
+import threading
+from typing import Any, Callable, Hashable
+
+from web3.exceptions import TimeExhausted
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls: the first caller for a key executes the call,
+    callers arriving while it is in flight wait for it and share its result or error.
+    """
+
+    def __init__(self, timeout: float = 30):
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._calls: dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """
+        Runs fn unless a call with the same key is already in flight
+
+        :raises TimeExhausted: if a waiting caller does not get a result within timeout
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if leader:
+            try:
+                call.result = fn()
+            except Exception as error:
+                call.error = error
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+        elif not call.done.wait(self.timeout):
+            raise TimeExhausted(f"coalesced call {key!r} did not finish in time")
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def in_flight(self) -> int:
+        return len(self._calls)
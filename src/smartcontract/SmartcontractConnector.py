@@ -1,14 +1,94 @@
+import hashlib
+import json
+import math
+import threading
+import time
 from abc import ABC, abstractmethod
+from contextvars import ContextVar
+from functools import partial, wraps
+from typing import Any, Callable
 
+from hexbytes import HexBytes
+from lru import LRU
 from web3 import Web3, middleware
+from web3.middleware.cache import BLOCK_NUMBER_RPC_WHITELIST
 from web3.contract import Contract
+from web3.exceptions import TimeExhausted
 from web3.gas_strategies.rpc import rpc_gas_price_strategy
+from werkzeug.exceptions import ServiceUnavailable, UnprocessableEntity
+
+from src.cache.SharedCache import SharedCache
+from src.ratelimit.RateLimiter import RateLimiter
+from src.smartcontract.BoundedExecutor import BoundedExecutor
+from src.smartcontract.CircuitBreaker import (
+    OPEN,
+    PROVIDER_ERRORS,
+    CircuitBreaker,
+    CircuitOpen,
+)
+from src.smartcontract.PrecompiledFunction import PrecompiledFunction
+from src.smartcontract.SignerPool import SignerPool
+from src.smartcontract.SingleFlight import SingleFlight
+from src.smartcontract.StaleCache import StaleCache
+from src.smartcontract.TransactionJournal import TransactionJournal
+from src.smartcontract.WriteOverlay import WriteOverlay
+
+
+# headroom on top of the simulated gas, the pending state can change before inclusion
+GAS_MARGIN = 1.2
+
+# the nonce of the next transaction must never come from the cache
+BLOCK_CACHED_RPCS = BLOCK_NUMBER_RPC_WHITELIST - {"eth_getTransactionCount"}
+
+# seconds between the head checks of a read waiting for the provider to see a write
+CATCH_UP_POLL = 0.1
+
+# fetch time of the oldest stale value served in the current context (request)
+_stale_since: ContextVar[float | None] = ContextVar("stale_since", default=None)
+
+
+class ProviderBudgetExhausted(ServiceUnavailable):
+    """Raised instead of calling the provider beyond the calls per second budget"""
+
+
+def write(method: Callable) -> Callable:
+    """Runs a connector method sending transactions and waiting for their receipts on the write pool"""
+
+    @wraps(method)
+    def wrapper(self: "SmartcontractConnector", *args: Any, **kwargs: Any) -> Any:
+        return self._breaker.call(
+            lambda: self._writes.run(method, self, *args, **kwargs), timed=False
+        )
+
+    return wrapper
 
 
 class SmartcontractConnector(ABC):
-    def __init__(self, signing_private_key: str, http_provider_url: str):
+    def __init__(
+        self,
+        signing_private_key: str,
+        http_provider_url: str,
+        simulate_writes: bool = False,
+        read_workers: int = 8,
+        read_queue: int = 16,
+        write_workers: int = 2,
+        write_queue: int = 2,
+        journal_path: str | None = None,
+        shared_cache: SharedCache = None,
+        provider_rate: float = 0,
+        provider_burst: float = None,
+        provider_max_wait: float = 1.0,
+        signer_private_keys: list[str] = (),
+        receipt_timeout: float = 120.0,
+    ):
         self._w3 = Web3(Web3.HTTPProvider(http_provider_url))
         default_account = self._w3.eth.account.from_key(signing_private_key)
+        # further accounts authorized by the smartcontract to mint and update
+        signers = [default_account] + [
+            self._w3.eth.account.from_key(key)
+            for key in signer_private_keys
+            if key != signing_private_key
+        ]
 
         def aggressive_gas_strategy(web3, transaction_params=None):
             return Web3.to_wei(30, "gwei")
@@ -17,17 +97,48 @@ class SmartcontractConnector(ABC):
 
         self._w3.eth.default_account = default_account.address
         self._w3.middleware_onion.add(
-            middleware.construct_sign_and_send_raw_middleware(default_account)
+            middleware.construct_sign_and_send_raw_middleware(signers)
         )
         self._w3.middleware_onion.add(middleware.time_based_cache_middleware)
-        self._w3.middleware_onion.add(middleware.latest_block_based_cache_middleware)
+        self._w3.middleware_onion.add(
+            middleware.construct_latest_block_based_cache_middleware(
+                cache_class=partial(LRU, 256), rpc_whitelist=BLOCK_CACHED_RPCS
+            )
+        )
         self._w3.middleware_onion.add(middleware.simple_cache_middleware)
+        # innermost, only the calls that reach the provider use up the budget
+        self._budget = RateLimiter(
+            "provider",
+            provider_rate,
+            provider_burst or 2 * provider_rate,
+            shared_cache=shared_cache,
+        )
+        self._budgetMaxWait = provider_max_wait
+        self._w3.middleware_onion.inject(self._budgetMiddleware, "budget", layer=0)
 
         self._address = self._getSmartContractAddress()
         self._abi = self._getSmartContractAbi()
         self._contract: Contract = self._w3.eth.contract(
             address=self._address, abi=self._abi, decode_tuples=True
         )
+        self._inflight = SingleFlight()
+        self._functions = self._precompileViewFunctions(self._abi)
+        self._simulate_writes = simulate_writes
+        # a nonce sequence per signer, each serialized across threads and the forked
+        # gunicorn workers
+        self._signers = SignerPool([signer.address for signer in signers])
+        self._receiptTimeout = receipt_timeout
+        # writes block for a whole block time, on their own small pool they can not
+        # occupy all request threads and starve the reads
+        self._reads = BoundedExecutor("reads", read_workers, read_queue)
+        self._writes = BoundedExecutor("writes", write_workers, write_queue)
+        self._breaker = CircuitBreaker()
+        self._sharedCache = shared_cache
+        self._lastKnown = StaleCache(shared_cache=shared_cache)
+        self._overlay = WriteOverlay(shared_cache=shared_cache)
+        self._journal = TransactionJournal(journal_path)
+        self._idempotent = SingleFlight()
+        self._resumePending()
 
     @property
     def address(self) -> str:
@@ -37,6 +148,280 @@ class SmartcontractConnector(ABC):
     def abi(self) -> dict:
         return self._abi
 
+    @property
+    def chainId(self) -> int:
+        return self._w3.eth.chain_id
+
+    def hasFunction(self, function_name: str) -> bool:
+        """Whether the abi of the smartcontract contains the function"""
+        return any(
+            item.get("type") == "function" and item.get("name") == function_name
+            for item in self._abi
+        )
+
+    def _call(self, function_name: str, *args, block_identifier: str = "latest") -> Any:
+        """
+        Call a view function of the smartcontract, identical concurrent calls share a single rpc.
+        While the provider is failing the last known result is served and refreshed in the background.
+        """
+        key = (function_name, args, block_identifier)
+        try:
+            result = self._inflight.do(
+                key,
+                lambda: self._breaker.call(
+                    lambda: self._reads.run(
+                        self._rawCall, function_name, args, block_identifier
+                    )
+                ),
+            )
+        except (CircuitOpen, ProviderBudgetExhausted, *PROVIDER_ERRORS):
+            if (known := self._lastKnown.get(key)) is None:
+                raise
+            result, fetched_at = known
+            since = _stale_since.get()
+            _stale_since.set(fetched_at if since is None else min(since, fetched_at))
+            self._revalidate(key)
+            return result
+        self._lastKnown.put(key, result)
+        return result
+
+    def _revalidate(self, key: tuple) -> None:
+        """Refresh a last known result on the read pool once the circuit lets calls through"""
+        if self._breaker.state == OPEN:
+            return
+        function_name, args, block_identifier = key
+        refresh = lambda: self._lastKnown.put(
+            key,
+            self._inflight.do(
+                key,
+                lambda: self._breaker.call(
+                    lambda: self._rawCall(function_name, args, block_identifier)
+                ),
+            ),
+        )
+        try:
+            self._reads.submit(refresh)
+        except ServiceUnavailable:
+            pass
+
+    def _caughtUp(self, key: str, block_number: int, wait: float = 0.0) -> int | None:
+        """
+        The head block of the provider if it reached the block of a write of key within wait
+        seconds, reads pinned to the head include the write. None if it is still behind or failing.
+        """
+        deadline = time.monotonic() + wait
+        try:
+            while (
+                head := self._breaker.call(lambda: self._w3.eth.block_number)
+            ) < block_number:
+                if time.monotonic() >= deadline:
+                    return None
+                time.sleep(CATCH_UP_POLL)
+        except (CircuitOpen, ProviderBudgetExhausted, *PROVIDER_ERRORS):
+            return None
+        self._overlay.caught_up(key, head)
+        return head
+
+    def _callAt(self, head: int, function_name: str, *args) -> Any:
+        """Call a view function at the head block, the cached results of the latest block may predate it"""
+        result = self._call(function_name, *args, block_identifier=head)
+        # the newest known result, served for the latest block while the provider fails
+        self._lastKnown.put((function_name, args, "latest"), result)
+        return result
+
+    def staleSince(self) -> float | None:
+        """Epoch time the oldest stale result served in the current request was fetched at"""
+        return _stale_since.get()
+
+    def resetStaleness(self) -> None:
+        _stale_since.set(None)
+
+    def poolMetrics(self) -> dict:
+        """Load and rejection counters of the read and write pools"""
+        return {
+            "reads": self._reads.metrics(),
+            "writes": self._writes.metrics(),
+            "signers": self._signers.metrics(),
+        }
+
+    def cacheSizes(self) -> dict:
+        """Sizes of the caches of the connector, a shared table is reported once"""
+        if self._sharedCache is not None:
+            # the last known results, the writes and the provider budget share one table
+            sizes = {"shared_contract_cache": len(self._sharedCache)}
+        else:
+            sizes = {
+                "last_known": len(self._lastKnown),
+                "write_overlay": len(self._overlay),
+            }
+        return sizes | {"pending_transactions": len(self._journal.pending())}
+
+    @property
+    def providerState(self) -> str:
+        """State of the circuit breaker around the provider: closed, open or half_open"""
+        return self._breaker.state
+
+    def _budgetMiddleware(self, make_request: Callable, w3: Web3) -> Callable:
+        """Waits up to provider_max_wait for the provider call budget before every call"""
+
+        def request(method: str, params: Any) -> Any:
+            admitted, wait = self._budget.reserve("calls", max_wait=self._budgetMaxWait)
+            if not admitted:
+                raise ProviderBudgetExhausted(
+                    "provider call budget is used up, retry later",
+                    retry_after=max(1, math.ceil(wait)),
+                )
+            if wait:
+                time.sleep(wait)
+            return make_request(method, params)
+
+        return request
+
+    def _transact(
+        self,
+        function_name: str,
+        *args: Any,
+        pooled: bool = True,
+        signer: str = None,
+        journal: bool = True,
+    ) -> HexBytes:
+        """
+        Send a transaction to the smartcontract from the least loaded signer, from the given signer or
+        from the admin account if not pooled. In dry-run mode it is simulated against the pending block first.
+        The broadcast is journaled under its hash unless the caller journals it under an idempotency key.
+        """
+        function = self._contract.functions[function_name](*args)
+        transaction = {}
+
+        def simulate(sender: str) -> None:
+            # simulated as the signer of the lane, a revert raises ContractLogicError with
+            # the decoded reason before the nonce, fee and signing round trips, the
+            # simulated gas spares the estimate on send
+            gas = function.estimate_gas({"from": sender}, block_identifier="pending")
+            transaction["gas"] = int(gas * GAS_MARGIN)
+
+        tx_hash = self._signers.send(
+            lambda sender, nonce: function.transact(
+                dict(transaction, **{"from": sender, "nonce": nonce})
+            ),
+            lambda sender: self._w3.eth.get_transaction_count(sender, "pending"),
+            address=signer or (None if pooled else self._w3.eth.default_account),
+            prepare=simulate if self._simulate_writes else None,
+        )
+        if journal:
+            self._journal.sent(
+                f"tx:{tx_hash.hex()}",
+                tx_hash.hex(),
+                function_name,
+                "",
+                self._signers.sender(tx_hash),
+            )
+        return tx_hash
+
+    def _waitForReceipt(self, tx_hash: HexBytes) -> dict:
+        """Wait for the receipt of a transaction, the signer of a transaction not mined in time is set aside"""
+        stuck = False
+        try:
+            receipt = self._w3.eth.wait_for_transaction_receipt(
+                tx_hash, timeout=self._receiptTimeout
+            )
+            self._journal.mined(f"tx:{HexBytes(tx_hash).hex()}")
+            return receipt
+        except TimeExhausted:
+            stuck = True
+            raise
+        finally:
+            self._signers.done(tx_hash, stuck)
+
+    def _send(
+        self,
+        idempotency_key: str | None,
+        function_name: str,
+        *args: Any,
+        sender: str = None,
+    ) -> HexBytes:
+        """
+        Send a transaction once per idempotency key, retries get the hash of the transaction sent before
+
+        :raises UnprocessableEntity: if the key was used for a different transaction
+        """
+        if idempotency_key is None:
+            return self._transact(function_name, *args)
+        fingerprint = hashlib.blake2b(
+            json.dumps([function_name, args], sort_keys=True, default=str).encode(),
+            digest_size=16,
+        ).hexdigest()
+
+        def send():
+            if (entry := self._journal.get(idempotency_key)) is not None:
+                return entry
+            # other workers sharing the journal may be sending the same key
+            with self._journal.exclusive():
+                if (entry := self._journal.get(idempotency_key)) is None:
+                    tx_hash = self._transact(function_name, *args, journal=False)
+                    entry = self._journal.sent(
+                        idempotency_key,
+                        tx_hash.hex(),
+                        function_name,
+                        fingerprint,
+                        sender,
+                    )
+            return entry
+
+        # concurrent requests with the same key wait for the first to broadcast
+        entry = self._idempotent.do(idempotency_key, send)
+        if entry.fingerprint != fingerprint:
+            raise UnprocessableEntity(
+                "idempotency key was already used for a different request"
+            )
+        return HexBytes(entry.tx_hash)
+
+    def _resumePending(self) -> None:
+        """Track the receipts of transactions journaled before a restart in the background"""
+        pending = self._journal.pending()
+        if not pending:
+            return
+
+        def track():
+            for entry in pending:
+                try:
+                    self._w3.eth.wait_for_transaction_receipt(entry.tx_hash)
+                except Exception:
+                    # dropped or still not mined, stays pending in the journal
+                    continue
+                self._journal.mined(entry.key)
+
+        threading.Thread(target=track, name="journal-replay", daemon=True).start()
+
+    def _rawCall(self, function_name: str, args: tuple, block_identifier: str) -> Any:
+        """Issue the eth_call with the precompiled encoder, tuple outputs are returned as dicts"""
+        function = self._functions.get(function_name)
+        if function is None:
+            result = self._contract.functions[function_name](*args).call(
+                block_identifier=block_identifier
+            )
+            return result._asdict() if hasattr(result, "_asdict") else result
+        transaction = {"to": self._address, "data": function.encode(*args)}
+        if self._w3.eth.default_account:
+            transaction["from"] = self._w3.eth.default_account
+        return function.decode(self._w3.eth.call(transaction, block_identifier))
+
+    @staticmethod
+    def _precompileViewFunctions(abi: list) -> dict[str, PrecompiledFunction]:
+        """Precompile the view functions of the abi, overloaded functions are left to web3"""
+        view_functions = [
+            item
+            for item in abi
+            if item.get("type") == "function"
+            and item.get("stateMutability") in ("view", "pure")
+        ]
+        names = [item["name"] for item in view_functions]
+        return {
+            item["name"]: PrecompiledFunction(item)
+            for item in view_functions
+            if names.count(item["name"]) == 1
+        }
+
     @abstractmethod
     def _getSmartContractAddress(self) -> str:
         pass
@@ -0,0 +1,54 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+from src.cache.SharedCache import SharedCache
+
+
+class StaleCache:
+    """
+    Least recently used store of the last successful result per call, kept to answer
+    reads while the provider is unavailable. Keys include the sender, so a stale value
+    is only served to whoever was allowed to read it. With a SharedCache the values
+    are kept in shared memory for all gunicorn workers.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 10_000,
+        shared_cache: SharedCache = None,
+        retention: float = 24 * 60 * 60,
+    ):
+        self.max_size = max_size
+        self.retention = retention
+        self._shared = shared_cache
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[Hashable, tuple[Any, float]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._shared) if self._shared is not None else len(self._entries)
+
+    def put(self, key: Hashable, value: Any) -> None:
+        if self._shared is not None:
+            now = time.time()
+            entry = pickle.dumps((value, now))
+            self._shared.set(repr(key), entry, now + self.retention)
+            return
+        with self._lock:
+            self._entries[key] = (value, time.time())
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def get(self, key: Hashable) -> tuple[Any, float] | None:
+        """The last value stored for key and the epoch time it was fetched at"""
+        if self._shared is not None:
+            entry = self._shared.get(repr(key))
+            return None if entry is None else pickle.loads(entry)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
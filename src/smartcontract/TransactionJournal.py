@@ -0,0 +1,229 @@
+import fcntl
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from typing import Iterator
+
+
+@dataclass
+class JournalEntry:
+    key: str
+    tx_hash: str
+    function: str
+    fingerprint: str
+    sender: str | None
+    sent_at: float
+    done: bool = False
+
+
+class TransactionJournal:
+    """
+    Append-only journal of broadcast transactions by idempotency key. Every line is a
+    json record written and fsynced right after the broadcast, so a restarted server
+    still knows which transactions are in flight and retried requests attach to them
+    instead of sending again. Without a path the journal only lives in memory.
+
+    Several processes (gunicorn workers) can share the file, lookups of unknown keys
+    read the records the others appended and exclusive() serializes them. At most once
+    per prune_interval the mined entries older than the retention are dropped and the
+    file is compacted, the other processes notice the new file and read it again.
+    """
+
+    def __init__(
+        self,
+        path: str | None = None,
+        retention: float = 24 * 60 * 60,
+        prune_interval: float = 10 * 60,
+    ):
+        self.path = path
+        self.retention = retention
+        self.prune_interval = prune_interval
+        # guards the entries and the read offset
+        self._lock = threading.Lock()
+        self._exclusive = threading.Lock()
+        # guards the file against the other threads, the flock against other processes
+        self._file_lock = threading.RLock()
+        self._flock_depth = 0
+        self._entries: dict[str, JournalEntry] = {}
+        self._file = None
+        self._offset = 0
+        self._inode = None
+        self._lock_file = None
+        self._lock_pid = None
+        self._pruned_at = time.monotonic()
+        if path is not None:
+            self._load()
+
+    def get(self, key: str) -> JournalEntry | None:
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None and self.path is not None:
+            self._catch_up()
+            with self._lock:
+                entry = self._entries.get(key)
+        return entry
+
+    @contextmanager
+    def exclusive(self) -> Iterator[None]:
+        """Holds the journal against other threads and processes, e.g. from looking up a key until its transaction is journaled"""
+        with self._exclusive, self._locked():
+            if self.path is not None:
+                self._catch_up()
+            yield
+
+    def pending(self) -> list[JournalEntry]:
+        """Transactions whose receipt was not seen yet"""
+        with self._lock:
+            return [entry for entry in self._entries.values() if not entry.done]
+
+    def sent(
+        self,
+        key: str,
+        tx_hash: str,
+        function: str,
+        fingerprint: str,
+        sender: str | None = None,
+    ) -> JournalEntry:
+        entry = JournalEntry(key, tx_hash, function, fingerprint, sender, time.time())
+        with self._locked():
+            with self._lock:
+                self._entries[key] = entry
+            self._append({"sent": asdict(entry)})
+        self._prune()
+        return entry
+
+    def mined(self, key: str) -> None:
+        with self._locked():
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is None or entry.done:
+                    return
+                entry.done = True
+            self._append({"mined": key})
+
+    def close(self) -> None:
+        with self._file_lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        """Holds the file against other threads and processes, reentrant within a thread"""
+        with self._file_lock:
+            if self.path is not None and self._flock_depth == 0:
+                # flock is per open file, every forked process needs its own
+                if self._lock_pid != os.getpid():
+                    self._lock_file = open(f"{self.path}.lock", "a")
+                    self._lock_pid = os.getpid()
+                fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX)
+                if self._file is not None and self._replaced():
+                    # compacted by another process, appends go to the new file
+                    self._file.close()
+                    self._file = open(self.path, "a", encoding="utf-8")
+                    self._catch_up()
+            self._flock_depth += 1
+            try:
+                yield
+            finally:
+                self._flock_depth -= 1
+                if self.path is not None and self._flock_depth == 0:
+                    fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _replaced(self) -> bool:
+        return os.stat(self.path).st_ino != os.fstat(self._file.fileno()).st_ino
+
+    def _append(self, record: dict) -> None:
+        """Appends a record, the file must be locked"""
+        if self._file is None:
+            return
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def _apply(self, line: bytes) -> None:
+        """Applies a record of the journal, the lock must be held"""
+        try:
+            record = json.loads(line)
+        except ValueError:
+            # a torn last line of a crash while appending
+            return
+        if "sent" in record:
+            entry = JournalEntry(**record["sent"])
+            if (known := self._entries.get(entry.key)) is not None:
+                # a record read again does not undo a later mined record
+                entry.done = entry.done or (
+                    known.done and known.tx_hash == entry.tx_hash
+                )
+            self._entries[entry.key] = entry
+        elif (entry := self._entries.get(record.get("mined"))) is not None:
+            entry.done = True
+
+    def _catch_up(self) -> None:
+        """Applies the records appended by other processes since the last read"""
+        with open(self.path, "rb") as f:
+            inode = os.fstat(f.fileno()).st_ino
+            with self._lock:
+                # a compacted file is read from its start
+                offset = self._offset if inode == self._inode else 0
+            f.seek(offset)
+            data = f.read()
+        complete = data[: data.rfind(b"\n") + 1]
+        with self._lock:
+            for line in complete.splitlines():
+                self._apply(line)
+            self._offset, self._inode = offset + len(complete), inode
+
+    def _prune(self) -> None:
+        """Drops the mined entries older than the retention, at most once per prune_interval"""
+        with self._lock:
+            if time.monotonic() - self._pruned_at < self.prune_interval:
+                return
+            self._pruned_at = time.monotonic()
+        with self._locked():
+            if self.path is not None:
+                self._catch_up()
+            self._drop_expired()
+            if self.path is not None:
+                self._compact()
+
+    def _drop_expired(self) -> None:
+        cutoff = time.time() - self.retention
+        with self._lock:
+            self._entries = {
+                key: entry
+                for key, entry in self._entries.items()
+                if entry.sent_at >= cutoff or not entry.done
+            }
+
+    def _compact(self) -> None:
+        """Rewrites the file to one line per entry, the file must be locked"""
+        compacted = f"{self.path}.tmp"
+        with self._lock:
+            entries = list(self._entries.values())
+        with open(compacted, "w", encoding="utf-8") as f:
+            for entry in entries:
+                f.write(json.dumps({"sent": asdict(entry)}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+            offset = f.tell()
+        os.replace(compacted, self.path)
+        if self._file is not None:
+            self._file.close()
+        self._file = open(self.path, "a", encoding="utf-8")
+        with self._lock:
+            self._offset = offset
+            self._inode = os.fstat(self._file.fileno()).st_ino
+
+    def _load(self) -> None:
+        """Replays the journal and compacts it to the entries within the retention"""
+        with self._locked():
+            if os.path.exists(self.path):
+                with open(self.path, "rb") as f:
+                    for line in f:
+                        self._apply(line)
+            self._drop_expired()
+            self._compact()
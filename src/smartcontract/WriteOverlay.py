@@ -0,0 +1,118 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from typing import Callable
+
+from src.cache.SharedCache import SharedCache
+
+
+@dataclass(frozen=True)
+class OverlayEntry:
+    # block of the last write, reads have to see at least this block
+    block_number: int = 0
+    # the state the write produced, if its event carried it
+    record: dict | None = None
+    # hashes of the transactions sent but not mined yet
+    pending: tuple[str, ...] = ()
+    # the provider was seen at block_number
+    settled: bool = False
+
+
+class WriteOverlay:
+    """
+    Short lived state of the writes of this service by key (artwork, address), so reads
+    right after a write see its result although the provider (or the node of it that
+    answers) has not caught up with the block yet. Entries are settled once the
+    provider was seen at the block of the write and expire after ttl seconds. With a
+    SharedCache the entries are shared by all gunicorn workers.
+    """
+
+    def __init__(
+        self,
+        ttl: float = 60.0,
+        max_size: int = 10_000,
+        shared_cache: SharedCache = None,
+    ):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._shared = shared_cache
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, tuple[OverlayEntry, float]] = OrderedDict()
+
+    def __len__(self) -> int:
+        if self._shared is not None:
+            return len(self._shared)
+        with self._lock:
+            return len(self._entries)
+
+    def get(self, key: str) -> OverlayEntry | None:
+        """The entry of key, None if there is none or the provider caught up with it"""
+        if self._shared is not None:
+            data = self._shared.get(f"overlay:{key}")
+            entry = None if data is None else pickle.loads(data)
+        else:
+            with self._lock:
+                entry, expires_at = self._entries.get(key, (None, 0.0))
+                if expires_at <= time.time():
+                    entry = None
+        if entry is None or (entry.settled and not entry.pending):
+            return None
+        return entry
+
+    def sent(self, key: str, tx_hash: str) -> None:
+        self._update(
+            key, lambda entry: replace(entry, pending=(*entry.pending, tx_hash))
+        )
+
+    def mined(
+        self,
+        key: str,
+        tx_hash: str | None,
+        block_number: int = None,
+        record: dict = None,
+    ) -> None:
+        """Replaces the state of key by the result of a write mined in block_number, later writes win"""
+
+        def apply(entry: OverlayEntry) -> OverlayEntry:
+            entry = replace(
+                entry, pending=tuple(h for h in entry.pending if h != tx_hash)
+            )
+            if block_number is not None and block_number >= entry.block_number:
+                entry = replace(
+                    entry, block_number=block_number, record=record, settled=False
+                )
+            return entry
+
+        self._update(key, apply)
+
+    def caught_up(self, key: str, block_number: int) -> None:
+        """Settles the write of key if the provider was seen at block_number"""
+
+        def apply(entry: OverlayEntry) -> OverlayEntry:
+            if entry.block_number <= block_number:
+                entry = replace(entry, settled=True)
+            return entry
+
+        self._update(key, apply)
+
+    def _update(self, key: str, apply: Callable[[OverlayEntry], OverlayEntry]) -> None:
+        expires_at = time.time() + self.ttl
+        if self._shared is not None:
+            self._shared.update(
+                f"overlay:{key}",
+                lambda data: pickle.dumps(
+                    apply(OverlayEntry() if data is None else pickle.loads(data))
+                ),
+                expires_at,
+            )
+            return
+        with self._lock:
+            entry, stored_expiry = self._entries.get(key, (None, 0.0))
+            if entry is None or stored_expiry <= time.time():
+                entry = OverlayEntry()
+            self._entries[key] = (apply(entry), expires_at)
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
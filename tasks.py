@@ -148,3 +148,27 @@ def system_test(c):  # noqa: ANN001, ANN201
     """Run system tests"""
     with c.prefix(venv):
         c.run("pytest test/test_system.py")
+
+
+@task(pre=[require_venv_test])
+def benchmark(
+    c, concurrency=8, latency=0.0, output="bench_output.json"  # noqa: ANN001
+):  # noqa: ANN201
+    """Run the load test against a local mock ethereum provider"""
+    with c.prefix(venv):
+        c.run(
+            "python -m benchmarks.load "
+            f"--concurrency {concurrency} --latency {latency} --output {output}"
+        )
+
+
+@task(pre=[require_venv_test])
+def benchmark_auth(c, compare=False):  # noqa: ANN001, ANN201
+    """Run the authentication micro-benchmarks, --compare fails on a regression against the last saved run"""
+    compare_param = (
+        " --benchmark-compare --benchmark-compare-fail=mean:20%" if compare else ""
+    )
+    with c.prefix(venv):
+        c.run(
+            f"pytest test/test_benchmark_authenticator.py --benchmark-autosave{compare_param}"
+        )
@@ -12,18 +12,92 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from typing import Callable
+
+from eth_account import Account
+from eth_account.messages import encode_defunct
 import flask
 from flask.testing import FlaskClient
 import pytest
 
-from app import app as flask_app
+from benchmarks.load import eip4361_message
+from benchmarks.mock_chain import ABI_PATH, MockChain, MockProviderServer
+from src.authentication.Authenticator import Authenticator
+from src.smartcontract.ArtworkConnector import ArtworkConnector
 
 
 @pytest.fixture
 def app() -> None:
+    # imported lazily, the app connects to the smartcontract on import
+    from app import app as flask_app
+
     yield flask_app
 
 
 @pytest.fixture
 def client(app: flask.app.Flask) -> FlaskClient:
     return app.test_client()
+
+
+@pytest.fixture(scope="session")
+def authenticator() -> Authenticator:
+    return Authenticator(Account.create().key.hex())
+
+
+@pytest.fixture(scope="session")
+def wallet() -> Account:
+    return Account.create()
+
+
+@pytest.fixture
+def new_login_payload(authenticator: Authenticator, wallet: Account) -> Callable:
+    """creates /auth/login request bodies signed by wallet, each with a fresh nonce"""
+
+    def sign() -> dict:
+        payload = authenticator.generate_client_auth_payload(wallet.address, "11155111")
+        payload = payload["payload"]
+        message = encode_defunct(text=eip4361_message(payload))
+        signature = wallet.sign_message(message).signature.hex()
+        return {"payload": payload, "signature": signature}
+
+    return sign
+
+
+@pytest.fixture
+def login_payload(new_login_payload: Callable) -> dict:
+    return new_login_payload()
+
+
+@pytest.fixture
+def auth_token(authenticator: Authenticator, login_payload: dict) -> str:
+    return authenticator.generate_auth_token("artis-project", login_payload)
+
+
+@pytest.fixture
+def admin() -> Account:
+    return Account.create()
+
+
+@pytest.fixture
+def chain(admin: Account) -> MockChain:
+    return MockChain(admin.address)
+
+
+@pytest.fixture
+def provider(chain: MockChain) -> MockProviderServer:
+    server = MockProviderServer(chain).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def connector(
+    admin: Account,
+    chain: MockChain,
+    provider: MockProviderServer,
+    monkeypatch: pytest.MonkeyPatch,
+) -> ArtworkConnector:
+    """an ArtworkConnector talking to a MockChain"""
+    monkeypatch.setenv("SMARTCONTRACT_ADDRESS", chain.address)
+    monkeypatch.setenv("SMARTCONTRACT_ABI_PATH", ABI_PATH)
+    return ArtworkConnector(admin.key.hex(), provider.url)
@@ -0,0 +1,221 @@
+import json
+import pathlib
+import time
+
+from eth_account import Account
+from eth_account.messages import encode_structured_data
+import pytest
+from werkzeug.exceptions import Unauthorized
+
+from benchmarks.mock_chain import ABI_PATH, MockChain, MockProviderServer
+from src.cache.SharedCache import SharedCache
+from src.models.Artwork import Artwork
+from src.smartcontract.ApprovalAggregator import ApprovalAggregator
+from src.smartcontract.ArtworkConnector import ArtworkConnector
+
+APPROVE_STATUS_CHANGE_ABI = {
+    "type": "function",
+    "name": "approveStatusChange",
+    "stateMutability": "nonpayable",
+    "inputs": [
+        {"name": "artworkId", "type": "uint256", "internalType": "uint256"},
+        {"name": "requestedStatus", "type": "string", "internalType": "string"},
+        {"name": "approvers", "type": "address[]", "internalType": "address[]"},
+        {"name": "signatures", "type": "bytes[]", "internalType": "bytes[]"},
+    ],
+    "outputs": [],
+}
+
+
+@pytest.fixture
+def parties(wallet: Account) -> dict:
+    return {"owner": wallet, "carrier": Account.create(), "recipient": Account.create()}
+
+
+@pytest.fixture
+def artwork_id(connector: ArtworkConnector, parties: dict) -> int:
+    return connector.safeMint(
+        to=parties["owner"].address,
+        data=Artwork.load_from_mint(
+            {
+                "objectId": "obj",
+                "carrier": parties["carrier"].address,
+                "recipient": parties["recipient"].address,
+            }
+        ),
+    )
+
+
+def approve(
+    aggregator: ApprovalAggregator, artwork_id: int, party: Account, status: str
+) -> Artwork | None:
+    deadline = int(time.time()) + 600
+    typed_data = aggregator.typed_data(artwork_id, status, party.address, deadline)
+    signature = Account.sign_message(
+        encode_structured_data(typed_data), party.key
+    ).signature.hex()
+    return aggregator.submit(artwork_id, status, deadline, signature, party.address)
+
+
+def test_approvals_are_submitted_once_complete(
+    connector: ArtworkConnector, chain: MockChain, artwork_id: int, parties: dict
+) -> None:
+    aggregator = ApprovalAggregator(connector)
+    before = chain.rpc_counts.copy()
+    assert approve(aggregator, artwork_id, parties["owner"], "IN_TRANSIT") is None
+    assert approve(aggregator, artwork_id, parties["carrier"], "IN_TRANSIT") is None
+    assert aggregator.pending(artwork_id, parties["recipient"].address) == [
+        {
+            "requestedStatus": "IN_TRANSIT",
+            "approvals": {
+                "owner": parties["owner"].address,
+                "carrier": parties["carrier"].address,
+            },
+        }
+    ]
+    assert (chain.rpc_counts - before)["eth_sendRawTransaction"] == 0
+
+    artwork = approve(aggregator, artwork_id, parties["recipient"], "IN_TRANSIT")
+    assert artwork.status["currentStatus"] == "IN_TRANSIT"
+    assert aggregator.pending(artwork_id, parties["owner"].address) == []
+
+
+def test_approvals_already_given_on_chain_are_not_required(
+    connector: ArtworkConnector, artwork_id: int, parties: dict
+) -> None:
+    connector.updateArtworkData(
+        Artwork.load({"id": artwork_id, "requestedStatus": "IN_TRANSIT"}),
+        parties["owner"].address,
+    )
+    aggregator = ApprovalAggregator(connector)
+    assert approve(aggregator, artwork_id, parties["carrier"], "IN_TRANSIT") is None
+    artwork = approve(aggregator, artwork_id, parties["recipient"], "IN_TRANSIT")
+    assert artwork.status["currentStatus"] == "IN_TRANSIT"
+
+
+def test_approval_of_a_change_approved_on_chain_is_not_submitted(
+    connector: ArtworkConnector,
+    chain: MockChain,
+    artwork_id: int,
+    parties: dict,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    record = dict(
+        connector.getArtworkRecord(artwork_id, parties["owner"].address),
+        requestedStatus="IN_TRANSIT",
+        ownerApproval=True,
+        carrierApproval=True,
+        recipientApproval=True,
+    )
+    monkeypatch.setattr(connector, "getArtworkRecord", lambda *args: record)
+    aggregator = ApprovalAggregator(connector)
+    before = chain.rpc_counts.copy()
+    artwork = approve(aggregator, artwork_id, parties["owner"], "IN_TRANSIT")
+    assert artwork.status["requestedStatus"] == "IN_TRANSIT"
+    assert (chain.rpc_counts - before)["eth_sendRawTransaction"] == 0
+    assert aggregator.pending(artwork_id, parties["owner"].address) == []
+
+
+def test_shared_approvals_complete_across_workers(
+    connector: ArtworkConnector, artwork_id: int, parties: dict
+) -> None:
+    # every worker has its own aggregator over the same shared memory
+    shared = SharedCache(64, value_size=2048)
+    workers = [ApprovalAggregator(connector, shared_cache=shared) for _ in range(3)]
+    assert approve(workers[0], artwork_id, parties["owner"], "IN_TRANSIT") is None
+    assert approve(workers[1], artwork_id, parties["carrier"], "IN_TRANSIT") is None
+    assert [
+        request["approvals"]
+        for request in workers[2].pending(artwork_id, parties["owner"].address)
+    ] == [{"owner": parties["owner"].address, "carrier": parties["carrier"].address}]
+    artwork = approve(workers[2], artwork_id, parties["recipient"], "IN_TRANSIT")
+    assert artwork.status["currentStatus"] == "IN_TRANSIT"
+    assert workers[0].pending(artwork_id, parties["owner"].address) == []
+
+
+class FailingOnce:
+    """Delegates to the connector, the first submission of approvals fails"""
+
+    def __init__(self, connector: ArtworkConnector):
+        self._connector = connector
+        self.failed = False
+
+    def __getattr__(self, name: str):
+        return getattr(self._connector, name)
+
+    def approveStatusChange(self, *args) -> Artwork:
+        if not self.failed:
+            self.failed = True
+            raise ConnectionError("provider down")
+        return self._connector.approveStatusChange(*args)
+
+
+def test_approvals_stay_pending_if_the_submission_fails(
+    connector: ArtworkConnector, artwork_id: int, parties: dict
+) -> None:
+    aggregator = ApprovalAggregator(FailingOnce(connector))
+    for role in ("owner", "carrier"):
+        approve(aggregator, artwork_id, parties[role], "IN_TRANSIT")
+    with pytest.raises(ConnectionError):
+        approve(aggregator, artwork_id, parties["recipient"], "IN_TRANSIT")
+    assert (
+        len(aggregator.pending(artwork_id, parties["owner"].address)[0]["approvals"])
+        == 3
+    )
+    # a retry of the last party submits the approvals signed before
+    artwork = approve(aggregator, artwork_id, parties["recipient"], "IN_TRANSIT")
+    assert artwork.status["currentStatus"] == "IN_TRANSIT"
+
+
+def test_approval_signed_by_someone_else_is_rejected(
+    connector: ArtworkConnector, artwork_id: int, parties: dict
+) -> None:
+    aggregator = ApprovalAggregator(connector)
+    deadline = int(time.time()) + 600
+    typed_data = aggregator.typed_data(
+        artwork_id, "IN_TRANSIT", parties["owner"].address, deadline
+    )
+    signature = Account.sign_message(
+        encode_structured_data(typed_data), parties["carrier"].key
+    ).signature.hex()
+    with pytest.raises(Unauthorized):
+        aggregator.submit(
+            artwork_id, "IN_TRANSIT", deadline, signature, parties["owner"].address
+        )
+
+
+def test_batched_approvals_are_one_transaction(
+    admin: Account,
+    parties: dict,
+    tmp_path: pathlib.Path,
+    request: pytest.FixtureRequest,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    with open(ABI_PATH) as f:
+        abi = json.load(f) + [APPROVE_STATUS_CHANGE_ABI]
+    abi_path = tmp_path / "abi.json"
+    abi_path.write_text(json.dumps(abi))
+    chain = MockChain(admin.address, abi=abi)
+    provider = MockProviderServer(chain).start()
+    request.addfinalizer(provider.stop)
+    monkeypatch.setenv("SMARTCONTRACT_ADDRESS", chain.address)
+    monkeypatch.setenv("SMARTCONTRACT_ABI_PATH", str(abi_path))
+    connector = ArtworkConnector(admin.key.hex(), provider.url)
+    artwork_id = connector.safeMint(
+        to=parties["owner"].address,
+        data=Artwork.load_from_mint(
+            {
+                "objectId": "obj",
+                "carrier": parties["carrier"].address,
+                "recipient": parties["recipient"].address,
+            }
+        ),
+    )
+
+    aggregator = ApprovalAggregator(connector)
+    before = chain.rpc_counts.copy()
+    for role in ("owner", "carrier"):
+        approve(aggregator, artwork_id, parties[role], "IN_TRANSIT")
+    artwork = approve(aggregator, artwork_id, parties["recipient"], "IN_TRANSIT")
+    assert artwork.status["currentStatus"] == "IN_TRANSIT"
+    assert (chain.rpc_counts - before)["eth_sendRawTransaction"] == 1
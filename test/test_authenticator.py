@@ -0,0 +1,201 @@
+import base64
+from dataclasses import replace
+from datetime import datetime
+import json
+import time
+from typing import Callable
+from uuid import uuid4
+
+from eth_account import Account
+import pytest
+from werkzeug.exceptions import Unauthorized
+
+from src.authentication.Authenticator import Authenticator
+from src.authentication.auth_types import LoginPayloadData
+from src.authentication.ExpiringSet import ExpiringSet
+from src.authentication.timestamps import format_timestamp, ISO_FORMAT, parse_timestamp
+
+DOMAIN = "artis-project"
+
+
+def _with_claims(token: str, **claims) -> str:
+    header, payload, signature = token.split(".")
+    data = json.loads(base64.b64decode(payload)) | claims
+    encoded = base64.b64encode(json.dumps(data, separators=(",", ":")).encode())
+    return f"{header}.{encoded.decode()}.{signature}"
+
+
+def _unsigned(**claims) -> str:
+    """a token with well formed claims, updated by claims, and no valid signature"""
+    data = {
+        "iss": "0x" + "11" * 20,
+        "sub": "0x" + "22" * 20,
+        "aud": DOMAIN,
+        "exp": int(time.time()) + 60,
+        "nbf": 0,
+        "iat": 0,
+        "jti": "id",
+    }
+    encoded = base64.b64encode(json.dumps(data | claims).encode()).decode()
+    return f"a.{encoded}.{base64.b64encode(b'0x00').decode()}"
+
+
+def test_authenticate(
+    authenticator: Authenticator, auth_token: str, login_payload: dict
+) -> None:
+    address = login_payload["payload"]["address"]
+    assert authenticator.authenticate(DOMAIN, f"Bearer {auth_token}") == address
+    # served from the signature cache the second time
+    assert authenticator.authenticate(DOMAIN, auth_token) == address
+
+
+@pytest.mark.parametrize(
+    "token",
+    [
+        None,
+        "abc",
+        "a.b",
+        "a.b.c",
+        "a.e30=.c",
+        _unsigned(iss=1),
+        _unsigned(sub=["0x"]),
+        _unsigned(aud=None),
+        _unsigned(jti={}),
+        _unsigned(nbf="0"),
+        _unsigned(exp=None),
+        _unsigned(iat=True),
+    ],
+)
+def test_authenticate_malformed(authenticator: Authenticator, token: str) -> None:
+    with pytest.raises(Unauthorized):
+        authenticator.authenticate(DOMAIN, token)
+
+
+def test_authenticate_tampered(authenticator: Authenticator, auth_token: str) -> None:
+    authenticator.authenticate(DOMAIN, auth_token)
+    tampered = _with_claims(auth_token, sub="0x" + "11" * 20)
+    with pytest.raises(Unauthorized, match="did not sign"):
+        authenticator.authenticate(DOMAIN, tampered)
+
+
+def test_authenticate_expired(authenticator: Authenticator, auth_token: str) -> None:
+    with pytest.raises(Unauthorized, match="expired"):
+        authenticator.authenticate(DOMAIN, _with_claims(auth_token, exp=0))
+
+
+def test_authenticate_wrong_domain(
+    authenticator: Authenticator, auth_token: str
+) -> None:
+    with pytest.raises(Unauthorized, match="domain"):
+        authenticator.authenticate("other-domain", auth_token)
+
+
+def test_authenticate_other_issuer(
+    authenticator: Authenticator, auth_token: str
+) -> None:
+    other = Authenticator("0x" + "22" * 32)
+    with pytest.raises(Unauthorized, match="issuer"):
+        other.authenticate(DOMAIN, auth_token)
+
+
+def test_logout_revokes_token(
+    authenticator: Authenticator, auth_token: str, new_login_payload: Callable
+) -> None:
+    other_token = authenticator.generate_auth_token(DOMAIN, new_login_payload())
+    authenticator.authenticate(DOMAIN, auth_token)
+    authenticator.logout(DOMAIN, f"Bearer {auth_token}")
+    with pytest.raises(Unauthorized, match="revoked"):
+        authenticator.authenticate(DOMAIN, auth_token)
+    assert authenticator.user(DOMAIN, auth_token) == "null"
+    authenticator.authenticate(DOMAIN, other_token)
+    # revoking again or revoking garbage is a no-op
+    authenticator.logout(DOMAIN, auth_token)
+    authenticator.logout(DOMAIN, None)
+
+
+def test_logout_only_revokes_issued_tokens(auth_token: str) -> None:
+    revoked = ExpiringSet()
+    issuer = Authenticator("0x" + "22" * 32)
+    issuer.token_verifier._revoked = revoked
+    issuer.logout(DOMAIN, auth_token)
+    assert len(revoked) == 0
+
+
+def test_login_replay(authenticator: Authenticator, login_payload: dict) -> None:
+    authenticator.generate_auth_token(DOMAIN, login_payload)
+    with pytest.raises(Unauthorized, match="already been used"):
+        authenticator.generate_auth_token(DOMAIN, login_payload)
+
+
+def test_login_foreign_nonce(authenticator: Authenticator, wallet: Account) -> None:
+    payload = authenticator.generate_client_auth_payload(wallet.address, "1")
+    other = Authenticator("0x" + "22" * 32).nonces.issue(wallet.address)
+    with pytest.raises(Unauthorized, match="not issued"):
+        authenticator.nonces.check(other, wallet.address)
+    with pytest.raises(Unauthorized, match="not issued"):
+        authenticator.nonces.check(payload["payload"]["nonce"], "0x" + "33" * 20)
+    with pytest.raises(Unauthorized, match="invalid nonce"):
+        authenticator.nonces.check(str(uuid4()), wallet.address)
+
+
+def test_expiring_set() -> None:
+    seen = ExpiringSet(granularity=1, max_size=2)
+    assert seen.add("a", time.time() + 60)
+    assert not seen.add("a", time.time() + 60)
+    assert "a" in seen
+    assert seen.add("b", time.time() - 1)
+    assert "b" not in seen
+    seen.add("c", time.time() + 60)
+    with pytest.raises(OverflowError):
+        seen.add("d", time.time() + 60)
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        "2023-06-01T12:30:45+0200",
+        "2023-12-31T23:59:59-0530",
+        "2024-02-29T00:00:00+0000",
+        "2023-06-01T12:30:45Z",
+        "2023-06-01T12:30:45+02:00",
+    ],
+)
+def test_parse_timestamp(value: str) -> None:
+    expected = datetime.strptime(value, ISO_FORMAT)
+    parsed = parse_timestamp(value)
+    assert parsed == expected
+    assert parsed.utcoffset() == expected.utcoffset()
+    assert format_timestamp(parsed) == expected.strftime(ISO_FORMAT)
+
+
+@pytest.mark.parametrize(
+    "value",
+    ["", "2023-06-01 12:30:45+0200", "2023-13-01T12:30:45+0200", "2023-06-01T12:30:45"],
+)
+def test_parse_timestamp_invalid(value: str) -> None:
+    with pytest.raises(ValueError):
+        datetime.strptime(value, ISO_FORMAT)
+    with pytest.raises(ValueError):
+        parse_timestamp(value)
+
+
+def test_format_timestamp(authenticator: Authenticator) -> None:
+    now = datetime.now(authenticator.timezone)
+    assert format_timestamp(now) == now.strftime(ISO_FORMAT)
+
+
+class StrftimeAuthenticator(Authenticator):
+    def _format_time(self, value: datetime) -> str:
+        return value.strftime(self.timeformat)
+
+
+def test_generate_message_matches_strftime(
+    authenticator: Authenticator, login_payload: dict
+) -> None:
+    data = LoginPayloadData.from_json(login_payload["payload"], ISO_FORMAT)
+    reformatted = replace(data, issued_at_text=None, expiration_time_text=None)
+    expected = StrftimeAuthenticator(authenticator._signing_key)._generate_message(
+        reformatted
+    )
+    assert authenticator._generate_message(data) == expected
+    assert authenticator._generate_message(reformatted) == expected
@@ -0,0 +1,170 @@
+"""
+Micro-benchmarks for the per request authentication cost.
+
+Each benchmark fails when its mean exceeds the budget (in microseconds) multiplied by
+AUTH_BENCHMARK_TOLERANCE. The budgets leave generous headroom over a development
+machine so only real regressions trip them, regressions relative to a previous run
+are tracked with pytest-benchmark itself, see `invoke benchmark-auth`.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+import time
+from typing import Callable
+
+import pytest
+from pytest_benchmark.fixture import BenchmarkFixture
+
+from src.authentication.Authenticator import Authenticator
+from src.authentication.auth_types import LoginPayload, LoginPayloadData
+
+TOLERANCE = float(os.environ.get("AUTH_BENCHMARK_TOLERANCE", "1.0"))
+DOMAIN = "artis-project"
+
+
+def assert_within_budget(benchmark: BenchmarkFixture, budget_us: float) -> None:
+    # stats are not collected when running with --benchmark-disable
+    if benchmark.stats is None:
+        return
+    mean_us = benchmark.stats.stats.mean * 1e6
+    assert (
+        mean_us <= budget_us * TOLERANCE
+    ), f"mean {mean_us:.1f}us exceeds budget {budget_us * TOLERANCE:.1f}us"
+
+
+def test_generate_message(
+    benchmark: BenchmarkFixture, authenticator: Authenticator, login_payload: dict
+) -> None:
+    data = LoginPayloadData.from_json(
+        login_payload["payload"], authenticator.timeformat
+    )
+    benchmark(authenticator._generate_message, data)
+    assert_within_budget(benchmark, 10)
+
+
+def test_login_payload_from_json(
+    benchmark: BenchmarkFixture, authenticator: Authenticator, login_payload: dict
+) -> None:
+    benchmark(LoginPayload.from_json, login_payload, authenticator.timeformat)
+    assert_within_budget(benchmark, 30)
+
+
+def test_stringify(
+    benchmark: BenchmarkFixture, authenticator: Authenticator, auth_token: str
+) -> None:
+    payload = json.loads(authenticator._base64decode(auth_token.split(".")[1]))
+    benchmark(authenticator._stringify, payload)
+    assert_within_budget(benchmark, 50)
+
+
+def test_base64_round_trip(
+    benchmark: BenchmarkFixture, authenticator: Authenticator, auth_token: str
+) -> None:
+    payload = authenticator._base64decode(auth_token.split(".")[1])
+    round_trip = lambda: authenticator._base64decode(
+        authenticator._base64encode(payload)
+    )
+    assert benchmark(round_trip) == payload
+    assert_within_budget(benchmark, 20)
+
+
+def test_sign_message(
+    benchmark: BenchmarkFixture, authenticator: Authenticator
+) -> None:
+    benchmark(authenticator._sign_message, '{"iss":"0x0","sub":"0x0"}')
+    assert_within_budget(benchmark, 20_000)
+
+
+def test_recover_address(
+    benchmark: BenchmarkFixture, authenticator: Authenticator
+) -> None:
+    message = '{"iss":"0x0","sub":"0x0"}'
+    signature = authenticator._sign_message(message)
+    address = benchmark(authenticator._recover_address, message, signature)
+    assert address == authenticator.signing_account.address
+    assert_within_budget(benchmark, 25_000)
+
+
+def test_verify(
+    benchmark: BenchmarkFixture,
+    authenticator: Authenticator,
+    new_login_payload: Callable,
+) -> None:
+    # every login consumes its nonce, so each round gets a freshly signed payload
+    setup = lambda: (
+        (DOMAIN, LoginPayload.from_json(new_login_payload(), authenticator.timeformat)),
+        {},
+    )
+    benchmark.pedantic(authenticator.verify, setup=setup, rounds=50)
+    assert_within_budget(benchmark, 25_000)
+
+
+def test_generate_auth_token(
+    benchmark: BenchmarkFixture,
+    authenticator: Authenticator,
+    new_login_payload: Callable,
+) -> None:
+    setup = lambda: ((DOMAIN, new_login_payload()), {})
+    benchmark.pedantic(authenticator.generate_auth_token, setup=setup, rounds=50)
+    assert_within_budget(benchmark, 40_000)
+
+
+def test_authenticate(
+    benchmark: BenchmarkFixture,
+    authenticator: Authenticator,
+    auth_token: str,
+    login_payload: dict,
+) -> None:
+    """repeated requests with the same token, served from the signature cache"""
+    address = benchmark(authenticator.authenticate, DOMAIN, f"Bearer {auth_token}")
+    assert address == login_payload["payload"]["address"]
+    assert_within_budget(benchmark, 100)
+
+
+def test_authenticate_with_revocations(
+    benchmark: BenchmarkFixture, authenticator: Authenticator, login_payload: dict
+) -> None:
+    """repeated requests with the same token while many other tokens are revoked"""
+    revoking = Authenticator(authenticator._signing_key)
+    token = f"Bearer {revoking.generate_auth_token(DOMAIN, login_payload)}"
+    for jti in range(50_000):
+        revoking.token_verifier._revoked.add(str(jti), time.time() + 3600)
+    address = benchmark(revoking.authenticate, DOMAIN, token)
+    assert address == login_payload["payload"]["address"]
+    assert_within_budget(benchmark, 100)
+
+
+def test_authenticate_uncached(
+    benchmark: BenchmarkFixture, authenticator: Authenticator, login_payload: dict
+) -> None:
+    """first request with a token, pays for the signature recovery"""
+    uncached = Authenticator(authenticator._signing_key, token_cache_size=0)
+    token = f"Bearer {uncached.generate_auth_token(DOMAIN, login_payload)}"
+    address = benchmark(uncached.authenticate, DOMAIN, token)
+    assert address == login_payload["payload"]["address"]
+    assert_within_budget(benchmark, 25_000)
+
+
+@pytest.mark.parametrize("threads", [1, 8])
+def test_authenticate_throughput(
+    benchmark: BenchmarkFixture,
+    authenticator: Authenticator,
+    auth_token: str,
+    threads: int,
+) -> None:
+    """authentications per second with gunicorn's 8 request threads contending"""
+    calls = 1000
+    token = f"Bearer {auth_token}"
+
+    def run() -> float:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            for _ in pool.map(
+                lambda _: authenticator.authenticate(DOMAIN, token), range(calls)
+            ):
+                pass
+        return calls / (time.perf_counter() - start)
+
+    per_second = benchmark.pedantic(run, rounds=3, iterations=1)
+    benchmark.extra_info["authentications_per_second"] = round(per_second, 1)
+    assert per_second >= 2_000 / TOLERANCE
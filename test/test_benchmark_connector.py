@@ -0,0 +1,71 @@
+"""
+Micro-benchmarks for the client side cpu cost of a contract read, the provider answers
+in process so only encoding, middlewares and decoding are measured.
+"""
+from eth_account import Account
+import pytest
+from pytest_benchmark.fixture import BenchmarkFixture
+
+from benchmarks.mock_chain import InProcessProvider, MockChain
+from src.models.Artwork import Artwork
+from src.smartcontract.ArtworkConnector import ArtworkConnector
+
+
+@pytest.fixture
+def in_process(connector: ArtworkConnector, chain: MockChain) -> ArtworkConnector:
+    connector._w3.provider = InProcessProvider(chain)
+    return connector
+
+
+@pytest.fixture
+def token_id(in_process: ArtworkConnector, wallet: Account) -> int:
+    return in_process.safeMint(
+        to=wallet.address, data=Artwork.load_from_mint({"objectId": "obj"})
+    )
+
+
+@pytest.mark.benchmark(group="getArtworkData")
+def test_web3_contract_function(
+    benchmark: BenchmarkFixture,
+    in_process: ArtworkConnector,
+    token_id: int,
+    wallet: Account,
+) -> None:
+    call = (
+        lambda: in_process._contract.functions.getArtworkData(token_id, wallet.address)
+        .call()
+        ._asdict()
+    )
+    assert benchmark(call)["objectId"] == "obj"
+
+
+@pytest.mark.benchmark(group="getArtworkData")
+def test_precompiled_function(
+    benchmark: BenchmarkFixture,
+    in_process: ArtworkConnector,
+    token_id: int,
+    wallet: Account,
+) -> None:
+    call = lambda: in_process._rawCall(
+        "getArtworkData", (token_id, wallet.address), "latest"
+    )
+    assert benchmark(call)["objectId"] == "obj"
+
+
+@pytest.mark.benchmark(group="encode/decode")
+def test_precompiled_encode_decode(
+    benchmark: BenchmarkFixture,
+    in_process: ArtworkConnector,
+    token_id: int,
+    wallet: Account,
+) -> None:
+    function = in_process._functions["getArtworkData"]
+    data = in_process._w3.eth.call(
+        {"to": in_process.address, "data": function.encode(token_id, wallet.address)}
+    )
+
+    def round_trip() -> dict:
+        function.encode(token_id, wallet.address)
+        return function.decode(data)
+
+    assert benchmark(round_trip)["objectId"] == "obj"
@@ -0,0 +1,80 @@
+import gzip
+
+from flask import Flask
+import msgpack
+import pytest
+
+from utils.compression import register_compression
+from utils.conditional import conditional, etag
+from utils.serialization import OrjsonProvider
+
+RECORDS = {"artworks": [{"id": i, "objectId": f"object-{i}"} for i in range(200)]}
+
+
+@pytest.fixture
+def conditional_app() -> Flask:
+    app = Flask(__name__)
+    app.json = OrjsonProvider(app)
+    app.json.sort_keys = False
+    register_compression(app)
+    app.builds = 0
+
+    @app.get("/record")
+    def record() -> dict:
+        def build() -> dict:
+            app.builds += 1
+            return {"id": 1}
+
+        return conditional({"id": 1}, build)
+
+    @app.get("/records")
+    def records() -> dict:
+        return conditional(RECORDS, lambda: RECORDS)
+
+    return app
+
+
+def test_conditional_get(conditional_app: Flask) -> None:
+    client = conditional_app.test_client()
+    first = client.get("/record")
+    assert first.status_code == 200
+    assert first.json == {"id": 1}
+    assert first.headers["ETag"] == f'"{etag({"id": 1}, "application/json")}"'
+    assert first.headers["Cache-Control"] == "private, no-cache"
+
+    second = client.get("/record", headers={"If-None-Match": first.headers["ETag"]})
+    assert second.status_code == 304
+    assert second.data == b""
+    assert second.headers["ETag"] == first.headers["ETag"]
+    assert conditional_app.builds == 1
+
+    stale = client.get("/record", headers={"If-None-Match": '"outdated"'})
+    assert stale.status_code == 200
+    assert conditional_app.builds == 2
+
+
+def test_msgpack_negotiation(conditional_app: Flask) -> None:
+    client = conditional_app.test_client()
+    response = client.get("/records", headers={"Accept": "application/msgpack"})
+    assert response.mimetype == "application/msgpack"
+    assert msgpack.unpackb(response.data) == RECORDS
+    as_json = client.get("/records", headers={"Accept": "application/json"})
+    assert as_json.json == RECORDS
+    assert as_json.headers["ETag"] != response.headers["ETag"]
+
+
+def test_compression(conditional_app: Flask) -> None:
+    client = conditional_app.test_client()
+    response = client.get("/records", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["ETag"].endswith('-gzip"')
+    assert client.application.json.loads(gzip.decompress(response.data)) == RECORDS
+
+    revalidated = client.get(
+        "/records",
+        headers={"Accept-Encoding": "gzip", "If-None-Match": response.headers["ETag"]},
+    )
+    assert revalidated.status_code == 304
+
+    small = client.get("/record", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in small.headers
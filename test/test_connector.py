@@ -0,0 +1,298 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+
+from eth_account import Account
+import pytest
+from web3.exceptions import ContractLogicError, TimeExhausted
+from werkzeug.exceptions import ServiceUnavailable
+
+from benchmarks.mock_chain import ABI_PATH, MockChain, MockProviderServer, Revert
+from src.models.Artwork import Artwork
+from src.smartcontract.ArtworkConnector import ArtworkConnector
+from src.smartcontract.BoundedExecutor import BoundedExecutor
+from src.smartcontract.CircuitBreaker import CircuitBreaker, CircuitOpen
+from src.smartcontract.SingleFlight import SingleFlight
+
+
+def test_mint_update_read(connector: ArtworkConnector, wallet: Account) -> None:
+    token_id = connector.safeMint(
+        to=wallet.address, data=Artwork.load_from_mint({"objectId": "obj"})
+    )
+    artwork = connector.getArtworkData(token_id, wallet.address)
+    assert artwork.owner == wallet.address
+    assert artwork.objectId == "obj"
+
+    update = Artwork.load({"id": token_id, "objectId": "renamed"})
+    assert connector.updateArtworkData(update, wallet.address).objectId == "renamed"
+    assert connector.getArtworkIdsByAddress(wallet.address)["owner"] == [token_id]
+
+
+def test_read_unauthorized(connector: ArtworkConnector, wallet: Account) -> None:
+    token_id = connector.safeMint(
+        to=wallet.address, data=Artwork.load_from_mint({"objectId": "obj"})
+    )
+    with pytest.raises(ContractLogicError, match="403"):
+        connector.getArtworkData(token_id, Account.create().address)
+
+
+def test_single_flight_coalesces() -> None:
+    flight = SingleFlight()
+    calls = []
+    release = threading.Event()
+
+    def slow() -> int:
+        calls.append(1)
+        release.wait(5)
+        return 42
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        futures = [pool.submit(flight.do, "key", slow) for _ in range(8)]
+        while flight.in_flight() == 0:
+            time.sleep(0.001)
+        time.sleep(0.05)
+        release.set()
+        assert [f.result() for f in futures] == [42] * 8
+    assert len(calls) == 1
+    assert flight.in_flight() == 0
+
+
+def test_single_flight_propagates_errors() -> None:
+    flight = SingleFlight()
+
+    def failing() -> None:
+        time.sleep(0.05)
+        raise ValueError("boom")
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        futures = [pool.submit(flight.do, "key", failing) for _ in range(4)]
+        for future in futures:
+            with pytest.raises(ValueError, match="boom"):
+                future.result()
+    # errors are not cached, the next call runs again
+    assert flight.do("key", lambda: 1) == 1
+
+
+def test_coalesced_reads_share_one_rpc(
+    connector: ArtworkConnector,
+    chain: MockChain,
+    provider: MockProviderServer,
+    wallet: Account,
+) -> None:
+    token_id = connector.safeMint(
+        to=wallet.address, data=Artwork.load_from_mint({"objectId": "obj"})
+    )
+    # the first read after the write is pinned to the block the provider is at
+    connector.getArtworkData(token_id, wallet.address)
+    provider.latency = 0.2
+    before = chain.rpc_counts["eth_call"]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        artworks = list(
+            pool.map(
+                lambda _: connector.getArtworkData(token_id, wallet.address), range(8)
+            )
+        )
+    assert all(a.objectId == "obj" for a in artworks)
+    assert len({id(a) for a in artworks}) == 8
+    assert chain.rpc_counts["eth_call"] - before == 1
+
+
+def test_precompiled_matches_web3(connector: ArtworkConnector, wallet: Account) -> None:
+    token_id = connector.safeMint(
+        to=wallet.address, data=Artwork.load_from_mint({"objectId": "obj"})
+    )
+    for name, args in [
+        ("getArtworkData", (token_id, wallet.address)),
+        ("getArtworkIdsByAddress", (wallet.address,)),
+        ("smartcontractAdmin", ()),
+    ]:
+        expected = connector._contract.functions[name](*args).call()
+        if hasattr(expected, "_asdict"):
+            expected = expected._asdict()
+        assert connector._rawCall(name, args, "latest") == expected
+
+
+def test_simulated_write_fails_before_broadcast(
+    connector: ArtworkConnector,
+    chain: MockChain,
+    provider: MockProviderServer,
+    wallet: Account,
+) -> None:
+    outsider = ArtworkConnector(
+        Account.create().key.hex(), provider.url, simulate_writes=True
+    )
+    before = chain.rpc_counts.copy()
+    with pytest.raises(ContractLogicError, match="403"):
+        outsider.safeMint(
+            to=wallet.address, data=Artwork.load_from_mint({"objectId": "obj"})
+        )
+    calls = chain.rpc_counts - before
+    assert calls["eth_estimateGas"] == 1
+    assert calls["eth_getTransactionCount"] == calls["eth_sendRawTransaction"] == 0
+
+
+def test_write_reverted_when_mined_is_a_contract_error(
+    connector: ArtworkConnector,
+    chain: MockChain,
+    wallet: Account,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    execute = chain._execute
+
+    def revert_when_mined(name: str, args: dict, sender: str, dry_run: bool):
+        if not dry_run:
+            raise Revert("state changed since the estimate")
+        return execute(name, args, sender, dry_run)
+
+    monkeypatch.setattr(chain, "_execute", revert_when_mined)
+    with pytest.raises(ContractLogicError, match="reverted 409"):
+        connector.safeMint(
+            to=wallet.address, data=Artwork.load_from_mint({"objectId": "obj"})
+        )
+
+
+def test_simulated_write_reuses_gas(
+    admin: Account,
+    connector: ArtworkConnector,
+    chain: MockChain,
+    provider: MockProviderServer,
+    wallet: Account,
+) -> None:
+    simulating = ArtworkConnector(admin.key.hex(), provider.url, simulate_writes=True)
+    before = chain.rpc_counts.copy()
+    token_id = simulating.safeMint(
+        to=wallet.address, data=Artwork.load_from_mint({"objectId": "obj"})
+    )
+    assert simulating.getArtworkData(token_id, wallet.address).objectId == "obj"
+    calls = chain.rpc_counts - before
+    assert calls["eth_estimateGas"] == 1
+    assert calls["eth_sendRawTransaction"] == 1
+
+
+def test_bounded_executor_sheds_load() -> None:
+    executor = BoundedExecutor("test", max_workers=1, max_queue=1, retry_after=2)
+    release = threading.Event()
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        futures = [pool.submit(executor.run, release.wait, 5) for _ in range(2)]
+        while executor.metrics()["queued"] < 1 or executor.metrics()["active"] < 1:
+            time.sleep(0.001)
+        with pytest.raises(ServiceUnavailable) as error:
+            executor.run(lambda: None)
+        assert error.value.retry_after == 2
+        assert executor.metrics()["queued"] == 1
+        release.set()
+        assert [f.result() for f in futures] == [True, True]
+    metrics = executor.metrics()
+    assert (metrics["completed"], metrics["rejected"], metrics["active"]) == (2, 1, 0)
+
+
+def test_reads_are_not_starved_by_writes(
+    admin: Account, wallet: Account, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    chain = MockChain(admin.address, block_time=0.5)
+    provider = MockProviderServer(chain).start()
+    monkeypatch.setenv("SMARTCONTRACT_ADDRESS", chain.address)
+    monkeypatch.setenv("SMARTCONTRACT_ABI_PATH", ABI_PATH)
+    connector = ArtworkConnector(
+        admin.key.hex(), provider.url, write_workers=1, write_queue=1
+    )
+    mint = lambda: connector.safeMint(
+        to=wallet.address, data=Artwork.load_from_mint({"objectId": "obj"})
+    )
+    try:
+        token_id = mint()
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            writes = [pool.submit(mint) for _ in range(2)]
+            while connector.poolMetrics()["writes"]["queued"] < 1:
+                time.sleep(0.001)
+            with pytest.raises(ServiceUnavailable):
+                mint()
+            assert connector.getArtworkData(token_id, wallet.address).objectId == "obj"
+            assert not any(w.done() for w in writes)
+            assert {w.result() for w in writes} == {token_id + 1, token_id + 2}
+        assert connector.poolMetrics()["writes"]["rejected"] == 1
+    finally:
+        provider.stop()
+
+
+def test_circuit_breaker_opens_and_probes() -> None:
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=0.05)
+
+    def failing() -> None:
+        raise ConnectionError("provider down")
+
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            breaker.call(failing)
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpen) as error:
+        breaker.call(lambda: 1)
+    assert error.value.retry_after == 1
+
+    time.sleep(0.05)
+    assert breaker.state == "half_open"
+    with pytest.raises(ConnectionError):
+        breaker.call(failing)
+    # a failed probe opens the circuit again
+    assert breaker.state == "open"
+    time.sleep(0.05)
+    assert breaker.call(lambda: 1) == 1
+    assert breaker.state == "closed"
+
+
+def test_circuit_breaker_ignores_reverts() -> None:
+    breaker = CircuitBreaker(failure_threshold=1)
+    with pytest.raises(ContractLogicError):
+        breaker.call(lambda: (_ for _ in ()).throw(ContractLogicError("403")))
+    assert breaker.state == "closed"
+
+
+def test_circuit_breaker_ignores_receipt_timeouts() -> None:
+    breaker = CircuitBreaker(failure_threshold=1)
+    for _ in range(3):
+        with pytest.raises(TimeExhausted):
+            breaker.call(lambda: (_ for _ in ()).throw(TimeExhausted("not mined")))
+    assert breaker.state == "closed"
+
+
+def test_circuit_breaker_ignores_unavailable_budget() -> None:
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=0.05)
+
+    def exhausted() -> None:
+        raise ServiceUnavailable("provider call budget exhausted")
+
+    with pytest.raises(ConnectionError):
+        breaker.call(lambda: (_ for _ in ()).throw(ConnectionError("provider down")))
+    with pytest.raises(ServiceUnavailable):
+        breaker.call(exhausted)
+    # the failure count was not reset, the next failure opens the circuit
+    with pytest.raises(ConnectionError):
+        breaker.call(lambda: (_ for _ in ()).throw(ConnectionError("provider down")))
+    assert breaker.state == "open"
+
+    time.sleep(0.05)
+    with pytest.raises(ServiceUnavailable):
+        breaker.call(exhausted)
+    # the probe did not close the circuit and the next call may probe
+    assert breaker.state == "half_open"
+    assert breaker.call(lambda: 1) == 1
+    assert breaker.state == "closed"
+
+
+def test_last_known_data_is_served_while_provider_is_down(
+    connector: ArtworkConnector, provider: MockProviderServer, wallet: Account
+) -> None:
+    token_id = connector.safeMint(
+        to=wallet.address, data=Artwork.load_from_mint({"objectId": "obj"})
+    )
+    assert connector.getArtworkData(token_id, wallet.address).objectId == "obj"
+    assert connector.staleSince() is None
+    provider.stop()
+
+    for _ in range(6):
+        assert connector.getArtworkData(token_id, wallet.address).objectId == "obj"
+    assert connector.staleSince() <= time.time()
+    assert connector.providerState == "open"
+    # nothing is known about other artworks
+    with pytest.raises(CircuitOpen):
+        connector.getArtworkData(token_id + 1, wallet.address)
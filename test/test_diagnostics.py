@@ -0,0 +1,134 @@
+import threading
+
+from eth_account import Account
+from eth_account.messages import encode_defunct
+from flask import Flask
+from flask.testing import FlaskClient
+import pytest
+
+from benchmarks.load import eip4361_message
+from benchmarks.mock_chain import ABI_PATH, MockChain, MockProviderServer
+from src.authentication.Authenticator import Authenticator
+from src.cache.SharedCache import SharedCache
+from src.models.Artwork import Artwork
+from src.smartcontract.ArtworkConnector import ArtworkConnector
+from utils.diagnostics import register_diagnostics
+from utils.error_handlers import register_error_handlers
+
+
+def _token(authenticator: Authenticator, account: Account) -> dict:
+    payload = authenticator.generate_client_auth_payload(account.address, "11155111")
+    payload = payload["payload"]
+    message = encode_defunct(text=eip4361_message(payload))
+    signature = account.sign_message(message).signature.hex()
+    token = authenticator.generate_auth_token(
+        "artis-project", {"payload": payload, "signature": signature}
+    )
+    return {"Authorization": token}
+
+
+@pytest.fixture
+def admin_headers(authenticator: Authenticator) -> dict:
+    return _token(authenticator, authenticator.signing_account)
+
+
+@pytest.fixture
+def debug_client(authenticator: Authenticator) -> FlaskClient:
+    app = Flask(__name__)
+    register_error_handlers(app)
+    register_diagnostics(app, authenticator, lambda: {"cache": 3})
+    return app.test_client()
+
+
+def busy_loop(stop: threading.Event) -> None:
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_diagnostics_admit_only_the_admin(
+    authenticator: Authenticator, wallet: Account, debug_client: FlaskClient
+) -> None:
+    assert debug_client.get("/debug/stats").status_code == 401
+    headers = _token(authenticator, wallet)
+    assert debug_client.get("/debug/stats", headers=headers).status_code == 403
+
+
+def test_profile_samples_request_threads(
+    debug_client: FlaskClient, admin_headers: dict
+) -> None:
+    stop = threading.Event()
+    worker = threading.Thread(target=busy_loop, args=(stop,), name="worker")
+    worker.start()
+    try:
+        response = debug_client.get(
+            "/debug/profile?seconds=0.2&interval=0.005", headers=admin_headers
+        )
+    finally:
+        stop.set()
+        worker.join()
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    stacks = [line.rsplit(" ", 1) for line in response.text.splitlines()]
+    busy = [int(count) for stack, count in stacks if "busy_loop" in stack]
+    assert busy and all(
+        stack.startswith("worker;") for stack, _ in stacks if "busy_loop" in stack
+    )
+    assert sum(busy) > 5
+
+
+def test_memory_snapshots_are_diffed(
+    debug_client: FlaskClient, admin_headers: dict
+) -> None:
+    assert debug_client.get("/debug/memory", headers=admin_headers).status_code == 409
+    assert (
+        debug_client.post("/debug/memory/start", headers=admin_headers).status_code
+        == 204
+    )
+    try:
+        first = debug_client.get("/debug/memory", headers=admin_headers).json
+        assert "diff" not in first
+        retained = [bytearray(1024) for _ in range(1000)]
+        second = debug_client.get("/debug/memory", headers=admin_headers).json
+        assert second["current_bytes"] > first["current_bytes"]
+        grown = second["diff"][0]
+        assert "test_diagnostics.py" in grown["line"] and grown["bytes"] > 1000 * 1024
+        del retained
+    finally:
+        debug_client.post("/debug/memory/stop", headers=admin_headers)
+
+
+def test_memory_tracing_needs_a_frame(
+    debug_client: FlaskClient, admin_headers: dict
+) -> None:
+    response = debug_client.post("/debug/memory/start?frames=0", headers=admin_headers)
+    assert response.status_code == 400
+    assert debug_client.get("/debug/memory", headers=admin_headers).status_code == 409
+
+
+def test_stats_report_gc_and_caches(
+    debug_client: FlaskClient, admin_headers: dict
+) -> None:
+    stats = debug_client.get("/debug/stats", headers=admin_headers).json
+    assert stats["caches"] == {"cache": 3}
+    assert len(stats["gc"]["generations"]) == 3
+    assert stats["gc"]["threads"] >= 1
+
+
+def test_shared_connector_table_is_counted_once(
+    admin: Account,
+    chain: MockChain,
+    provider: MockProviderServer,
+    wallet: Account,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setenv("SMARTCONTRACT_ADDRESS", chain.address)
+    monkeypatch.setenv("SMARTCONTRACT_ABI_PATH", ABI_PATH)
+    shared = SharedCache(1024, value_size=1024)
+    connector = ArtworkConnector(admin.key.hex(), provider.url, shared_cache=shared)
+    token_id = connector.safeMint(
+        to=wallet.address, data=Artwork.load_from_mint({"objectId": "obj"})
+    )
+    connector.getArtworkData(token_id, wallet.address)
+    sizes = connector.cacheSizes()
+    assert sizes["shared_contract_cache"] == len(shared) > 0
+    assert "last_known" not in sizes and "write_overlay" not in sizes
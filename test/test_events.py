@@ -0,0 +1,164 @@
+import json
+import time
+
+from eth_account import Account
+import pytest
+from structlog.testing import capture_logs
+from werkzeug.exceptions import BadRequest, ServiceUnavailable
+
+from benchmarks.mock_chain import MockChain
+from src.models.Artwork import Artwork
+from src.smartcontract.ArtworkConnector import ArtworkConnector
+from src.smartcontract.EventStream import EventStream
+
+
+def mint_and_update(connector: ArtworkConnector, owner: str) -> int:
+    token_id = connector.safeMint(
+        to=owner, data=Artwork.load_from_mint({"objectId": "obj"})
+    )
+    connector.updateArtworkData(
+        Artwork.load({"id": token_id, "objectId": "renamed"}), owner
+    )
+    return token_id
+
+
+def next_event(stream) -> dict:
+    """The next event of an sse stream, skipping keep-alives"""
+    while True:
+        message = next(stream)
+        if message.startswith("id: "):
+            fields = dict(line.split(": ", 1) for line in message.strip().split("\n"))
+            return {"id": fields["id"], **json.loads(fields["data"])}
+
+
+@pytest.fixture
+def stream(connector: ArtworkConnector) -> EventStream:
+    return EventStream(connector, poll_interval=0.02, heartbeat=0.05, history=8)
+
+
+def test_events_are_fetched_with_one_get_logs(
+    connector: ArtworkConnector, chain: MockChain, wallet: Account
+) -> None:
+    start = connector.blockNumber()
+    token_id = mint_and_update(connector, wallet.address)
+    before = chain.rpc_counts["eth_getLogs"]
+    events = connector.getArtworkEvents(start, connector.blockNumber())
+    assert chain.rpc_counts["eth_getLogs"] - before == 1
+    assert [e["event"] for e in events] == ["Transfer", "Updated"]
+    assert events[0]["data"]["to"] == wallet.address
+    assert events[0]["data"]["tokenId"] == token_id
+    assert events[1]["data"]["objectId"] == "renamed"
+
+
+def test_stream_pushes_events_of_own_artworks(
+    connector: ArtworkConnector, stream: EventStream, wallet: Account
+) -> None:
+    own = stream.sse(stream.subscribe(wallet.address))
+    other = stream.subscribe(Account.create().address)
+    assert next(own).startswith("retry: ")
+    token_id = mint_and_update(connector, wallet.address)
+    assert next_event(own)["event"] == "Transfer"
+    updated = next_event(own)
+    assert (updated["event"], updated["data"]["id"]) == ("Updated", token_id)
+    time.sleep(0.1)
+    assert other.queue.empty()
+    own.close()
+    stream.unsubscribe(other)
+
+
+def test_failed_polls_are_logged_and_retried(
+    connector: ArtworkConnector,
+    stream: EventStream,
+    wallet: Account,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    own = stream.sse(stream.subscribe(wallet.address))
+    assert next(own).startswith("retry: ")
+    monkeypatch.setattr(
+        connector,
+        "getArtworkEvents",
+        lambda *args: (_ for _ in ()).throw(ConnectionError("provider down")),
+    )
+    with capture_logs() as logs:
+        connector.safeMint(
+            to=wallet.address, data=Artwork.load_from_mint({"objectId": "obj"})
+        )
+        time.sleep(0.1)
+    assert any(
+        log["log_level"] == "warning" and "provider down" in log["event"]
+        for log in logs
+    )
+    # the next poll after the provider recovered delivers the event
+    del connector.getArtworkEvents
+    assert next_event(own)["event"] == "Transfer"
+    own.close()
+
+
+def test_stream_resumes_after_last_event_id(
+    connector: ArtworkConnector, stream: EventStream, wallet: Account
+) -> None:
+    live = stream.sse(stream.subscribe(wallet.address))
+    next(live)
+    mint_and_update(connector, wallet.address)
+    first, second = next_event(live), next_event(live)
+    live.close()
+
+    resumed = stream.sse(stream.subscribe(wallet.address, first["id"]))
+    next(resumed)
+    assert next_event(resumed) == second
+    resumed.close()
+
+
+def test_stream_resumes_from_provider_beyond_buffer(
+    connector: ArtworkConnector, stream: EventStream, wallet: Account
+) -> None:
+    live = stream.sse(stream.subscribe(wallet.address))
+    next(live)
+    for _ in range(5):
+        mint_and_update(connector, wallet.address)
+    received = [next_event(live) for _ in range(10)]
+    live.close()
+
+    # only the last 8 events are buffered
+    resumed = stream.sse(stream.subscribe(wallet.address, received[0]["id"]))
+    next(resumed)
+    assert [next_event(resumed) for _ in range(9)] == received[1:]
+    resumed.close()
+
+
+def test_stream_replays_at_most_max_replay_blocks(
+    connector: ArtworkConnector,
+    wallet: Account,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    mint_and_update(connector, wallet.address)
+    monkeypatch.setattr(connector, "deployment_block", connector.blockNumber())
+    stream = EventStream(connector, poll_interval=0.02, max_replay=1)
+    scanned = []
+    get_events = connector.getArtworkEvents
+    monkeypatch.setattr(
+        connector,
+        "getArtworkEvents",
+        lambda start, end: scanned.append(start) or get_events(start, end),
+    )
+    # resuming from the first block scans from the deployment block on
+    subscription = stream.subscribe(wallet.address, "0-0")
+    assert scanned == [connector.deployment_block]
+    assert [event["event"] for event in subscription.backlog] == ["Updated"]
+    stream.unsubscribe(subscription)
+
+    monkeypatch.setattr(connector, "deployment_block", 0)
+    with pytest.raises(BadRequest):
+        stream.subscribe(wallet.address, "0-0")
+    assert len(scanned) == 1 and not stream._subscribers
+
+
+def test_stream_limits_subscribers(
+    connector: ArtworkConnector, wallet: Account
+) -> None:
+    stream = EventStream(connector, max_subscribers=1)
+    subscription = stream.subscribe(wallet.address)
+    with pytest.raises(ServiceUnavailable):
+        stream.subscribe(wallet.address)
+    stream.unsubscribe(subscription)
+    stream.unsubscribe(stream.subscribe(wallet.address))
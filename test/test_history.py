@@ -0,0 +1,127 @@
+import threading
+import time
+
+from eth_account import Account
+import pytest
+from requests.exceptions import ReadTimeout
+from web3.exceptions import ContractLogicError
+
+from benchmarks.mock_chain import MockChain
+from src.models.Artwork import Artwork
+from src.smartcontract.ArtworkConnector import ArtworkConnector
+from src.smartcontract.LogScanner import LogScanner
+
+
+class FakeLogs:
+    """eth_getLogs over one log per block in [0, blocks), refusing ranges with more than max_logs"""
+
+    def __init__(self, blocks: int, max_logs: int = None, delay: float = 0.0):
+        self.blocks = blocks
+        self.max_logs = max_logs
+        self.delay = delay
+        self.ranges = []
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, filter_params: dict) -> list:
+        start, end = filter_params["fromBlock"], filter_params["toBlock"]
+        with self._lock:
+            self.ranges.append((start, end))
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            time.sleep(self.delay)
+            logs = [
+                {"blockNumber": block, "logIndex": 0}
+                for block in range(start, min(end, self.blocks - 1) + 1)
+                if block % 100 == 0
+            ]
+            if self.max_logs is not None and len(logs) > self.max_logs:
+                raise ValueError(
+                    {
+                        "code": -32005,
+                        "message": "query returned more than 10000 results",
+                    }
+                )
+            return logs
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+def test_scanner_grows_window_on_sparse_ranges() -> None:
+    get_logs = FakeLogs(1_000_000)
+    scanner = LogScanner(get_logs, concurrency=1, initial_window=1_000)
+    logs = scanner.scan([{}], 0, 999_999)
+    assert [log["blockNumber"] for log in logs] == list(range(0, 1_000_000, 100))
+    # doubling from 1000 blocks takes a fraction of the 1000 calls of fixed windows
+    assert len(get_logs.ranges) < 30
+    assert scanner.window > 1_000
+
+
+def test_scanner_splits_refused_ranges() -> None:
+    get_logs = FakeLogs(100_000, max_logs=50)
+    scanner = LogScanner(get_logs, concurrency=1, initial_window=100_000)
+    logs = scanner.scan([{}], 0, 99_999)
+    assert [log["blockNumber"] for log in logs] == list(range(0, 100_000, 100))
+    # refused ranges are fetched again in windows of half the refused size
+    assert scanner.window <= 5_000
+    assert len(get_logs.ranges) < 45
+
+
+def test_scanner_fetches_windows_in_parallel() -> None:
+    get_logs = FakeLogs(10_000, delay=0.02)
+    scanner = LogScanner(
+        get_logs, max_workers=4, concurrency=4, initial_window=100, max_window=100
+    )
+    started = time.monotonic()
+    scanner.scan([{}], 0, 9_999)
+    assert get_logs.max_active == 4
+    assert time.monotonic() - started < 100 * 0.02 / 2
+
+
+def test_scanner_raises_other_errors() -> None:
+    def failing(filter_params: dict) -> list:
+        raise ValueError({"code": -32000, "message": "invalid filter"})
+
+    with pytest.raises(ValueError, match="invalid filter"):
+        LogScanner(failing).scan([{}], 0, 10_000)
+
+
+def test_scanner_splits_on_timeouts() -> None:
+    def slow_for_large_ranges(filter_params: dict) -> list:
+        if filter_params["toBlock"] - filter_params["fromBlock"] > 10:
+            raise ReadTimeout()
+        return []
+
+    scanner = LogScanner(slow_for_large_ranges, initial_window=1_000)
+    assert scanner.scan([{}], 0, 99) == []
+    assert scanner.window <= 11
+
+
+def test_history_of_an_artwork(
+    connector: ArtworkConnector, chain: MockChain, wallet: Account
+) -> None:
+    chain.max_logs = 2
+    other = Account.create().address
+    token_id = connector.safeMint(
+        to=wallet.address, data=Artwork.load_from_mint({"objectId": "obj"})
+    )
+    connector.safeMint(to=other, data=Artwork.load_from_mint({"objectId": "foreign"}))
+    for name in ("first", "second", "third"):
+        connector.updateArtworkData(
+            Artwork.load({"id": token_id, "objectId": name}), wallet.address
+        )
+
+    history = connector.getArtworkHistory(token_id, wallet.address)
+    assert [e["event"] for e in history] == ["Transfer"] + ["Updated"] * 3
+    assert history[0]["data"]["tokenId"] == token_id
+    assert [e["data"]["objectId"] for e in history[1:]] == ["first", "second", "third"]
+    blocks = [e["blockNumber"] for e in history]
+    assert blocks == sorted(blocks)
+
+    since = connector.getArtworkHistory(token_id, wallet.address, blocks[2] + 1)
+    assert [e["data"]["objectId"] for e in since] == ["third"]
+    with pytest.raises(ContractLogicError):
+        connector.getArtworkHistory(token_id, other)
@@ -0,0 +1,117 @@
+import pathlib
+import time
+
+from eth_account import Account
+import pytest
+from werkzeug.exceptions import UnprocessableEntity
+
+from benchmarks.mock_chain import ABI_PATH, MockChain, MockProviderServer
+from src.models.Artwork import Artwork
+from src.smartcontract.ArtworkConnector import ArtworkConnector
+from src.smartcontract.TransactionJournal import TransactionJournal
+
+
+def test_journal_replays_pending_transactions(tmp_path: pathlib.Path) -> None:
+    path = str(tmp_path / "journal.jsonl")
+    journal = TransactionJournal(path)
+    journal.sent("a", "0x01", "safeMint", "f1", "0xabc")
+    journal.sent("b", "0x02", "updateArtworkData", "f2")
+    journal.mined("a")
+    journal.close()
+    with open(path, "a") as f:
+        f.write('{"sent": {"key": "c", "tx_ha')
+
+    replayed = TransactionJournal(path)
+    assert replayed.get("a").done and replayed.get("a").sender == "0xabc"
+    assert [entry.key for entry in replayed.pending()] == ["b"]
+    assert replayed.get("c") is None
+    replayed.close()
+    # compacted to one line per transaction
+    assert len(pathlib.Path(path).read_text().splitlines()) == 2
+
+
+def test_journal_drops_mined_entries_after_retention(tmp_path: pathlib.Path) -> None:
+    path = str(tmp_path / "journal.jsonl")
+    journal = TransactionJournal(path)
+    journal.sent("a", "0x01", "safeMint", "f1")
+    journal.sent("b", "0x02", "safeMint", "f2")
+    journal.mined("a")
+    journal.close()
+    time.sleep(0.01)
+    replayed = TransactionJournal(path, retention=0)
+    assert replayed.get("a") is None
+    assert replayed.get("b") is not None
+
+
+def test_journal_drops_mined_entries_while_running(tmp_path: pathlib.Path) -> None:
+    path = str(tmp_path / "journal.jsonl")
+    journal = TransactionJournal(path, retention=0, prune_interval=0)
+    journal.sent("a", "0x01", "safeMint", "f1")
+    journal.mined("a")
+    time.sleep(0.01)
+    journal.sent("b", "0x02", "safeMint", "f2")
+    assert journal.get("a") is None
+    assert journal.get("b") is not None
+    journal.close()
+    assert len(pathlib.Path(path).read_text().splitlines()) == 1
+
+
+def test_writes_without_idempotency_key_are_journaled(
+    connector: ArtworkConnector, wallet: Account
+) -> None:
+    connector.safeMint(
+        to=wallet.address, data=Artwork.load_from_mint({"objectId": "obj"})
+    )
+    entries = list(connector._journal._entries.values())
+    assert len(entries) == 1 and entries[0].key == f"tx:{entries[0].tx_hash}"
+    assert entries[0].done and entries[0].sender is not None
+
+
+def test_retry_with_idempotency_key_attaches_to_transaction(
+    connector: ArtworkConnector, chain: MockChain, wallet: Account
+) -> None:
+    mint = lambda key, objectId="obj": connector.safeMint(
+        to=wallet.address,
+        data=Artwork.load_from_mint({"objectId": objectId}),
+        idempotency_key=key,
+    )
+    token_id = mint("key-1")
+    sent = chain.rpc_counts["eth_sendRawTransaction"]
+    assert mint("key-1") == token_id
+    assert chain.rpc_counts["eth_sendRawTransaction"] == sent
+    assert mint("key-2") == token_id + 1
+    with pytest.raises(UnprocessableEntity):
+        mint("key-1", objectId="other")
+
+
+def test_restart_resumes_receipt_tracking(
+    admin: Account,
+    wallet: Account,
+    tmp_path: pathlib.Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    chain = MockChain(admin.address, block_time=0.3)
+    provider = MockProviderServer(chain).start()
+    monkeypatch.setenv("SMARTCONTRACT_ADDRESS", chain.address)
+    monkeypatch.setenv("SMARTCONTRACT_ABI_PATH", ABI_PATH)
+    path = str(tmp_path / "journal.jsonl")
+    try:
+        connector = ArtworkConnector(admin.key.hex(), provider.url, journal_path=path)
+        # broadcast only, as if the server was stopped while waiting for the receipt
+        connector._send(
+            "key",
+            "safeMint",
+            wallet.address,
+            Artwork.load_from_mint({"objectId": "obj"}).to_sc_mint()[1],
+        )
+        connector._journal.close()
+
+        restarted = ArtworkConnector(admin.key.hex(), provider.url, journal_path=path)
+        assert [entry.key for entry in restarted._journal.pending()] == ["key"]
+        deadline = time.time() + 5
+        while restarted._journal.pending() and time.time() < deadline:
+            time.sleep(0.05)
+        assert restarted._journal.pending() == []
+        assert chain.rpc_counts["eth_sendRawTransaction"] == 1
+    finally:
+        provider.stop()
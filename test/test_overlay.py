@@ -0,0 +1,109 @@
+from concurrent.futures import ThreadPoolExecutor
+import multiprocessing
+import threading
+import time
+
+from eth_account import Account
+import pytest
+
+from benchmarks.mock_chain import ABI_PATH, MockChain, MockProviderServer
+from src.cache.SharedCache import SharedCache
+from src.models.Artwork import Artwork
+from src.smartcontract.ArtworkConnector import ArtworkConnector
+from src.smartcontract.WriteOverlay import WriteOverlay
+
+
+def test_later_writes_win_until_the_provider_caught_up() -> None:
+    overlay = WriteOverlay()
+    overlay.sent("artwork:1", "0x01")
+    assert overlay.get("artwork:1").pending == ("0x01",)
+    overlay.mined("artwork:1", "0x01", 7, {"objectId": "new"})
+    overlay.mined("artwork:1", None, 5, {"objectId": "old"})
+    entry = overlay.get("artwork:1")
+    assert (entry.block_number, entry.record, entry.pending) == (
+        7,
+        {"objectId": "new"},
+        (),
+    )
+    overlay.caught_up("artwork:1", 6)
+    assert overlay.get("artwork:1") is not None
+    overlay.caught_up("artwork:1", 7)
+    assert overlay.get("artwork:1") is None
+
+
+def test_overlay_is_shared_with_forked_processes() -> None:
+    overlay = WriteOverlay(shared_cache=SharedCache(64, value_size=1024))
+    process = multiprocessing.get_context("fork").Process(
+        target=overlay.mined, args=("artwork:1", None, 3, {"objectId": "new"})
+    )
+    process.start()
+    process.join()
+    assert process.exitcode == 0
+    assert overlay.get("artwork:1").record == {"objectId": "new"}
+
+
+def test_reads_see_own_updates_before_the_provider(
+    connector: ArtworkConnector, chain: MockChain, wallet: Account
+) -> None:
+    token_id = connector.safeMint(
+        to=wallet.address, data=Artwork.load_from_mint({"objectId": "obj"})
+    )
+    assert connector.getArtworkData(token_id, wallet.address).objectId == "obj"
+    # the node answering reads is a block behind the one the update was sent to
+    chain.lag = 1
+    connector.updateArtworkData(
+        Artwork.load({"id": token_id, "objectId": "new"}), wallet.address
+    )
+    calls = chain.rpc_counts["eth_call"]
+    assert connector.getArtworkData(token_id, wallet.address).objectId == "new"
+    assert chain.rpc_counts["eth_call"] == calls
+    chain.lag = 0
+    # once the (cached) head reaches the block of the update it is read from the provider
+    deadline = time.time() + 5
+    while chain.rpc_counts["eth_call"] == calls and time.time() < deadline:
+        assert connector.getArtworkData(token_id, wallet.address).objectId == "new"
+        time.sleep(0.05)
+    assert chain.rpc_counts["eth_call"] == calls + 1
+    assert connector.getArtworkData(token_id, wallet.address).objectId == "new"
+    assert connector.pendingTransactions(token_id) == []
+
+
+def test_reads_wait_for_the_provider_to_see_a_mint(
+    connector: ArtworkConnector, chain: MockChain, wallet: Account
+) -> None:
+    chain.lag = 1
+    token_id = connector.safeMint(
+        to=wallet.address, data=Artwork.load_from_mint({"objectId": "obj"})
+    )
+    catch_up = threading.Timer(0.3, setattr, (chain, "lag", 0))
+    catch_up.start()
+    assert connector.getArtworkData(token_id, wallet.address).objectId == "obj"
+    assert connector.getArtworkIdsByAddress(wallet.address)["owner"] == [token_id]
+    catch_up.join()
+
+
+def test_reads_report_pending_updates(
+    admin: Account, wallet: Account, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    chain = MockChain(admin.address, block_time=0.3)
+    provider = MockProviderServer(chain).start()
+    monkeypatch.setenv("SMARTCONTRACT_ADDRESS", chain.address)
+    monkeypatch.setenv("SMARTCONTRACT_ABI_PATH", ABI_PATH)
+    connector = ArtworkConnector(admin.key.hex(), provider.url)
+    try:
+        token_id = connector.safeMint(
+            to=wallet.address, data=Artwork.load_from_mint({"objectId": "obj"})
+        )
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            update = pool.submit(
+                connector.updateArtworkData,
+                Artwork.load({"id": token_id, "objectId": "new"}),
+                wallet.address,
+            )
+            while not connector.pendingTransactions(token_id):
+                assert not update.done()
+                time.sleep(0.01)
+            assert update.result().objectId == "new"
+        assert connector.pendingTransactions(token_id) == []
+    finally:
+        provider.stop()
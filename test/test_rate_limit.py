@@ -0,0 +1,111 @@
+import multiprocessing
+import time
+
+from eth_account import Account
+from flask import Flask
+import pytest
+from werkzeug.exceptions import TooManyRequests
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+from benchmarks.mock_chain import ABI_PATH, MockChain, MockProviderServer
+from src.cache.SharedCache import SharedCache
+from src.models.Artwork import Artwork
+from src.ratelimit.RateLimiter import RateLimiter, client_address, rate_limited
+from src.ratelimit.TokenBucket import TokenBucket
+from src.smartcontract.ArtworkConnector import ArtworkConnector
+from src.smartcontract.SmartcontractConnector import ProviderBudgetExhausted
+from utils.error_handlers import register_error_handlers
+
+
+def test_token_bucket_admits_bursts_and_refills() -> None:
+    bucket = TokenBucket(rate=50, burst=3)
+    assert all(bucket.reserve()[0] for _ in range(3))
+    admitted, wait = bucket.reserve()
+    assert not admitted and 0 < wait <= 0.02
+    time.sleep(0.03)
+    assert bucket.reserve()[0]
+    # within max_wait the tokens are taken ahead and the caller waits for them
+    admitted, wait = bucket.reserve(max_wait=1)
+    assert admitted and wait > 0
+
+
+def test_rate_limiter_keeps_a_bucket_per_key() -> None:
+    limiter = RateLimiter("read", rate=1, burst=2, max_keys=2)
+    limiter.check("a")
+    limiter.check("a")
+    with pytest.raises(TooManyRequests) as error:
+        limiter.check("a")
+    assert error.value.retry_after == 1
+    limiter.check("b")
+    # the least recently seen bucket is dropped beyond max_keys
+    limiter.check("c")
+    limiter.check("a")
+    RateLimiter("unlimited", rate=0, burst=0).check("a", cost=100)
+
+
+def test_rate_limiter_is_shared_with_forked_processes() -> None:
+    limiter = RateLimiter(
+        "write", rate=0.01, burst=2, shared_cache=SharedCache(64, value_size=16)
+    )
+    limiter.check("a")
+    process = multiprocessing.get_context("fork").Process(
+        target=limiter.check, args=("a",)
+    )
+    process.start()
+    process.join()
+    assert process.exitcode == 0
+    with pytest.raises(TooManyRequests):
+        limiter.check("a")
+    limiter.check("b")
+
+
+def test_rate_limited_routes_answer_429() -> None:
+    app = Flask(__name__)
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1)
+    register_error_handlers(app)
+    limiter = RateLimiter("auth", rate=0.5, burst=1)
+
+    @app.post("/auth/payload")
+    @rate_limited(limiter, key=client_address)
+    def payload() -> dict:
+        return {}
+
+    client = app.test_client()
+    first = {"X-Forwarded-For": "203.0.113.1"}
+    assert client.post("/auth/payload", headers=first).status_code == 200
+    response = client.post("/auth/payload", headers=first)
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "2"
+    assert response.json["error"] == "TooManyRequests"
+    second = {"X-Forwarded-For": "203.0.113.2"}
+    assert client.post("/auth/payload", headers=second).status_code == 200
+
+
+def test_provider_calls_are_budgeted(
+    admin: Account, chain: MockChain, wallet: Account, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    provider = MockProviderServer(chain).start()
+    monkeypatch.setenv("SMARTCONTRACT_ADDRESS", chain.address)
+    monkeypatch.setenv("SMARTCONTRACT_ABI_PATH", ABI_PATH)
+    connector = ArtworkConnector(
+        admin.key.hex(), provider.url, provider_rate=50, provider_burst=50
+    )
+    try:
+        token_id = connector.safeMint(
+            to=wallet.address, data=Artwork.load_from_mint({"objectId": "obj"})
+        )
+        connector.getArtworkData(token_id, wallet.address)
+        # calls beyond the budget wait for it up to provider_max_wait
+        connector._budgetMaxWait = 0
+        while connector._budget.reserve("calls")[0]:
+            pass
+        before = chain.rpc_calls
+        # the last known result is served instead of calling the provider
+        assert connector.getArtworkData(token_id, wallet.address).objectId == "obj"
+        assert connector.staleSince() is not None
+        with pytest.raises(ProviderBudgetExhausted) as error:
+            connector.getArtworkIdsByAddress(wallet.address)
+        assert error.value.retry_after == 1
+        assert chain.rpc_calls == before
+    finally:
+        provider.stop()
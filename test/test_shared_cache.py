@@ -0,0 +1,144 @@
+import multiprocessing
+import pathlib
+import time
+
+from eth_account import Account
+from eth_account.messages import encode_defunct
+import pytest
+from werkzeug.exceptions import Unauthorized
+
+from benchmarks.load import eip4361_message
+from src.authentication.Authenticator import Authenticator
+from src.cache.SharedCache import SharedCache
+from src.smartcontract.TransactionJournal import TransactionJournal
+
+fork = multiprocessing.get_context("fork")
+
+
+def test_shared_cache_get_set() -> None:
+    cache = SharedCache(slots=16, value_size=4, ways=4)
+    assert cache.get("a") is None
+    assert cache.set("a", b"1234", time.time() + 60)
+    assert cache.get("a") == b"1234"
+    assert cache.set("a", b"5", time.time() + 60)
+    assert cache.get("a") == b"5"
+    assert not cache.set("b", b"12345", time.time() + 60)
+    cache.set("c", b"", time.time() - 1)
+    assert cache.get("c") is None
+
+
+def test_shared_cache_evicts_earliest_expiry() -> None:
+    cache = SharedCache(slots=2, value_size=1, ways=2)
+    now = time.time()
+    cache.set("a", b"a", now + 10)
+    cache.set("b", b"b", now + 60)
+    cache.set("c", b"c", now + 30)
+    assert cache.get("a") is None
+    assert cache.get("b") == b"b" and cache.get("c") == b"c"
+
+
+def test_shared_cache_add_never_evicts() -> None:
+    cache = SharedCache(slots=2, value_size=0, ways=2)
+    now = time.time()
+    assert cache.add("a", now + 60)
+    assert not cache.add("a", now + 60)
+    assert cache.add("b", now + 60)
+    with pytest.raises(OverflowError):
+        cache.add("c", now + 60)
+    assert cache.get("a") == b""
+
+
+def test_shared_cache_is_shared_with_forked_processes() -> None:
+    cache = SharedCache(slots=64, value_size=8)
+
+    def worker() -> None:
+        cache.set("child", b"written", time.time() + 60)
+        added = cache.add("nonce", time.time() + 60)
+        raise SystemExit(0 if not added and cache.get("parent") == b"seen" else 1)
+
+    cache.set("parent", b"seen", time.time() + 60)
+    cache.add("nonce", time.time() + 60)
+    process = fork.Process(target=worker)
+    process.start()
+    process.join()
+    assert process.exitcode == 0
+    assert cache.get("child") == b"written"
+
+
+def test_login_replay_across_workers(wallet: Account) -> None:
+    key = Account.create().key.hex()
+    tokens, nonces = SharedCache(64, value_size=1), SharedCache(64, value_size=0)
+    issuer = Authenticator(key, shared_token_cache=tokens, shared_nonces=nonces)
+    payload = issuer.generate_client_auth_payload(wallet.address, "1")["payload"]
+    signature = wallet.sign_message(encode_defunct(text=eip4361_message(payload)))
+    login = {"payload": payload, "signature": signature.signature.hex()}
+
+    def worker() -> None:
+        try:
+            issuer.generate_auth_token("artis-project", login)
+        except Unauthorized:
+            raise SystemExit(1)
+
+    process = fork.Process(target=worker)
+    process.start()
+    process.join()
+    assert process.exitcode == 0
+    with pytest.raises(Unauthorized, match="already been used"):
+        issuer.generate_auth_token("artis-project", login)
+
+
+def test_token_checks_are_shared(wallet: Account) -> None:
+    recovered = []
+    key = Account.create().key.hex()
+    tokens = SharedCache(64, value_size=1)
+    first = Authenticator(key, shared_token_cache=tokens)
+    second = Authenticator(key, shared_token_cache=tokens)
+    payload = first.generate_client_auth_payload(wallet.address, "1")["payload"]
+    signature = wallet.sign_message(encode_defunct(text=eip4361_message(payload)))
+    token = first.generate_auth_token(
+        "artis-project", {"payload": payload, "signature": signature.signature.hex()}
+    )
+    recover = second.token_verifier._recover_address
+    second.token_verifier._recover_address = lambda *args: (
+        recovered.append(args) or recover(*args)
+    )
+
+    assert first.authenticate("artis-project", token) == wallet.address
+    assert second.authenticate("artis-project", token) == wallet.address
+    assert recovered == []
+
+
+def test_logout_revokes_in_all_workers(wallet: Account) -> None:
+    key = Account.create().key.hex()
+    revocations = SharedCache(64, value_size=0)
+    issuer = Authenticator(key, shared_revocations=revocations)
+    payload = issuer.generate_client_auth_payload(wallet.address, "1")["payload"]
+    signature = wallet.sign_message(encode_defunct(text=eip4361_message(payload)))
+    token = issuer.generate_auth_token(
+        "artis-project", {"payload": payload, "signature": signature.signature.hex()}
+    )
+
+    process = fork.Process(target=issuer.logout, args=("artis-project", token))
+    process.start()
+    process.join()
+    with pytest.raises(Unauthorized, match="revoked"):
+        issuer.authenticate("artis-project", token)
+
+
+def test_journal_catches_up_with_forked_processes(tmp_path: pathlib.Path) -> None:
+    journal = TransactionJournal(str(tmp_path / "journal.jsonl"))
+
+    def worker() -> None:
+        with journal.exclusive():
+            journal.sent("a", "0x01", "safeMint", "f1")
+        journal.mined("a")
+
+    process = fork.Process(target=worker)
+    process.start()
+    process.join()
+    assert journal.get("a").tx_hash == "0x01"
+    journal.sent("b", "0x02", "safeMint", "f2")
+    with journal.exclusive():
+        assert journal.get("a").done
+        assert [entry.key for entry in journal.pending()] == ["b"]
+    journal.close()
@@ -0,0 +1,148 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+
+from eth_account import Account
+from eth_utils import ValidationError
+import pytest
+from werkzeug.exceptions import ServiceUnavailable
+
+from src.authentication.Authenticator import Authenticator
+from src.authentication.SignaturePool import SignaturePool, sign_message
+
+
+@pytest.fixture
+def pooled_authenticator(authenticator: Authenticator) -> Authenticator:
+    pooled = Authenticator(authenticator._signing_key, signature_processes=2)
+    yield pooled
+    pooled.signatures.shutdown()
+
+
+def test_login_bursts_are_batched(
+    pooled_authenticator: Authenticator, new_login_payload
+) -> None:
+    payloads = [new_login_payload() for _ in range(24)]
+    with ThreadPoolExecutor(8) as threads:
+        tokens = list(
+            threads.map(
+                lambda payload: pooled_authenticator.generate_auth_token(
+                    "artis-project", payload
+                ),
+                payloads,
+            )
+        )
+    address = payloads[0]["payload"]["address"]
+    assert all(
+        pooled_authenticator.authenticate("artis-project", token) == address
+        for token in tokens
+    )
+    metrics = pooled_authenticator.signatures.metrics()
+    # a recovery and a signature per login, a recovery per token check
+    assert metrics["pooled"] == 72 and metrics["in_thread"] == 0
+    assert metrics["batches"] < metrics["pooled"]
+    with pytest.raises(ValidationError):
+        pooled_authenticator._recover_address("message", "0x00")
+
+
+def test_broken_pool_falls_back_to_the_calling_thread() -> None:
+    account = Account.create()
+    pool = SignaturePool(account.key.hex(), processes=1, restart_delay=0.2)
+    try:
+        assert pool.sign("message") == sign_message(account, "message")
+        for process in pool._pool._processes.values():
+            process.kill()
+        signature = sign_message(account, "message")
+        assert pool.recover("message", signature) == account.address
+        assert pool.metrics()["in_thread"] == 1
+        time.sleep(0.2)
+        # started again after restart_delay
+        assert pool.recover("message", signature) == account.address
+        assert pool.metrics()["in_thread"] == 1
+    finally:
+        pool.shutdown()
+    assert pool.sign("message") == sign_message(account, "message")
+    assert pool.metrics()["in_thread"] == 2
+
+
+def test_saturated_pool_rejects_tasks() -> None:
+    account = Account.create()
+    pool = SignaturePool(account.key.hex(), processes=1, max_queue=1)
+    signature = sign_message(account, "message")
+    try:
+        pool.recover("message", signature)
+        # the process is busy, the next task is held by the dispatcher and one waits
+        pool._slots.acquire()
+        waiting = [
+            threading.Thread(target=pool.recover, args=("message", signature))
+            for _ in range(2)
+        ]
+        waiting[0].start()
+        time.sleep(0.1)
+        waiting[1].start()
+        while not pool._queue.full():
+            time.sleep(0.01)
+        with pytest.raises(ServiceUnavailable) as error:
+            pool.recover("message", signature)
+        assert error.value.retry_after == 1
+        pool._slots.release()
+        for thread in waiting:
+            thread.join()
+        assert pool.metrics()["rejected"] == 1
+    finally:
+        pool.shutdown()
+
+
+def test_saturated_pool_does_not_invalidate_tokens(
+    authenticator: Authenticator, login_payload: dict
+) -> None:
+    token = authenticator.generate_auth_token("artis-project", login_payload)
+    address = login_payload["payload"]["address"]
+    pooled = Authenticator(
+        authenticator._signing_key, signature_processes=1, signature_queue=1
+    )
+    pool = pooled.signatures
+    signature = sign_message(pooled.signing_account, "message")
+    try:
+        pool.recover("message", signature)
+        pool._slots.acquire()
+        waiting = [
+            threading.Thread(target=pool.recover, args=("message", signature))
+            for _ in range(2)
+        ]
+        waiting[0].start()
+        time.sleep(0.1)
+        waiting[1].start()
+        while not pool._queue.full():
+            time.sleep(0.01)
+        with pytest.raises(ServiceUnavailable):
+            pooled.authenticate("artis-project", token)
+        pool._slots.release()
+        for thread in waiting:
+            thread.join()
+        # the rejection was not cached as an invalid signature
+        assert pooled.authenticate("artis-project", token) == address
+    finally:
+        pool.shutdown()
+
+
+def test_hung_pool_times_out() -> None:
+    account = Account.create()
+    pool = SignaturePool(account.key.hex(), processes=1)
+    signature = sign_message(account, "message")
+    try:
+        pool.recover("message", signature)
+        pool.timeout = 0.2
+        # the dispatcher holds the next task as if the process never answered
+        pool._slots.acquire()
+        with pytest.raises(ServiceUnavailable) as error:
+            pool.recover("message", signature)
+        assert error.value.retry_after == 1
+        assert pool.metrics()["timed_out"] == 1
+        pool._slots.release()
+        # the terminated pool is restarted later, meanwhile tasks run on the thread
+        deadline = time.time() + 5
+        while pool._pool is not None and time.time() < deadline:
+            time.sleep(0.05)
+        assert pool.recover("message", signature) == account.address
+    finally:
+        pool.shutdown()
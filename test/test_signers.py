@@ -0,0 +1,200 @@
+from concurrent.futures import ThreadPoolExecutor
+import multiprocessing
+
+from eth_account import Account
+from hexbytes import HexBytes
+import pytest
+from web3.exceptions import ContractLogicError
+
+from benchmarks.mock_chain import ABI_PATH, MockChain, MockProviderServer
+from src.models.Artwork import Artwork
+from src.smartcontract.ArtworkConnector import ArtworkConnector
+from src.smartcontract.SignerPool import SignerPool
+
+
+class FakeNode:
+    def __init__(self):
+        self.nonces = {"a": 5, "b": 7}
+        self.reads = []
+        self.sent = []
+
+    def get_nonce(self, address: str) -> int:
+        self.reads.append(address)
+        return self.nonces[address]
+
+    def transact(self, address: str, nonce: int) -> HexBytes:
+        self.sent.append((address, nonce))
+        return HexBytes(len(self.sent).to_bytes(32, "big"))
+
+
+def test_transactions_go_to_the_least_loaded_lane() -> None:
+    node = FakeNode()
+    pool = SignerPool(["a", "b"])
+    first = pool.send(node.transact, node.get_nonce)
+    second = pool.send(node.transact, node.get_nonce)
+    pool.done(first)
+    pool.done(second)
+    third = pool.send(node.transact, node.get_nonce)
+    assert node.sent == [("a", 5), ("b", 7), ("a", 6)]
+    assert node.reads == ["a", "b", "a"]
+    assert [lane["in_flight"] for lane in pool.metrics()] == [1, 0]
+    pool.done(third)
+    pool.send(node.transact, node.get_nonce, address="b")
+    assert node.sent[-1] == ("b", 8)
+
+
+def test_failed_broadcast_takes_the_nonce_of_the_node() -> None:
+    node = FakeNode()
+    pool = SignerPool(["a"])
+    pool.send(node.transact, node.get_nonce)
+    node.nonces["a"] = 6
+
+    def failing(address: str, nonce: int) -> HexBytes:
+        raise ConnectionError("provider down")
+
+    with pytest.raises(ConnectionError):
+        pool.send(failing, node.get_nonce)
+    assert pool.metrics()[0]["in_flight"] == 1
+    pool.send(node.transact, node.get_nonce)
+    # the node did not see the failed transaction, its nonce is used again
+    assert node.sent == [("a", 5), ("a", 6)]
+
+
+def test_transactions_of_other_instances_are_accounted_for() -> None:
+    node = FakeNode()
+    pool = SignerPool(["a"])
+    pool.send(node.transact, node.get_nonce)
+    # another instance signing with the same key sent two transactions
+    node.nonces["a"] = 8
+    pool.send(node.transact, node.get_nonce)
+    # a node lagging behind does not reuse the nonces sent by this instance
+    node.nonces["a"] = 5
+    pool.send(node.transact, node.get_nonce)
+    assert node.sent == [("a", 5), ("a", 8), ("a", 9)]
+
+
+def test_stuck_lane_is_set_aside() -> None:
+    node = FakeNode()
+    pool = SignerPool(["a", "b"], stuck_timeout=60)
+    pool.done(pool.send(node.transact, node.get_nonce), stuck=True)
+    assert [lane["stuck"] for lane in pool.metrics()] == [True, False]
+    # the idle stuck lane is skipped while the other one is busy
+    for _ in range(3):
+        pool.send(node.transact, node.get_nonce)
+    assert [address for address, _ in node.sent] == ["a", "b", "b", "b"]
+
+
+def test_lanes_are_shared_with_forked_processes() -> None:
+    node = FakeNode()
+    pool = SignerPool(["a"])
+    pool.done(pool.send(node.transact, node.get_nonce))
+    process = multiprocessing.get_context("fork").Process(
+        target=pool.send, args=(node.transact, node.get_nonce)
+    )
+    process.start()
+    process.join()
+    assert process.exitcode == 0
+    pool.send(node.transact, node.get_nonce)
+    assert node.sent[-1] == ("a", 7)
+    assert pool.metrics()[0]["in_flight"] == 2
+
+
+def test_mints_are_spread_over_signers(
+    admin: Account, wallet: Account, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    signers = [Account.create() for _ in range(2)]
+    chain = MockChain(
+        admin.address, block_time=0.3, signers=[s.address for s in signers]
+    )
+    provider = MockProviderServer(chain).start()
+    monkeypatch.setenv("SMARTCONTRACT_ADDRESS", chain.address)
+    monkeypatch.setenv("SMARTCONTRACT_ABI_PATH", ABI_PATH)
+    connector = ArtworkConnector(
+        admin.key.hex(),
+        provider.url,
+        write_workers=6,
+        write_queue=0,
+        signer_private_keys=[s.key.hex() for s in signers],
+    )
+    mint = lambda i: connector.safeMint(
+        to=wallet.address, data=Artwork.load_from_mint({"objectId": f"obj{i}"})
+    )
+    try:
+        with ThreadPoolExecutor(max_workers=6) as pool:
+            token_ids = list(pool.map(mint, range(6)))
+        assert sorted(token_ids) == list(range(1, 7))
+        senders = [receipt["from"] for receipt in chain._receipts.values()]
+        assert {address: senders.count(address) for address in senders} == {
+            account.address: 2 for account in [admin, *signers]
+        }
+        assert chain.rpc_counts["eth_getTransactionCount"] == 6
+        assert all(
+            lane["in_flight"] == 0 for lane in connector.poolMetrics()["signers"]
+        )
+    finally:
+        provider.stop()
+
+
+def test_approvals_without_contract_support_share_a_signer(
+    admin: Account, wallet: Account, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    signers = [Account.create() for _ in range(2)]
+    chain = MockChain(admin.address, signers=[s.address for s in signers])
+    provider = MockProviderServer(chain).start()
+    monkeypatch.setenv("SMARTCONTRACT_ADDRESS", chain.address)
+    monkeypatch.setenv("SMARTCONTRACT_ABI_PATH", ABI_PATH)
+    connector = ArtworkConnector(
+        admin.key.hex(),
+        provider.url,
+        signer_private_keys=[s.key.hex() for s in signers],
+    )
+    carrier, recipient = Account.create(), Account.create()
+    try:
+        token_id = connector.safeMint(
+            to=wallet.address,
+            data=Artwork.load_from_mint(
+                {
+                    "objectId": "obj",
+                    "carrier": carrier.address,
+                    "recipient": recipient.address,
+                }
+            ),
+        )
+        before = len(chain._receipts)
+        artwork = connector.approveStatusChange(
+            token_id,
+            "IN_TRANSIT",
+            [(party.address, "0x") for party in (wallet, carrier, recipient)],
+        )
+        assert artwork.status["currentStatus"] == "IN_TRANSIT"
+        senders = [receipt["from"] for receipt in chain._receipts.values()]
+        assert len(set(senders[before:])) == 1 and len(senders) == before + 3
+    finally:
+        provider.stop()
+
+
+def test_writes_are_simulated_as_their_signer(
+    admin: Account, wallet: Account, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    # a signer the smartcontract does not authorize
+    rogue = Account.create()
+    chain = MockChain(admin.address)
+    provider = MockProviderServer(chain).start()
+    monkeypatch.setenv("SMARTCONTRACT_ADDRESS", chain.address)
+    monkeypatch.setenv("SMARTCONTRACT_ABI_PATH", ABI_PATH)
+    connector = ArtworkConnector(
+        admin.key.hex(),
+        provider.url,
+        simulate_writes=True,
+        signer_private_keys=[rogue.key.hex()],
+    )
+    try:
+        # the admin lane is busy, the mint is scheduled onto the rogue signer
+        connector._signers.lanes[0].in_flight.value += 1
+        with pytest.raises(ContractLogicError):
+            connector.safeMint(
+                to=wallet.address, data=Artwork.load_from_mint({"objectId": "obj"})
+            )
+        assert chain.rpc_counts["eth_sendRawTransaction"] == 0
+    finally:
+        provider.stop()
@@ -0,0 +1,44 @@
+import gzip
+
+from flask import Flask, request, Response
+
+# brotli is optional, gzip is used without it
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def compress_data(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=4)
+    return gzip.compress(data, compresslevel=6)
+
+
+def register_compression(app: Flask, min_size: int = 1024):
+    """Compresses responses larger than min_size bytes with brotli or gzip, as accepted by the client"""
+
+    @app.after_request
+    def compress(response: Response) -> Response:
+        if (
+            response.status_code != 200
+            or response.direct_passthrough
+            or "Content-Encoding" in response.headers
+            or (response.content_length or 0) < min_size
+        ):
+            return response
+
+        response.vary.add("Accept-Encoding")
+        accepted = [e for e in ENCODINGS if request.accept_encodings[e]]
+        if not accepted:
+            return response
+        encoding = accepted[0]
+        response.set_data(compress_data(response.get_data(), encoding))
+        response.headers["Content-Encoding"] = encoding
+        # every encoding is its own representation and needs its own entity tag
+        tag, weak = response.get_etag()
+        if tag:
+            response.set_etag(f"{tag}-{encoding}", weak)
+        return response
@@ -0,0 +1,40 @@
+import hashlib
+from typing import Any, Callable
+
+from flask import request, Response
+
+from utils.compression import ENCODINGS
+from utils.serialization import encode, negotiate_mimetype
+
+# responses depend on the authenticated sender, shared caches must not store them and
+# browsers have to revalidate before reusing one
+CACHE_CONTROL = "private, no-cache"
+
+
+def etag(state: Any, mimetype: str = "") -> str:
+    """Strong entity tag for a piece of chain state as returned by the smartcontract"""
+    data = f"{mimetype}:{state!r}".encode("utf-8")
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def conditional(state: Any, build: Callable[[], Any]) -> Response:
+    """
+    Answers a GET with 304 Not Modified if the client already holds the representation
+    of state, otherwise builds the body. build is only invoked when the client is stale,
+    so unchanged resources skip deserialization and serialization entirely.
+    """
+    mimetype = negotiate_mimetype()
+    tag = etag(state, mimetype)
+    # compressed responses carry the encoding as a suffix of the tag
+    known = [tag, *(f"{tag}-{encoding}" for encoding in ENCODINGS)]
+    matched = next((t for t in known if request.if_none_match.contains_weak(t)), None)
+    if matched is not None:
+        response = Response(status=304)
+        response.set_etag(matched)
+        response.vary.update(("Accept", "Accept-Encoding"))
+    else:
+        response = encode(build(), mimetype)
+        response.set_etag(tag)
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    response.vary.add("Authorization")
+    return response
@@ -0,0 +1,166 @@
+import gc
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Callable
+
+from flask import Flask, request, Response
+from werkzeug.exceptions import BadRequest, Conflict
+
+from src.authentication.Authenticator import Authenticator, admin_required
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAX_PROFILE_SECONDS = 60
+
+
+def frame_name(frame) -> str:
+    code = frame.f_code
+    path = code.co_filename
+    if path.startswith(ROOT):
+        path = os.path.relpath(path, ROOT)
+    else:
+        # site-packages/<package>/<module>.py
+        path = os.path.join(*path.split(os.sep)[-2:])
+    return f"{code.co_name} ({path}:{frame.f_lineno})"
+
+
+def sample_stacks(seconds: float, interval: float = 0.01) -> Counter:
+    """
+    Samples the stacks of all other threads every interval seconds, counted by stack
+
+    :return: counts of the stacks as ; joined frames from the thread name down, the collapsed format of flamegraph tools
+    """
+    own = threading.get_ident()
+    counts = Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(frame_name(frame))
+                frame = frame.f_back
+            stack.append(names.get(ident, str(ident)))
+            counts[";".join(reversed(stack))] += 1
+        time.sleep(interval)
+    return counts
+
+
+class MemoryTracer:
+    """tracemalloc snapshots, each compared to the one taken before it"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._previous = None
+
+    def start(self, frames: int = 1) -> None:
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(frames)
+            self._previous = None
+
+    def stop(self) -> None:
+        with self._lock:
+            tracemalloc.stop()
+            self._previous = None
+
+    def snapshot(self, limit: int = 25) -> dict:
+        """
+        Top allocations by line and the growth since the last snapshot
+
+        :raises Conflict: if tracing was not started
+        """
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                raise Conflict("memory tracing is not started")
+            snapshot = tracemalloc.take_snapshot().filter_traces(
+                [tracemalloc.Filter(False, tracemalloc.__file__)]
+            )
+            current, peak = tracemalloc.get_traced_memory()
+            report = {
+                "current_bytes": current,
+                "peak_bytes": peak,
+                "top": [
+                    {
+                        "line": str(stat.traceback),
+                        "bytes": stat.size,
+                        "count": stat.count,
+                    }
+                    for stat in snapshot.statistics("lineno")[:limit]
+                ],
+            }
+            if self._previous is not None:
+                report["diff"] = [
+                    {
+                        "line": str(stat.traceback),
+                        "bytes": stat.size_diff,
+                        "count": stat.count_diff,
+                    }
+                    for stat in snapshot.compare_to(self._previous, "lineno")[:limit]
+                ]
+            self._previous = snapshot
+            return report
+
+
+def gc_stats() -> dict:
+    return {
+        "enabled": gc.isenabled(),
+        "counts": gc.get_count(),
+        "thresholds": gc.get_threshold(),
+        "generations": gc.get_stats(),
+        "objects": len(gc.get_objects()),
+        "threads": threading.active_count(),
+    }
+
+
+def register_diagnostics(
+    app: Flask, authenticator: Authenticator, cache_sizes: Callable[[], dict]
+):
+    """Profiling and memory introspection routes, admitting only the admin wallet"""
+    profiling = threading.Lock()
+    tracer = MemoryTracer()
+
+    @app.get("/debug/profile")
+    @admin_required(authenticator)
+    def profile() -> Response:
+        seconds = min(request.args.get("seconds", 10, type=float), MAX_PROFILE_SECONDS)
+        interval = max(request.args.get("interval", 0.01, type=float), 0.001)
+        # samples of concurrent profiles would count each other
+        if not profiling.acquire(blocking=False):
+            raise Conflict("a profile is already running")
+        try:
+            counts = sample_stacks(seconds, interval)
+        finally:
+            profiling.release()
+        collapsed = "".join(f"{stack} {count}\n" for stack, count in counts.items())
+        return Response(collapsed, mimetype="text/plain")
+
+    @app.post("/debug/memory/start")
+    @admin_required(authenticator)
+    def start_memory() -> tuple[str, int]:
+        frames = request.args.get("frames", 1, type=int)
+        if frames < 1:
+            raise BadRequest("frames must be at least 1")
+        tracer.start(frames)
+        return "", 204
+
+    @app.get("/debug/memory")
+    @admin_required(authenticator)
+    def memory() -> dict:
+        return tracer.snapshot(request.args.get("limit", 25, type=int))
+
+    @app.post("/debug/memory/stop")
+    @admin_required(authenticator)
+    def stop_memory() -> tuple[str, int]:
+        tracer.stop()
+        return "", 204
+
+    @app.get("/debug/stats")
+    @admin_required(authenticator)
+    def stats() -> dict:
+        return {"gc": gc_stats(), "caches": cache_sizes()}
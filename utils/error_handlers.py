@@ -22,10 +22,16 @@ def time_exhausted_error(error: TimeExhausted):
 
 
 def werkzeug_errors(error: HTTPException):
-    return {
-        "error": error.__class__.__name__,
-        "messages": error.description,
-    }, int(error.code)
+    # keeps headers like Retry-After, the body is replaced by json
+    headers = [(k, v) for k, v in error.get_headers() if k != "Content-Type"]
+    return (
+        {
+            "error": error.__class__.__name__,
+            "messages": error.description,
+        },
+        int(error.code),
+        headers,
+    )
 
 
 def register_error_handlers(app: Flask):
@@ -0,0 +1,8 @@
+from flask import g, request
+
+
+def idempotency_key() -> str | None:
+    """The Idempotency-Key header of the request, scoped to the authenticated sender"""
+    if key := request.headers.get("Idempotency-Key"):
+        return f"{g.sender}:{key}"
+    return None
@@ -0,0 +1,98 @@
+import typing as t
+
+from flask import current_app, request, Response
+from flask.json.provider import DefaultJSONProvider
+
+# orjson is optional, the stdlib json provider is used without it, binary encodings
+# are only offered if their package is installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+CBOR = "application/cbor"
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """
+    Flask json provider backed by orjson. Falls back to the stdlib provider when orjson
+    is not installed, when stdlib specific options are passed or for values orjson
+    can not encode (e.g. integers wider than 64 bit).
+    """
+
+    def dumps(self, obj: t.Any, **kwargs: t.Any) -> str:
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        try:
+            return orjson.dumps(
+                obj, default=self.default, option=self._options()
+            ).decode()
+        except orjson.JSONEncodeError:
+            return super().dumps(obj)
+
+    def loads(self, s: str | bytes, **kwargs: t.Any) -> t.Any:
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args: t.Any, **kwargs: t.Any) -> Response:
+        if (
+            orjson is None
+            or self.compact is False
+            or (self.compact is None and self._app.debug)
+        ):
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        try:
+            data = orjson.dumps(
+                obj,
+                default=self.default,
+                option=self._options() | orjson.OPT_APPEND_NEWLINE,
+            )
+        except orjson.JSONEncodeError:
+            return super().response(*args, **kwargs)
+        return self._app.response_class(data, mimetype=self.mimetype)
+
+    def _options(self) -> int:
+        options = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        return options
+
+
+# binary encodings offered in addition to json, in order of preference after json
+ENCODERS: dict[str, t.Callable[[t.Any], bytes]] = {}
+if msgpack is not None:
+    ENCODERS[MSGPACK] = msgpack.packb
+if cbor2 is not None:
+    ENCODERS[CBOR] = cbor2.dumps
+
+
+def negotiate_mimetype() -> str:
+    """Picks the response mimetype from the Accept header, json unless a binary encoding is preferred"""
+    return request.accept_mimetypes.best_match([JSON, *ENCODERS], default=JSON)
+
+
+def encode(body: t.Any, mimetype: str = None) -> Response:
+    """Serializes body in the negotiated (or given) mimetype"""
+    mimetype = mimetype or negotiate_mimetype()
+    if mimetype == JSON:
+        response = current_app.json.response(body)
+    else:
+        response = current_app.response_class(
+            ENCODERS[mimetype](body), mimetype=mimetype
+        )
+    response.vary.add("Accept")
+    return response
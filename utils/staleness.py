@@ -0,0 +1,20 @@
+import time
+
+from flask import Flask, Response
+
+from src.smartcontract.SmartcontractConnector import SmartcontractConnector
+
+
+def register_staleness(app: Flask, sc: SmartcontractConnector):
+    """Marks responses built from last known chain state, served while the provider is unavailable"""
+
+    @app.before_request
+    def reset() -> None:
+        sc.resetStaleness()
+
+    @app.after_request
+    def mark(response: Response) -> Response:
+        if (since := sc.staleSince()) is not None:
+            response.headers["Age"] = str(max(0, int(time.time() - since)))
+            response.headers["Warning"] = '110 - "Response is Stale"'
+        return response